@@ -8,22 +8,61 @@
 This hook:
 1. Detects when user types "/handoff"
 2. Reads the session transcript to extract all messages
-3. Calls `aichat -r handoff-summary` to generate a handoff summary
+3. Asks the summarizer backend (summarizer.py: `aichat -r handoff-summary` by
+   default) for a handoff summary (map-reduce
+   over chunks for sessions longer than the recent tail), or, with
+   CLAUDE_HOOKS_ROLLING_SUMMARY=1, combines the background rolling summary with
+   the turns since (see rolling_summary.py)
 4. Returns the summary as additional context to be shown to the user
 """
 
+import heapq
 import json
 import sys
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 
+import handoff_registry
+import phrase_classifier
+import relevance
+import rolling_summary
+import storage
+import summarizer
+import transcript
+
 # Configuration constants
 MAX_MESSAGES = 30
-MAX_MESSAGE_LEN = 500
-MAX_CONVERSATION_CHARS = 8000
+MAX_MESSAGE_LEN = transcript.HANDOFF_CONTENT_LEN
+CHARS_PER_TOKEN = 4  # rough estimate for English prose and code
+MAX_CONVERSATION_TOKENS = 2000
 RECENT_PROTECT_COUNT = 8
+
+# Length limits of the message heuristics (classify_message)
+CHATTER_MAX_LEN = 40  # filler phrases only mark short messages
+META_MAX_LEN = 140
+DOC_DUMP_MIN_LEN = 400
+
+# Selection scores when a conversation is over budget: every protected kind
+# outranks the recency bonus (0..SCORE_RECENCY) and the optional BM25
+# relevance bonus (0..SCORE_RELEVANCE, see relevance.py), so an unprotected
+# message is only kept after all protected ones that fit
+SCORE_FIRST_INTENT = 8.0
+SCORE_DECISION = 4.0
+SCORE_USER_INTENT = 2.0
+SCORE_RELEVANCE = 1.5
+SCORE_RECENCY = 1.0
 HANDOFF_ROLE = "handoff-summary"  # aichat role name
 
+# Map-reduce for sessions longer than the MAX_MESSAGES tail
+CHUNK_ROLE = "handoff-chunk-summary"  # aichat role name
+CHUNK_TOKENS = MAX_CONVERSATION_TOKENS
+MAX_CHUNKS = 16
+MAP_WORKERS = 8
+HANDOFF_DEADLINE = 50.0  # seconds; Claude's hook timeout is 60s
+REDUCE_RESERVE = 20.0  # seconds of the deadline kept for the reduce call
+
 
 def extract_todos(transcript_path: str) -> list[dict]:
     """Extract current todo list from transcript JSONL file.
@@ -34,138 +73,85 @@ def extract_todos(transcript_path: str) -> list[dict]:
     Returns:
         List of todo items with 'content', 'status', and 'activeForm'
     """
-    latest_todos = []
-
     try:
-        with open(transcript_path, "r") as f:
-            for line in f:
-                try:
-                    entry = json.loads(line)
-
-                    # Look for user type entries with toolUseResult containing todos
-                    if entry.get("type") == "user" and "toolUseResult" in entry:
-                        tool_result = entry["toolUseResult"]
-                        # Get the latest todos from newTodos field
-                        if "newTodos" in tool_result:
-                            latest_todos = tool_result["newTodos"]
-
-                except json.JSONDecodeError:
-                    continue
+        return transcript.read_tail(transcript_path, ("todos",), 0)["todos"]
     except FileNotFoundError:
         return []
 
-    return latest_todos
+
+def classify_message(text: str, role: str, classifier: phrase_classifier.PhraseClassifier | None = None) -> set[str]:
+    """Classify a message in one scan of its text (phrases: handoff_phrases.json).
+
+    Returns:
+        The labels that apply: "chatter" (low-value filler/meta talk), "doc_dump"
+        (generic documentation), "decision" (decision, summary or plan) and
+        "intent" (user intent or question)
+    """
+    t = text.lower()
+    found = (classifier or phrase_classifier.load()).classify(t)
+    labels = set()
+
+    length = len(t.strip())
+    if (length < CHATTER_MAX_LEN and "filler" in found) or (length < META_MAX_LEN and "meta" in found):
+        labels.add("chatter")
+    if len(t) > DOC_DUMP_MIN_LEN and (
+        found.get("doc_heading", 0) >= 2 or ("doc_topic" in found and "markdown" in found)
+    ):
+        labels.add("doc_dump")
+    if "decision" in found:
+        labels.add("decision")
+    if role == "user" and "intent" in found:
+        labels.add("intent")
+    return labels
 
 
 def is_low_value_chatter(text: str, role: str) -> bool:
     """Check if message is low-value filler/chatter."""
-    t = text.lower().strip()
-
-    if len(t) < 40:
-        filler_phrases = [
-            "got it",
-            "sounds good",
-            "ok",
-            "okay",
-            "let me",
-            "i'll",
-            "i will",
-            "now i'll",
-            "now i will",
-            "starting with",
-            "i'm going to",
-            "let's start by",
-        ]
-        if any(p in t for p in filler_phrases):
-            return True
-
-    meta_phrases = [
-        "let me check",
-        "let me see",
-        "i'll check",
-        "i will check",
-        "i'll start by",
-        "now let me",
-        "let me load",
-        "loading the",
-        "running the",
-    ]
-    if len(t) < 140 and any(p in t for p in meta_phrases):
-        return True
-
-    return False
+    return "chatter" in classify_message(text, role)
 
 
 def looks_like_doc_dump(text: str) -> bool:
     """Check if message is a generic documentation dump."""
-    t = text.lower()
-    if len(t) > 400:
-        heading_patterns = ("\n## ", "\n### ", "\n- ", "\n* ")
-        heading_count = sum(1 for h in heading_patterns if h in text)
-        if heading_count >= 2:
-            return True
-        if ("this skill" in t or "overview" in t) and "##" in text:
-            return True
-    return False
+    return "doc_dump" in classify_message(text, "")
 
 
 def is_decision_or_summary(text: str) -> bool:
     """Check if message contains decision, summary, or plan content."""
-    t = text.lower()
-    keywords = [
-        "decision",
-        "we decided",
-        "we chose",
-        "we'll",
-        "summary",
-        "recap",
-        "overview of",
-        "next steps",
-        "todo",
-        "to-do",
-        "pending tasks",
-        "completed",
-        "implemented",
-        "fixed",
-        "resolved",
-        "the plan is",
-        "we will do",
-    ]
-    return any(k in t for k in keywords)
+    return "decision" in classify_message(text, "")
 
 
 def is_user_intent_or_question(text: str, role: str) -> bool:
     """Check if message is user intent/question."""
-    if role != "user":
-        return False
-    t = text.lower()
-    intent_keywords = [
-        "need to",
-        "i want to",
-        "please",
-        "can you",
-        "how do i",
-        "we are going to",
-        "so we need",
-        "the purpose is",
-    ]
-    return "?" in text or any(k in t for k in intent_keywords)
+    return role == "user" and "intent" in classify_message(text, role)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text (no tokenizer, CHARS_PER_TOKEN)."""
+    return -(-len(text) // CHARS_PER_TOKEN)
 
 
 def filter_messages_for_handoff(
     messages: list[dict],
-    max_total_chars: int = MAX_CONVERSATION_CHARS,
+    max_total_tokens: int = MAX_CONVERSATION_TOKENS,
     recent_protect_count: int = RECENT_PROTECT_COUNT,
+    relevance_scores: list[float] | None = None,
 ) -> list[dict]:
-    """Filter messages to remove noise and enforce character budget.
+    """Filter messages to remove noise and enforce a token budget.
+
+    Low-value chatter and doc dumps are dropped first. If the rest is over
+    budget, the last `recent_protect_count` messages are kept and the others
+    are selected by score (session intent, decisions/summaries, user intent,
+    then relevance and recency) from a heap, skipping any that no longer fit:
+    a greedy knapsack in O(n log n).
 
     Args:
         messages: List of message dicts with 'role' and 'content'
-        max_total_chars: Maximum total character budget for conversation
+        max_total_tokens: Maximum estimated tokens for the conversation
         recent_protect_count: Number of recent messages to always protect
+        relevance_scores: Optional score in [0, 1] per message (relevance.rank)
 
     Returns:
-        Filtered list of messages
+        Filtered list of messages, in their original order
     """
     if not messages:
         return messages
@@ -176,59 +162,52 @@ def filter_messages_for_handoff(
         None,
     )
 
-    # First pass: remove obvious low-value messages
-    annotated = []
+    # First pass: remove obvious low-value messages, score the rest
+    classifier = phrase_classifier.load()
+    kept = []  # (index, tokens, score)
+    total_tokens = 0
     for i, msg in enumerate(messages):
         text, role = msg["content"], msg["role"]
+        labels = classify_message(text, role, classifier)
+
+        score = 0.0
+        if i == first_user_idx:
+            score += SCORE_FIRST_INTENT
+        if "decision" in labels:
+            score += SCORE_DECISION
+        if "intent" in labels:
+            score += SCORE_USER_INTENT
+        protected = score > 0
+        if relevance_scores:
+            score += SCORE_RELEVANCE * relevance_scores[i]
+
+        # Drop low-value messages
+        if not protected and labels & {"chatter", "doc_dump"}:
+            continue
 
-        # Mark protected messages
-        protected = (
-            (i == first_user_idx and first_user_idx is not None)
-            or is_decision_or_summary(text)
-            or is_user_intent_or_question(text, role)
-        )
-
-        # Mark low-value messages
-        low_value = (not protected) and (
-            is_low_value_chatter(text, role) or looks_like_doc_dump(text)
-        )
-
-        if low_value:
-            continue  # drop this message
-
-        annotated.append({"index": i, "msg": msg, "protected": protected})
-
-    # Second pass: enforce character budget
-    total_chars = sum(len(a["msg"]["content"]) for a in annotated)
+        tokens = estimate_tokens(text)
+        total_tokens += tokens
+        kept.append((i, tokens, score + SCORE_RECENCY * i / len(messages)))
 
-    if total_chars <= max_total_chars:
-        # Already under budget, return in original order
-        annotated.sort(key=lambda a: a["index"])
-        return [a["msg"] for a in annotated]
+    if total_tokens <= max_total_tokens:
+        # Already under budget
+        return [messages[i] for i, _, _ in kept]
 
-    # Over budget: protect tail and drop oldest non-protected first
-    tail_start_idx = max(0, len(annotated) - recent_protect_count)
+    # Over budget: the tail always stays, the rest compete for what is left
+    tail_start = max(0, len(kept) - recent_protect_count)
+    selected = [i for i, _, _ in kept[tail_start:]]
+    remaining = max_total_tokens - sum(tokens for _, tokens, _ in kept[tail_start:])
 
-    i = 0
-    while total_chars > max_total_chars and i < tail_start_idx:
-        a = annotated[i]
-        if not a["protected"]:
-            total_chars -= len(a["msg"]["content"])
-            annotated.pop(i)
-            tail_start_idx -= 1
-            continue
-        i += 1
+    heap = [(-score, -i, tokens) for i, tokens, score in kept[:tail_start]]
+    heapq.heapify(heap)
+    while heap and remaining > 0:
+        _, neg_i, tokens = heapq.heappop(heap)
+        if tokens <= remaining:
+            selected.append(-neg_i)
+            remaining -= tokens
 
-    # If still over budget, drop protected messages from head (but not tail)
-    while total_chars > max_total_chars and len(annotated) > recent_protect_count:
-        a = annotated[0]
-        total_chars -= len(a["msg"]["content"])
-        annotated.pop(0)
-        tail_start_idx -= 1
-
-    # Sort back to original order
-    annotated.sort(key=lambda a: a["index"])
-    return [a["msg"] for a in annotated]
+    selected.sort()
+    return [messages[i] for i in selected]
 
 
 def extract_messages(
@@ -246,87 +225,29 @@ def extract_messages(
     Returns:
         List of message dicts with 'role' and 'content'
     """
-    messages = []
-
     try:
-        with open(transcript_path, "r") as f:
-            for line in f:
-                try:
-                    entry = json.loads(line)
-
-                    # Skip non-message entries (file-history-snapshot, etc.)
-                    if entry.get("type") not in ("user", "assistant"):
-                        continue
-
-                    # Extract message content
-                    message = entry.get("message", {})
-                    role = message.get("role")
-                    content = message.get("content")
-
-                    if not role or not content:
-                        continue
-
-                    # Handle different content formats
-                    if isinstance(content, str):
-                        text = content
-                    elif isinstance(content, list):
-                        # Check if this is a tool_result message (user messages with tool output)
-                        # These contain verbose file contents - skip entirely
-                        is_tool_result = any(
-                            isinstance(b, dict) and b.get("type") == "tool_result"
-                            for b in content
-                        )
-                        if is_tool_result:
-                            continue
-
-                        # Extract text from content blocks (assistant messages)
-                        text_parts = []
-                        tool_count = 0
-                        for block in content:
-                            if isinstance(block, dict):
-                                if block.get("type") == "text":
-                                    block_text = block.get("text", "")
-                                    # Skip "(no content)" placeholder
-                                    if (
-                                        block_text.strip()
-                                        and block_text.strip() != "(no content)"
-                                    ):
-                                        text_parts.append(block_text)
-                                elif block.get("type") == "tool_use":
-                                    tool_count += 1
-                            elif isinstance(block, str):
-                                text_parts.append(block)
-
-                        # Skip messages with only tool calls and no meaningful text
-                        if not text_parts:
-                            continue
-
-                        text = "\n".join(text_parts)
-                        # Append tool count summary if tools were used
-                        if tool_count > 0:
-                            text += f" [+{tool_count} tool call(s)]"
-                    else:
-                        continue
-
-                    # Skip empty messages
-                    text = text.strip()
-                    if not text:
-                        continue
-
-                    # Truncate long messages
-                    if len(text) > max_content_len:
-                        text = text[:max_content_len] + "..."
-
-                    messages.append({"role": role, "content": text})
-
-                except json.JSONDecodeError:
-                    continue
+        data = transcript.read_tail(
+            transcript_path, ("handoff_messages",), max_messages, max_content_len
+        )
     except FileNotFoundError:
         print(f"Transcript file not found: {transcript_path}", file=sys.stderr)
         return []
 
-    # Return most recent messages
-    return messages[-max_messages:] if len(messages) > max_messages else messages
+    # Most recent messages, read backwards from the end of the transcript
+    return data["handoff_messages"]
+
+
+def extract_messages_and_todos(transcript_path: str) -> tuple[list[dict], list[dict]]:
+    """Read the recent handoff messages and the current todos in one tail pass."""
+    try:
+        data = transcript.read_tail(
+            transcript_path, ("handoff_messages", "todos"), MAX_MESSAGES
+        )
+    except FileNotFoundError:
+        print(f"Transcript file not found: {transcript_path}", file=sys.stderr)
+        return [], []
+
+    return data["handoff_messages"], data["todos"]
 
 
 def format_conversation(messages: list[dict]) -> str:
@@ -476,28 +397,33 @@ def generate_slug_from_messages(messages: list[dict]) -> str:
 
 
 def generate_handoff_summary(
-    messages: list[dict], project_dir: str = ".", todos: list[dict] = None
+    messages: list[dict],
+    project_dir: str = ".",
+    todos: list[dict] = None,
+    earlier_summaries: list[str] | None = None,
+    timeout: float = 60,
 ) -> str:
-    """Generate handoff summary using aichat with handoff-summary role.
+    """Generate handoff summary with the handoff-summary role (see summarizer.py).
 
     Args:
         messages: List of conversation messages
         project_dir: Project directory for context
         todos: List of todo items from transcript (optional)
+        earlier_summaries: Summaries of the session before `messages`, oldest
+            first (the reduce step of generate_chunked_handoff_summary)
+        timeout: Seconds to wait for the summarizer
 
     Returns:
         Generated summary text
 
     Raises:
-        subprocess.TimeoutExpired: If aichat command times out
+        subprocess.TimeoutExpired / TimeoutError: If the summarizer times out
         FileNotFoundError: If aichat command is not found
         Exception: If command execution fails
     """
     if not messages:
         raise ValueError("No conversation history available for handoff.")
 
-    from pathlib import Path
-
     absolute_project_dir = Path(project_dir).resolve().absolute()
 
     conversation = format_conversation(messages)
@@ -513,34 +439,142 @@ The following is the EXACT todo list from the session. Include ALL items in your
 
 {formatted_todos}
 
+"""
+
+    earlier_section = ""
+    if earlier_summaries:
+        parts = "\n\n".join(f"## Part {i}\n\n{text}" for i, text in enumerate(earlier_summaries, 1))
+        earlier_section = f"""# Earlier in the Session (summaries of earlier parts, oldest first):
+
+{parts}
+
 """
 
     # Create prompt for summarization
     prompt = f"""Project directory: `{absolute_project_dir}`
 
-{todos_section}# Previous Session Conversation:
+{todos_section}{earlier_section}# Previous Session Conversation:
 
 {conversation}
 
 # Instructions:
 Analyze this conversation and create a comprehensive handoff document following the role's format."""
 
-    # Call aichat with handoff-summary role
-    # Feed prompt via stdin to avoid session file creation
-    result = subprocess.run(
-        ["aichat", "-r", HANDOFF_ROLE],
-        input=prompt,
-        cwd=project_dir,
-        capture_output=True,
-        text=True,
-        timeout=60,
+    return summarizer.summarize(HANDOFF_ROLE, prompt, project_dir, timeout)
+
+
+def extract_history(transcript_path: str, tail_count: int) -> list[dict]:
+    """Return the handoff messages before the last `tail_count` (checkpointed full parse)."""
+    try:
+        messages = transcript.parse_transcript(transcript_path, ("handoff_messages",))["handoff_messages"]
+    except FileNotFoundError:
+        return []
+    return messages[: max(0, len(messages) - tail_count)]
+
+
+def chunk_conversation(
+    messages: list[dict],
+    chunk_tokens: int = CHUNK_TOKENS,
+    max_chunks: int = MAX_CHUNKS,
+    relevance_scores: list[float] | None = None,
+) -> list[list[dict]]:
+    """Split messages into consecutive chunks, each filtered to `chunk_tokens`.
+
+    Up to `max_chunks` * `chunk_tokens` tokens, a chunk boundary depends
+    only on the messages before it, so the chunks (and their cached
+    summaries) of a growing session stay the same. Longer sessions get wider
+    chunks (about `max_chunks` of them) that filter_messages_for_handoff
+    trims down to budget.
+    """
+    sizes = [estimate_tokens(m["content"]) for m in messages]
+    span = max(chunk_tokens, -(-sum(sizes) // max_chunks))
+
+    bounds, start, size = [], 0, 0
+    for i, tokens in enumerate(sizes):
+        if i > start and size + tokens > span:
+            bounds.append((start, i))
+            start, size = i, 0
+        size += tokens
+    if start < len(messages):
+        bounds.append((start, len(messages)))
+
+    filtered = (
+        filter_messages_for_handoff(
+            messages[lo:hi],
+            chunk_tokens,
+            recent_protect_count=0,
+            relevance_scores=relevance_scores and relevance_scores[lo:hi],
+        )
+        for lo, hi in bounds
     )
+    return [chunk for chunk in filtered if chunk]
 
-    if result.returncode == 0:
-        return result.stdout.strip()
-    else:
-        error_msg = result.stderr.strip() if result.stderr else "Unknown error"
-        raise RuntimeError(f"aichat command failed: {error_msg}")
+
+def summarize_chunks(chunks: list[list[dict]], project_dir: str, deadline: float) -> list[str]:
+    """Map step: summarize chunks concurrently, oldest first.
+
+    Chunks that fail or miss `deadline` (a time.monotonic() value) are left
+    out; every summarizer call is bounded by the deadline, so no worker outlives it.
+    """
+    absolute_project_dir = Path(project_dir).resolve().absolute()
+
+    def summarize(index: int, chunk: list[dict]) -> str:
+        # No chunk count in the prompt, so earlier chunks stay cache hits as the session grows
+        prompt = f"""Project directory: `{absolute_project_dir}`
+
+# Session Part {index + 1}:
+
+{format_conversation(chunk)}"""
+        return summarizer.summarize(CHUNK_ROLE, prompt, project_dir, max(1.0, deadline - time.monotonic()))
+
+    executor = ThreadPoolExecutor(max_workers=MAP_WORKERS)
+    # Newest first: if the deadline hits, the oldest history is what gets dropped
+    futures = [executor.submit(summarize, i, chunk) for i, chunk in reversed(list(enumerate(chunks)))]
+    futures.reverse()
+    done, _ = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    summaries = []
+    for future in futures:
+        if future not in done:
+            continue
+        try:
+            summary = future.result()
+        except Exception as e:
+            print(f"Chunk summary failed: {e}", file=sys.stderr)
+            continue
+        if summary:
+            summaries.append(summary)
+    return summaries
+
+
+def generate_chunked_handoff_summary(
+    history: list[dict],
+    messages: list[dict],
+    project_dir: str = ".",
+    todos: list[dict] = None,
+    relevance_scores: list[float] | None = None,
+) -> str:
+    """Map-reduce handoff for long sessions.
+
+    `history` (everything before the recent `messages`) is split into chunks
+    summarized concurrently, then one handoff-summary call reduces those
+    summaries plus the recent messages into the final document. The whole
+    pipeline finishes within HANDOFF_DEADLINE; chunks that miss the map
+    deadline are left out rather than delaying the reduce (newest chunks are
+    submitted first, so those are the oldest ones). `relevance_scores`
+    (aligned with `history`) steer the trimming of wide chunks.
+    """
+    deadline = time.monotonic() + HANDOFF_DEADLINE
+    chunks = chunk_conversation(history, relevance_scores=relevance_scores)
+    summaries = summarize_chunks(chunks, project_dir, deadline - REDUCE_RESERVE)
+    return generate_handoff_summary(
+        messages,
+        project_dir,
+        todos,
+        earlier_summaries=summaries,
+        timeout=max(1.0, deadline - time.monotonic()),
+    )
 
 
 def copy_to_clipboard(text: str) -> bool:
@@ -594,42 +628,48 @@ def save_handoff_to_file(
     filename = f"{slug}-{timestamp}.md"
     filepath = handoffs_dir / filename
 
-    # Write the handoff summary
-    with open(filepath, "w") as f:
-        # Use extracted title if available, otherwise use slug
-        display_title = title if title else slug.replace("-", " ").title()
-        f.write(f"# Handoff: {display_title}\n\n")
-        f.write(f"**Created**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+    # Use extracted title if available, otherwise use slug
+    display_title = title if title else slug.replace("-", " ").title()
+    parts = [
+        f"# Handoff: {display_title}\n\n",
+        f"**Created**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n",
+    ]
 
-        # Include user note if provided
-        if user_note:
-            f.write("## User Note\n\n")
-            f.write(f"> {user_note}\n\n")
+    # Include user note if provided
+    if user_note:
+        parts.append("## User Note\n\n")
+        parts.append(f"> {user_note}\n\n")
 
-        f.write("---\n\n")
-        f.write(summary)
-        f.write("\n\n---\n\n")
-        f.write(f"**To resume**: Run `/pickup {filename}` in a new session\n")
+    parts.append("---\n\n")
+    parts.append(summary)
+    parts.append("\n\n---\n\n")
+    parts.append(f"**To resume**: Run `/pickup {filename}` in a new session\n")
+
+    # Write atomically so a concurrent /pickup never reads a partial handoff
+    storage.atomic_write_text(filepath, "".join(parts), mode=0o644)
+
+    try:
+        handoff_registry.register_handoff(project_dir, filename, display_title)
+    except Exception as e:
+        # The registry reconciles with the directory, so it picks the file up later
+        print(f"Failed to register handoff: {e}", file=sys.stderr)
 
     # Return relative path from project root
     return f".claude/handoffs/{filename}"
 
 
-def main():
-    """Main hook entry point."""
-    try:
-        # Read input from stdin
-        input_data = json.load(sys.stdin)
-    except json.JSONDecodeError as e:
-        print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
-        sys.exit(1)
+def handle_prompt(input_data: dict) -> int:
+    """Handle a UserPromptSubmit event in-process.
 
+    Used directly by user_prompt_dispatch.py; prints the hook output and
+    returns the exit code instead of exiting.
+    """
     prompt = input_data.get("prompt", "").strip()
 
     # Check if this is a /handoff command
     if not prompt.startswith("/handoff"):
         # Not a handoff command, allow it to proceed normally
-        return
+        return 0
 
     # This is a handoff command - intercept it
     # Extract custom message after "/handoff" (e.g., "/handoff custom msg" → "custom msg")
@@ -639,36 +679,64 @@ def main():
 
     if not transcript_path:
         print("Error: No transcript_path provided", file=sys.stderr)
-        sys.exit(2)
-
-    # Extract messages and todos from transcript
-    messages = extract_messages(transcript_path)
-    # Filter messages to remove noise and enforce character budget
-    messages = filter_messages_for_handoff(messages)
-    todos = extract_todos(transcript_path)
-
-    if not messages:
-        error_msg = "No conversation history found to summarize."
-        output = {
-            "decision": "block",
-            "reason": error_msg,
-            "hookSpecificOutput": {"hookEventName": "UserPromptSubmit"},
-        }
-        print(json.dumps(output))
-        sys.exit(0)
+        return 2
 
     # Get project directory (cwd or current working directory)
     project_dir = input_data.get("cwd", ".")
 
-    # Generate handoff summary with correct project directory context and todos
-    try:
-        summary = generate_handoff_summary(messages, project_dir, todos)
-    except subprocess.TimeoutExpired:
-        print("Error: Summary generation timed out after 60 seconds", file=sys.stderr)
-        sys.exit(1)
-    except Exception as e:
-        print(f"Error generating summary: {str(e)}", file=sys.stderr)
-        sys.exit(1)
+    summary = None
+    if rolling_summary.enabled():
+        # Opt-in: combine the background rolling summary with the latest turns, no LLM wait
+        try:
+            composed = rolling_summary.compose_handoff(
+                rolling_summary.project_dir(input_data) or project_dir,
+                input_data.get("session_id", ""),
+                transcript_path,
+                extract_todos(transcript_path),
+            )
+        except Exception as e:
+            print(f"Rolling summary unavailable: {e}", file=sys.stderr)
+            composed = None
+        if composed:
+            summary, messages = composed
+
+    if summary is None:
+        # Extract messages and todos from transcript (one pass)
+        messages, todos = extract_messages_and_todos(transcript_path)
+        history = []
+        if len(messages) >= MAX_MESSAGES:
+            # Long session: summarize what came before the tail in chunks
+            history = extract_history(transcript_path, len(messages))
+        scores = None
+        if relevance.enabled():
+            # Opt-in: favour turns about the session's intent and todos when trimming
+            scores = relevance.rank(history + messages, todos)
+        history_scores = scores and scores[: len(history)]
+        # Filter messages to remove noise and enforce the token budget
+        messages = filter_messages_for_handoff(messages, relevance_scores=scores and scores[len(history) :])
+
+        if not messages:
+            error_msg = "No conversation history found to summarize."
+            output = {
+                "decision": "block",
+                "reason": error_msg,
+                "hookSpecificOutput": {"hookEventName": "UserPromptSubmit"},
+            }
+            print(json.dumps(output))
+            return 0
+
+        # Generate handoff summary with correct project directory context and todos
+        try:
+            if history:
+                summary = generate_chunked_handoff_summary(history, messages, project_dir, todos, history_scores)
+            else:
+                summary = generate_handoff_summary(messages, project_dir, todos)
+        except (subprocess.TimeoutExpired, TimeoutError):
+            print("Error: Summary generation timed out", file=sys.stderr)
+            return 1
+        except Exception as e:
+            print(f"Error generating summary: {str(e)}", file=sys.stderr)
+            return 1
 
     # Save handoff to file
     try:
@@ -681,7 +749,7 @@ def main():
             "hookSpecificOutput": {"hookEventName": "UserPromptSubmit"},
         }
         print(json.dumps(output))
-        sys.exit(0)
+        return 0
 
     # Format the response message
     pickup_command = f"/pickup {Path(handoff_file).name}"
@@ -714,7 +782,19 @@ def main():
 
     # Print JSON to stdout with exit code 0
     print(json.dumps(output))
-    sys.exit(0)
+    return 0
+
+
+def main():
+    """Main hook entry point."""
+    try:
+        # Read input from stdin
+        input_data = json.load(sys.stdin)
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    sys.exit(handle_prompt(input_data))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,235 @@
+"""SQLite registry of the handoff files in `.claude/handoffs/`.
+
+Replaces globbing + stat()-sorting the directory and the `.handled.json`
+read-modify-write that the handoff, pickup and post-pickup hooks each did.
+The registry lives next to the handoffs in `.registry/handoffs.sqlite3` (WAL
+mode, so several sessions in one repo can read while one writes):
+
+    handoffs(name PRIMARY KEY, title, created, modified, handled, handled_at)
+
+with an index on (handled, modified) answering "pending, newest first".
+
+Handoffs are also written by hand, so the table is reconciled with the
+directory whenever the directory's mtime differs from the one recorded at the
+last reconcile (a file was added, removed or renamed). The database sits in
+its own subdirectory because SQLite creates and removes its -wal/-shm files
+as connections come and go, which would otherwise bump that mtime on every
+call. A `.handled.json` left by older hooks is imported once.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+HANDOFFS_DIR = Path(".claude") / "handoffs"
+REGISTRY_PATH = Path(".registry") / "handoffs.sqlite3"
+LEGACY_HANDLED_FILE = ".handled.json"
+SCHEMA_VERSION = 1
+BUSY_TIMEOUT = 5.0  # seconds to wait for another session's write lock
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS handoffs (
+    name TEXT PRIMARY KEY,
+    title TEXT,
+    created REAL NOT NULL,
+    modified REAL NOT NULL,
+    handled INTEGER NOT NULL DEFAULT 0,
+    handled_at TEXT
+);
+CREATE INDEX IF NOT EXISTS handoffs_pending ON handoffs (handled, modified DESC);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def read_title(path: Path) -> str | None:
+    """Return the title from a handoff's `# Handoff: <title>` heading."""
+    try:
+        with open(path, "r") as f:
+            first = f.readline().strip()
+    except OSError:
+        return None
+    prefix = "# Handoff:"
+    if not first.startswith(prefix):
+        return None
+    return first[len(prefix) :].strip() or None
+
+
+def _get_meta(conn: sqlite3.Connection, key: str) -> str | None:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_meta(conn: sqlite3.Connection, key: str, value) -> None:
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+def reconcile(conn: sqlite3.Connection, handoffs_dir: Path) -> None:
+    """Sync the table with the directory if the directory changed since last time."""
+    dir_mtime = str(handoffs_dir.stat().st_mtime_ns)
+    if _get_meta(conn, "dir_mtime_ns") == dir_mtime:
+        return
+
+    with conn:
+        # Take the write lock first so concurrent reconciles do not interleave
+        conn.execute("BEGIN IMMEDIATE")
+        if _get_meta(conn, "dir_mtime_ns") == dir_mtime:
+            return
+
+        on_disk = {}
+        with os.scandir(handoffs_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".md") and entry.is_file():
+                    on_disk[entry.name] = entry.stat().st_mtime
+
+        known = {name: modified for name, modified in conn.execute("SELECT name, modified FROM handoffs")}
+        for name in known.keys() - on_disk.keys():
+            conn.execute("DELETE FROM handoffs WHERE name = ?", (name,))
+        for name, mtime in on_disk.items():
+            if name not in known:
+                conn.execute(
+                    "INSERT INTO handoffs (name, title, created, modified) VALUES (?, ?, ?, ?)",
+                    (name, read_title(handoffs_dir / name), mtime, mtime),
+                )
+            elif known[name] != mtime:
+                conn.execute("UPDATE handoffs SET modified = ? WHERE name = ?", (mtime, name))
+
+        if _get_meta(conn, "legacy_imported") is None:
+            _import_legacy_handled(conn, handoffs_dir)
+            _set_meta(conn, "legacy_imported", 1)
+        _set_meta(conn, "dir_mtime_ns", dir_mtime)
+
+
+def _import_legacy_handled(conn: sqlite3.Connection, handoffs_dir: Path) -> None:
+    """Carry over handled marks from the `.handled.json` written by older hooks."""
+    try:
+        handled = json.loads((handoffs_dir / LEGACY_HANDLED_FILE).read_text())
+    except (OSError, ValueError):
+        return
+    if not isinstance(handled, dict):
+        return
+    for name, handled_at in handled.items():
+        conn.execute(
+            "UPDATE handoffs SET handled = 1, handled_at = ? WHERE name = ?",
+            (str(handled_at), name),
+        )
+
+
+def open_registry(project_dir: str, create: bool = False) -> sqlite3.Connection | None:
+    """Open (and reconcile) the project's registry.
+
+    Returns None when the handoffs directory does not exist and `create` is
+    False, so read-only callers never create `.claude/handoffs/`.
+    """
+    handoffs_dir = Path(project_dir) / HANDOFFS_DIR
+    if not handoffs_dir.is_dir():
+        if not create:
+            return None
+        handoffs_dir.mkdir(parents=True, exist_ok=True)
+
+    db_path = handoffs_dir / REGISTRY_PATH
+    db_path.parent.mkdir(mode=0o700, exist_ok=True)
+    fresh = not db_path.exists()
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+    try:
+        if fresh:
+            os.chmod(db_path, 0o600)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if _schema_version(conn) != SCHEMA_VERSION:
+            conn.executescript(_SCHEMA)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        reconcile(conn, handoffs_dir)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def _schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def register_handoff(project_dir: str, name: str, title: str | None = None) -> None:
+    """Record a handoff file just written by /handoff."""
+    handoffs_dir = Path(project_dir) / HANDOFFS_DIR
+    mtime = (handoffs_dir / name).stat().st_mtime
+    conn = open_registry(project_dir, create=True)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO handoffs (name, title, created, modified) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(name) DO UPDATE SET title = excluded.title, modified = excluded.modified",
+                (name, title, time.time(), mtime),
+            )
+    finally:
+        conn.close()
+
+
+def mark_handled(project_dir: str, handoff_name: str) -> bool:
+    """Mark a handoff as handled (picked up).
+
+    Args:
+        project_dir: Project root directory
+        handoff_name: Name of the handoff file (just filename, not path)
+
+    Returns:
+        True if successfully marked, False otherwise
+    """
+    try:
+        conn = open_registry(project_dir, create=True)
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "UPDATE handoffs SET handled = 1, handled_at = ? WHERE name = ?",
+                    (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), handoff_name),
+                )
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Failed to mark handoff as handled: {e}", file=sys.stderr)
+        return False
+
+
+def list_handoffs(project_dir: str, pending_only: bool = False) -> list[dict]:
+    """List handoffs newest first.
+
+    Args:
+        project_dir: Project root directory
+        pending_only: Only handoffs that have not been picked up
+
+    Returns:
+        List of dicts with 'name', 'path', 'title', 'modified' and 'age_seconds'
+    """
+    try:
+        conn = open_registry(project_dir)
+    except Exception as e:
+        print(f"Failed to open handoff registry: {e}", file=sys.stderr)
+        return []
+    if conn is None:
+        return []
+
+    query = "SELECT name, title, modified FROM handoffs"
+    if pending_only:
+        query += " WHERE handled = 0"
+    query += " ORDER BY modified DESC"
+    try:
+        rows = conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+    now = time.time()
+    return [
+        {
+            "name": name,
+            "path": str(HANDOFFS_DIR / name),
+            "title": title,
+            "modified": datetime.fromtimestamp(modified).strftime("%Y-%m-%d %H:%M:%S"),
+            "age_seconds": now - modified,
+        }
+        for name, title, modified in rows
+    ]
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Thin hook client: forward a hook event to hook_daemon.py, or run it in-process.
+
+Usage (settings.json):
+    python3 ~/.dotfiles/nix/hm/ai/claude/hooks/hook_client.py <hook-name>
+
+The client forwards the raw hook stdin, with the few pieces of process state
+hooks depend on (cwd, CLAUDE_PROJECT_DIR, KIRO_DIR), to the per-user daemon
+socket. The daemon replies with the hook's exit code, stdout and stderr, which
+are replayed here. Wire format (no JSON on the fast path, so `json`/`re` are
+never imported):
+
+    request: hook NUL cwd NUL KEY=VALUE NUL ... NUL NUL <raw stdin>
+    reply:   code NUL len(stdout) NUL <stdout bytes> <stderr bytes>
+
+The socket directory may sit in a shared /tmp, so the client only connects
+when the directory and the socket are owned by this user, are not symlinks
+and are closed to group and others; anything else is treated like a missing
+daemon. If the daemon is not running (or refuses the request because its code
+is stale), the hook module is imported and run in this process instead, so the
+daemon is purely an optimization. Keep this file import-light: it runs on
+every hook event.
+"""
+
+import os
+import socket
+import stat
+import sys
+
+# Hook name -> (module, in-process entry point taking input_data, returning exit code)
+HOOKS = {
+    "session_remind": ("session_remind", "handle_session_start"),
+    "session_summary": ("session_summary", "handle_session_start"),
+    "session_start_handoff": ("session_start_handoff", "handle_session_start"),
+    "user_prompt": ("user_prompt_dispatch", "dispatch"),
+    "prevent_forbidden_bash": ("prevent_forbidden_bash", "handle_pre_tool_use"),
+    "post_pickup": ("post_pickup_handler", "handle_post_tool_use"),
+    "pre_compact": ("pre_compact", "handle_pre_compact"),
+    "session_save": ("session_save", "handle_session_end"),
+}
+
+# Environment variables forwarded to the daemon for each request
+FORWARDED_ENV = (
+    "CLAUDE_PROJECT_DIR",
+    "KIRO_DIR",
+    "CLAUDE_HOOKS_ROLLING_SUMMARY",
+    "CLAUDE_HOOKS_HANDOFF_RANKING",
+    # summarizer.ENV_VARS (not imported: this file stays import-light)
+    "CLAUDE_HOOKS_SUMMARIZER",
+    "CLAUDE_HOOKS_SUMMARIZER_URL",
+    "CLAUDE_HOOKS_SUMMARIZER_MODEL",
+    "CLAUDE_HOOKS_SUMMARIZER_API_KEY",
+)
+
+CONNECT_TIMEOUT = 0.2  # seconds; the daemon is local, so this only bounds a wedged accept
+
+
+def socket_path() -> str:
+    """Return the per-user daemon socket path."""
+    base = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp"
+    return os.path.join(base, f"claude-hooks-{os.getuid()}", "daemon.sock")
+
+
+def is_private(path: str, is_type) -> bool:
+    """True if `path` is ours, passes `is_type` (e.g. stat.S_ISDIR) on lstat and has no group/other bits."""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return st.st_uid == os.getuid() and is_type(st.st_mode) and not st.st_mode & 0o077
+
+
+def run_in_process(hook: str, input_data: dict) -> int:
+    """Import the hook module and run its entry point in this process."""
+    import importlib
+
+    module_name, func_name = HOOKS[hook]
+    module = importlib.import_module(module_name)
+    return getattr(module, func_name)(input_data)
+
+
+def encode_request(hook: str, cwd: str, env: dict, raw: bytes) -> bytes:
+    """Encode one hook event for the daemon socket."""
+    fields = [hook, cwd] + [f"{k}={v}" for k, v in env.items()]
+    return "\0".join(fields).encode("utf-8") + b"\0\0" + raw
+
+
+def decode_reply(data: bytes) -> tuple[int, bytes, bytes]:
+    """Split a daemon reply into (exit code, stdout, stderr)."""
+    code, length, rest = data.split(b"\0", 2)
+    length = int(length)
+    return int(code), rest[:length], rest[length:]
+
+
+def request_daemon(hook: str, raw: bytes) -> tuple[int, bytes, bytes] | None:
+    """Send one hook event to the daemon; None when it is unavailable."""
+    path = socket_path()
+    if not (is_private(os.path.dirname(path), stat.S_ISDIR) and is_private(path, stat.S_ISSOCK)):
+        return None  # Missing, or possibly planted by another user
+    env = {k: os.environ[k] for k in FORWARDED_ENV if k in os.environ}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(path)
+            # Hooks such as /handoff may legitimately run for a minute
+            sock.settimeout(None)
+            sock.sendall(encode_request(hook, os.getcwd(), env, raw))
+            sock.shutdown(socket.SHUT_WR)
+            chunks = []
+            while chunk := sock.recv(65536):
+                chunks.append(chunk)
+    except OSError:
+        return None
+
+    if not chunks:
+        # Daemon refused the request (e.g. restarting after a code change)
+        return None
+    try:
+        return decode_reply(b"".join(chunks))
+    except ValueError:
+        return None
+
+
+def main():
+    """Main hook entry point."""
+    if len(sys.argv) != 2 or sys.argv[1] not in HOOKS:
+        print(f"Usage: hook_client.py <{'|'.join(HOOKS)}>", file=sys.stderr)
+        sys.exit(0)
+    hook = sys.argv[1]
+
+    raw = sys.stdin.buffer.read()
+    if not raw.strip():
+        sys.exit(0)
+
+    if os.environ.get("CLAUDE_HOOKS_NO_DAEMON") != "1":
+        reply = request_daemon(hook, raw)
+        if reply is not None:
+            code, stdout, stderr = reply
+            sys.stdout.buffer.write(stdout)
+            sys.stderr.buffer.write(stderr)
+            sys.exit(code)
+
+    import json
+
+    try:
+        input_data = json.loads(raw)
+    except json.JSONDecodeError:
+        sys.exit(0)
+
+    sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+    sys.exit(run_in_process(hook, input_data))
+
+
+if __name__ == "__main__":
+    main()
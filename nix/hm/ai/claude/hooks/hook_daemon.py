@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Optional per-user daemon that keeps the Claude hook modules warm.
+
+    hook_daemon.py start    # spawn in the background (no-op if running)
+    hook_daemon.py stop
+    hook_daemon.py status
+    hook_daemon.py serve    # run in the foreground
+
+hook_client.py forwards each hook event over a Unix socket (see
+hook_client.socket_path()). The daemon imports every hook module once at
+startup, then forks a child per request: the child applies the request's cwd
+and environment, runs the hook entry point with stdout/stderr captured and
+replies with its exit code, stdout and stderr (wire format in hook_client). Forking keeps requests isolated
+(cwd, env, sys.exit) while still skipping interpreter start-up and imports.
+
+Nothing a child computes survives it, so in-memory caches are built in the
+parent instead (WARM_CACHES: the compiled phrase classifier and forbidden-bash
+rules), at startup and again before each fork; every child inherits them
+ready. Those loaders check their config files and only rebuild when one
+changed, so re-priming costs a stat or two. The transcript checkpoints and
+other caches hooks keep on disk stay warm across requests as well.
+
+When a hook source file changes, the daemon refuses the next request (the
+client then runs it in-process) and exits, so a `start` picks up new code.
+It also exits after IDLE_TIMEOUT seconds without requests. It refuses to
+start if the socket directory already exists but is not a private (0700)
+directory of the current user.
+"""
+
+import fcntl
+import io
+import json
+import os
+import signal
+import socketserver
+import stat
+import subprocess
+import sys
+import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+HOOKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(HOOKS_DIR))
+
+from hook_client import FORWARDED_ENV, HOOKS, is_private, run_in_process, socket_path  # noqa: E402
+
+# Upper bound on a request (hook stdin is a small JSON document)
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+IDLE_TIMEOUT = 4 * 3600  # seconds
+POLL_INTERVAL = 30  # seconds between idle checks / child reaping
+
+# (module, loader) pairs whose in-memory caches the parent keeps built for its children
+WARM_CACHES = (
+    ("phrase_classifier", "load"),
+    ("prevent_forbidden_bash", "load_rules"),
+)
+
+
+def module_mtimes() -> dict[str, int]:
+    """Return mtime_ns of every hook source file, to detect code changes."""
+    mtimes = {}
+    for path in HOOKS_DIR.glob("*.py"):
+        try:
+            mtimes[path.name] = path.stat().st_mtime_ns
+        except OSError:
+            continue
+    return mtimes
+
+
+def prime_caches():
+    """Build (or revalidate) the WARM_CACHES in this process; errors are left to the hooks."""
+    for module_name, loader in WARM_CACHES:
+        try:
+            getattr(__import__(module_name), loader)()
+        except Exception:
+            traceback.print_exc()
+
+
+class HookRequestHandler(socketserver.StreamRequestHandler):
+    """Runs in the forked child: execute one hook event and reply."""
+
+    def handle(self):
+        # The parent's handlers raise SystemExit to stop serving; children die normally
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            header, raw = self.rfile.read(MAX_REQUEST_BYTES).split(b"\0\0", 1)
+            hook, cwd, *env = header.decode("utf-8").split("\0")
+            if hook not in HOOKS:
+                raise ValueError(f"unknown hook: {hook}")
+        except Exception as e:
+            self.reply(1, "", f"hook_daemon: bad request: {e}\n")
+            return
+
+        try:
+            input_data = json.loads(raw)
+        except json.JSONDecodeError:
+            # Same as the standalone hooks: ignore malformed input
+            self.reply(0, "", "")
+            return
+
+        for key in FORWARDED_ENV:
+            os.environ.pop(key, None)
+        os.environ.update(item.split("=", 1) for item in env)
+        try:
+            os.chdir(cwd or "/")
+        except OSError:
+            pass
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                code = run_in_process(hook, input_data)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except Exception:
+                traceback.print_exc()
+                code = 1
+        self.reply(code or 0, stdout.getvalue(), stderr.getvalue())
+
+    def reply(self, code: int, stdout: str, stderr: str):
+        out = stdout.encode("utf-8")
+        self.wfile.write(f"{code}\0{len(out)}\0".encode("utf-8") + out + stderr.encode("utf-8"))
+
+
+class HookServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """Forking Unix-socket server that stops when its hook code goes stale."""
+
+    timeout = POLL_INTERVAL
+
+    def __init__(self, path: str):
+        super().__init__(path, HookRequestHandler)
+        self.started_mtimes = module_mtimes()
+        self.last_request = time.monotonic()
+        self.stopping = False
+
+    def verify_request(self, request, client_address) -> bool:
+        # Runs in the parent before forking: refuse (client falls back) if code changed
+        self.last_request = time.monotonic()
+        if module_mtimes() != self.started_mtimes:
+            self.stopping = True
+            return False
+        prime_caches()
+        return True
+
+    def serve_until_idle(self):
+        while not self.stopping:
+            self.handle_request()
+            self.collect_children()
+            if time.monotonic() - self.last_request > IDLE_TIMEOUT:
+                break
+
+
+def pid_file() -> Path:
+    return Path(socket_path()).with_name("daemon.pid")
+
+
+def read_pid() -> int | None:
+    """Return the pid of a live daemon, or None."""
+    try:
+        pid = int(pid_file().read_text().strip())
+        os.kill(pid, 0)
+        return pid
+    except (OSError, ValueError):
+        return None
+
+
+def serve():
+    """Run the daemon in the foreground until idle, stale or signalled."""
+    sock = Path(socket_path())
+    try:
+        sock.parent.mkdir(mode=0o700, parents=True)
+        os.chmod(sock.parent, 0o700)  # mkdir's mode is masked by the umask
+    except FileExistsError:
+        pass
+    if not is_private(str(sock.parent), stat.S_ISDIR):
+        # Someone else may own it (e.g. created first in a shared /tmp)
+        print(f"hook_daemon: {sock.parent} is not a private directory of this user", file=sys.stderr)
+        return
+
+    # Single instance per user: hold an exclusive lock for our lifetime
+    lock = open(sock.with_name("daemon.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        print("hook_daemon: already running", file=sys.stderr)
+        return
+
+    # Import every hook module and build their caches up front; forked children inherit them
+    for module_name, _ in HOOKS.values():
+        __import__(module_name)
+    prime_caches()
+
+    sock.unlink(missing_ok=True)
+    server = HookServer(str(sock))
+    os.chmod(sock, 0o600)
+    pid_file().write_text(str(os.getpid()))
+
+    def stop(signum, frame):
+        # Interrupts the blocking accept immediately; cleanup runs in `finally`
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        server.serve_until_idle()
+    finally:
+        server.server_close()
+        sock.unlink(missing_ok=True)
+        pid_file().unlink(missing_ok=True)
+
+
+def start():
+    """Spawn the daemon detached from the calling terminal/session."""
+    if read_pid():
+        return
+    subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "serve"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "serve":
+        serve()
+    elif command == "start":
+        start()
+    elif command == "stop":
+        pid = read_pid()
+        if pid:
+            os.kill(pid, signal.SIGTERM)
+    elif command == "status":
+        pid = read_pid()
+        print(f"running (pid {pid}, socket {socket_path()})" if pid else "not running")
+    else:
+        print("Usage: hook_daemon.py [start|stop|status|serve]", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Append-only JSONL event journals under `.claude/logs/`.
+
+Each journal is an active segment `<name>.jsonl` that hooks append one record
+to (a single O_APPEND write, see storage.append_line), so logging an event
+costs the same however long the history is. The active segment is rotated to
+`<name>.<YYYYmmdd-HHMMSS-ffffff>.jsonl[.gz]` when it grows past
+MAX_SEGMENT_BYTES or its first record is older than MAX_SEGMENT_AGE_DAYS;
+only the newest KEEP_SEGMENTS rotated segments are kept.
+
+Appends hold a shared lock on the active segment and rotation an exclusive
+one, so no append can land in a segment after it has been renamed away and
+compressed.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator
+
+import storage
+
+MAX_SEGMENT_BYTES = 1024 * 1024
+MAX_SEGMENT_AGE_DAYS = 30
+KEEP_SEGMENTS = 10
+COMPRESS_ROTATED = True
+STAMP_FORMAT = "%Y%m%d-%H%M%S-%f"
+
+
+def active_segment(log_dir: str | Path, name: str) -> Path:
+    return Path(log_dir) / f"{name}.jsonl"
+
+
+def rotated_segments(log_dir: str | Path, name: str) -> list[Path]:
+    """Return rotated segments oldest first (the stamp sorts chronologically)."""
+    log_dir = Path(log_dir)
+    if not log_dir.is_dir():
+        return []
+    segments = [p for p in log_dir.glob(f"{name}.*.jsonl*") if p.name.endswith((".jsonl", ".jsonl.gz"))]
+    return sorted(segments, key=lambda p: p.name)
+
+
+def append_event(
+    log_dir: str | Path,
+    name: str,
+    event: dict,
+    max_bytes: int = MAX_SEGMENT_BYTES,
+    max_age_days: int = MAX_SEGMENT_AGE_DAYS,
+    compress: bool = COMPRESS_ROTATED,
+) -> None:
+    """Append one event to the journal, rotating the active segment if due."""
+    path = active_segment(log_dir, name)
+    rotated = None
+    if _rotation_due(path, max_bytes, max_age_days):
+        rotated = rotate(log_dir, name, max_bytes, max_age_days)
+    with storage.file_lock(path, shared=True):
+        storage.append_line(path, json.dumps(event))
+    if rotated is not None:
+        _finish_rotation(rotated, log_dir, name, compress)
+
+
+def _rotation_due(path: Path, max_bytes: int, max_age_days: int) -> bool:
+    try:
+        if path.stat().st_size >= max_bytes:
+            return True
+        with open(path, "r") as f:
+            first = json.loads(f.readline())
+        started = datetime.fromisoformat(first["timestamp"])
+    except (OSError, ValueError, KeyError, TypeError):
+        # Missing or empty segment, or a record without a timestamp
+        return False
+    return datetime.now() - started >= timedelta(days=max_age_days)
+
+
+def rotate(
+    log_dir: str | Path,
+    name: str,
+    max_bytes: int = MAX_SEGMENT_BYTES,
+    max_age_days: int = MAX_SEGMENT_AGE_DAYS,
+) -> Path | None:
+    """Rename the active segment aside if still due; returns the rotated path."""
+    path = active_segment(log_dir, name)
+    with storage.file_lock(path):
+        # Another session may have rotated while we waited for the lock
+        if not _rotation_due(path, max_bytes, max_age_days):
+            return None
+        rotated = path.with_name(f"{name}.{datetime.now().strftime(STAMP_FORMAT)}.jsonl")
+        os.replace(path, rotated)
+        return rotated
+
+
+def _finish_rotation(rotated: Path, log_dir: str | Path, name: str, compress: bool) -> None:
+    """Compress a rotated segment and prune old ones. Best effort."""
+    try:
+        if compress:
+            _gzip(rotated)
+        for old in rotated_segments(log_dir, name)[:-KEEP_SEGMENTS]:
+            old.unlink(missing_ok=True)
+    except Exception as e:
+        print(f"Failed to finish journal rotation: {e}", file=sys.stderr)
+
+
+def _gzip(path: Path) -> None:
+    target = path.with_name(path.name + ".gz")
+    tmp = path.with_name(f".{target.name}.{os.getpid()}.tmp")
+    with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.chmod(tmp, 0o600)
+    os.replace(tmp, target)
+    path.unlink()
+
+
+def iter_events(log_dir: str | Path, name: str) -> Iterator[dict]:
+    """Yield every event in the journal, oldest first, skipping corrupt lines."""
+    for path in rotated_segments(log_dir, name) + [active_segment(log_dir, name)]:
+        opener = gzip.open if path.suffix == ".gz" else open
+        try:
+            with opener(path, "rt") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
+
+
+def migrate_legacy_array(legacy_file: str | Path, log_dir: str | Path, name: str) -> bool:
+    """Move events from a legacy JSON array file into a rotated journal segment.
+
+    Runs once: the legacy file is removed after its events are written. The
+    segment is stamped with the legacy file's mtime, so it sorts before every
+    segment rotated since.
+
+    Returns:
+        True if a legacy file was migrated
+    """
+    legacy_file = Path(legacy_file)
+    if not legacy_file.exists():
+        return False
+    with storage.file_lock(active_segment(log_dir, name)):
+        try:
+            st = legacy_file.stat()
+        except FileNotFoundError:
+            return False  # Migrated by another session meanwhile
+        events = storage.read_json(legacy_file, [])
+        if not isinstance(events, list):
+            events = []
+        if events:
+            stamp = datetime.fromtimestamp(st.st_mtime).strftime(STAMP_FORMAT)
+            storage.atomic_write_text(
+                Path(log_dir) / f"{name}.{stamp}.jsonl",
+                "".join(json.dumps(event) + "\n" for event in events),
+            )
+        legacy_file.unlink()
+    return True
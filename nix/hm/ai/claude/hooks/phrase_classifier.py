@@ -0,0 +1,132 @@
+"""Multi-pattern phrase matcher behind the /handoff message heuristics.
+
+The phrase lists live in `handoff_phrases.json` next to this file, as
+{category: [phrase, ...]}; a user file at
+`$XDG_CONFIG_HOME/claude-hooks/handoff_phrases.json` with the same shape adds
+phrases (and categories) to them. Matching is case-sensitive substring
+search, so callers pass lowercased text.
+
+All phrases compile into one regex shaped like their prefix trie, so a text
+is scanned once (`findall`, longest phrase at each position) however many
+phrases there are, instead of once per phrase. Two tables make that scan
+report every phrase the text contains, like Aho-Corasick's output and failure
+links:
+
+- a match stands for every phrase it contains
+- a phrase starting inside a match and running past its end is skipped by the
+  scan; the few phrases that can do so are checked for separately
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+
+DEFAULT_PHRASES_FILE = Path(__file__).with_name("handoff_phrases.json")
+
+
+def user_phrases_file() -> Path:
+    base = os.environ.get("XDG_CONFIG_HOME") or str(Path.home() / ".config")
+    return Path(base) / "claude-hooks" / "handoff_phrases.json"
+
+
+class PhraseClassifier:
+    """Report which phrases of which categories occur in a text, in one scan."""
+
+    def __init__(self, phrases: dict[str, list[str]]):
+        categories: dict[str, set[str]] = {}
+        for category, items in phrases.items():
+            for phrase in items:
+                if phrase:
+                    categories.setdefault(phrase, set()).add(category)
+        words = sorted(categories)
+
+        # (category, phrase) pairs a match of each phrase stands for
+        self.outputs = {
+            word: tuple((category, inner) for inner in words if inner in word for category in categories[inner])
+            for word in words
+        }
+        # Phrases that can start inside a match of each phrase and end past it
+        self.overlaps = {word: _overlapping(word, words) for word in words}
+        self.pattern = re.compile(_trie_pattern(words) if words else "(?!)")
+
+    def classify(self, text: str) -> dict[str, int]:
+        """Return {category: number of distinct phrases found} for the categories present."""
+        matched = set(self.pattern.findall(text))
+        for word in list(matched):
+            matched.update(other for other in self.overlaps[word] if other in text)
+        found = set()
+        for word in matched:
+            found.update(self.outputs[word])
+
+        counts: dict[str, int] = {}
+        for category, _ in found:
+            counts[category] = counts.get(category, 0) + 1
+        return counts
+
+
+def _trie_pattern(words: list[str]) -> str:
+    """Regex matching the longest of `words` at a position (greedy trie)."""
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # Optional continuation: greedy, so the longer phrase wins
+            return body + "?" if len(branches) == 1 and len(body) == 1 else f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+
+def _overlapping(word: str, words: list[str]) -> tuple[str, ...]:
+    """Phrases that start with a proper suffix of `word` and are longer than it."""
+    suffixes = [word[k:] for k in range(1, len(word))]
+    return tuple(
+        other
+        for other in words
+        if other not in word and any(len(other) > len(suffix) and other.startswith(suffix) for suffix in suffixes)
+    )
+
+
+def load_phrases() -> dict[str, list[str]]:
+    """Read the default phrase lists, extended by the user's file if present."""
+    with open(DEFAULT_PHRASES_FILE, "r") as f:
+        phrases = json.load(f)
+    try:
+        with open(user_phrases_file(), "r") as f:
+            extra = json.load(f)
+    except (OSError, ValueError):
+        extra = {}
+    if isinstance(extra, dict):
+        for category, items in extra.items():
+            if isinstance(items, list):
+                phrases.setdefault(category, []).extend(p for p in items if isinstance(p, str))
+    return phrases
+
+
+_LOADED: tuple[tuple, PhraseClassifier] | None = None
+
+
+def load() -> PhraseClassifier:
+    """Return the classifier for the current phrase files (rebuilt when they change)."""
+    global _LOADED
+    key = []
+    for path in (DEFAULT_PHRASES_FILE, user_phrases_file()):
+        try:
+            st = path.stat()
+            key.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            key.append(None)
+    key = tuple(key)
+    if _LOADED is None or _LOADED[0] != key:
+        _LOADED = (key, PhraseClassifier(load_phrases()))
+    return _LOADED[1]
@@ -7,8 +7,8 @@
 
 This hook:
 1. Detects when user types "/pickup"
-2. If a specific handoff file is provided, marks it as handled (moves to handled/)
-3. Scans .claude/handoffs/ directory for available handoff files
+2. If a specific handoff file is provided, marks it as handled in the handoff registry
+3. Lists the available handoff files from the registry (see handoff_registry.py)
 4. Appends the list of available handoffs as context to the prompt
 """
 
@@ -16,73 +16,20 @@ import json
 import os
 import sys
 from pathlib import Path
-from datetime import datetime
 
-
-def mark_handoff_as_handled(project_dir: str, handoff_name: str) -> bool:
-    """Mark a handoff file as handled via metadata file.
-
-    Args:
-        project_dir: Project root directory
-        handoff_name: Name of the handoff file (just filename, not path)
-
-    Returns:
-        True if successfully marked, False otherwise
-    """
-    handoffs_dir = Path(project_dir) / ".claude" / "handoffs"
-    metadata_file = handoffs_dir / ".handled.json"
-
-    try:
-        # Load existing metadata
-        handled = {}
-        if metadata_file.exists():
-            handled = json.loads(metadata_file.read_text())
-
-        # Add this handoff with timestamp
-        handled[handoff_name] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        # Write back
-        metadata_file.write_text(json.dumps(handled, indent=2))
-        return True
-    except Exception as e:
-        print(f"Failed to mark handoff as handled: {e}", file=sys.stderr)
-        return False
+import handoff_registry
 
 
 def scan_handoffs_directory(project_dir: str) -> list[dict]:
-    """Scan .claude/handoffs/ directory for handoff files.
+    """List handoff files in .claude/handoffs/, newest first.
 
     Args:
         project_dir: Project root directory
 
     Returns:
-        List of handoff file info dicts with 'name', 'path', 'modified', 'size'
+        List of handoff file info dicts with 'name', 'path', 'modified'
     """
-    handoffs_dir = Path(project_dir) / ".claude" / "handoffs"
-
-    if not handoffs_dir.exists():
-        return []
-
-    handoffs = []
-    for filepath in sorted(
-        handoffs_dir.glob("*.md"), key=lambda p: p.stat().st_mtime, reverse=True
-    ):
-        # Skip files in handled/ subdirectory
-        if "handled" in filepath.parts:
-            continue
-
-        stat = filepath.stat()
-        handoffs.append(
-            {
-                "name": filepath.name,
-                "path": str(filepath.relative_to(project_dir)),
-                "modified": datetime.fromtimestamp(stat.st_mtime).strftime(
-                    "%Y-%m-%d %H:%M:%S"
-                ),
-            }
-        )
-
-    return handoffs
+    return handoff_registry.list_handoffs(project_dir)
 
 
 def format_handoffs_context(handoffs: list[dict]) -> str:
@@ -109,20 +56,18 @@ def format_handoffs_context(handoffs: list[dict]) -> str:
     return "\n".join(lines)
 
 
-def main():
-    """Main hook entry point."""
-    try:
-        input_data = json.load(sys.stdin)
-    except json.JSONDecodeError as e:
-        print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
-        sys.exit(1)
+def handle_prompt(input_data: dict) -> int:
+    """Handle a UserPromptSubmit event in-process.
 
+    Used directly by user_prompt_dispatch.py; prints the hook output and
+    returns the exit code instead of exiting.
+    """
     prompt = input_data.get("prompt", "").strip()
 
     # Check if this is a /pickup command
     if not prompt.startswith("/pickup"):
         # Not a pickup command, allow it to proceed normally
-        sys.exit(0)
+        return 0
 
     print("Detected /pickup command, processing...", file=sys.stderr)
 
@@ -138,7 +83,7 @@ def main():
         # Clean up the argument - handle potential paths
         handoff_name = Path(handoff_arg).name
         if handoff_name.endswith(".md"):
-            if mark_handoff_as_handled(project_dir, handoff_name):
+            if handoff_registry.mark_handled(project_dir, handoff_name):
                 print(f"Marked handoff as handled: {handoff_name}", file=sys.stderr)
             else:
                 print(
@@ -151,7 +96,7 @@ def main():
 
     if not handoffs and not handoff_arg:
         # just exit
-        sys.exit(0)
+        return 0
 
     # Format list of available handoffs
     context = format_handoffs_context(handoffs) if handoffs else ""
@@ -169,7 +114,18 @@ def main():
     }
 
     print(json.dumps(output))
-    sys.exit(0)
+    return 0
+
+
+def main():
+    """Main hook entry point."""
+    try:
+        input_data = json.load(sys.stdin)
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    sys.exit(handle_prompt(input_data))
 
 
 if __name__ == "__main__":
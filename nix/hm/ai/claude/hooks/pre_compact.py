@@ -7,7 +7,8 @@
 """PreCompact hook - logs compaction events to JSONL file.
 
 Triggered before Claude compacts the conversation context.
-Logs are appended to .claude/logs/pre_compact.jsonl for debugging.
+Logs are appended to the .claude/logs/pre_compact.jsonl journal (rotated,
+see journal.py) for debugging.
 """
 
 import json
@@ -16,14 +17,13 @@ import sys
 from pathlib import Path
 from datetime import datetime
 
+import journal
+import rolling_summary
+
 
 def log_pre_compact(input_data: dict, project_dir: str) -> None:
-    """Append pre-compact event to JSONL log (efficient append-only)."""
+    """Append pre-compact event to the JSONL journal (efficient append-only)."""
     try:
-        log_dir = Path(project_dir) / ".claude" / "logs"
-        log_dir.mkdir(parents=True, exist_ok=True)
-        log_file = log_dir / "pre_compact.jsonl"
-
         # Add timestamp to the log entry
         entry = {
             "timestamp": datetime.now().isoformat(),
@@ -31,13 +31,29 @@ def log_pre_compact(input_data: dict, project_dir: str) -> None:
             "trigger": input_data.get("trigger", ""),
         }
 
-        # Append single line (JSONL format - no need to read/rewrite entire file)
-        with open(log_file, "a") as f:
-            f.write(json.dumps(entry) + "\n")
+        journal.append_event(Path(project_dir) / ".claude" / "logs", "pre_compact", entry)
     except Exception:
         pass  # Don't fail the hook if logging fails
 
 
+def handle_pre_compact(input_data: dict) -> int:
+    """Handle a PreCompact event in-process and return the exit code."""
+    project_dir = os.environ.get("CLAUDE_PROJECT_DIR") or input_data.get("cwd", ".")
+
+    # Log the pre-compact event
+    log_pre_compact(input_data, project_dir)
+
+    # Fold the turns about to be compacted into the rolling summary (opt-in)
+    if rolling_summary.enabled():
+        try:
+            rolling_summary.maybe_roll(input_data)
+        except Exception:
+            pass
+
+    # Success - compaction will proceed
+    return 0
+
+
 def main():
     """Main hook entry point."""
     try:
@@ -46,13 +62,7 @@ def main():
             sys.exit(0)
 
         input_data = json.loads(raw)
-        project_dir = os.environ.get("CLAUDE_PROJECT_DIR") or input_data.get("cwd", ".")
-
-        # Log the pre-compact event
-        log_pre_compact(input_data, project_dir)
-
-        # Success - compaction will proceed
-        sys.exit(0)
+        sys.exit(handle_pre_compact(input_data))
 
     except Exception:
         sys.exit(0)
@@ -13,7 +13,24 @@ Improvements (2025-11-25):
 - Preserve multi-word command matching (e.g. "jj git init").
 - Correctly allow `grep` when it is part of a pipeline segment (preceded by `|`).
 
-Blocked when segment FIRST tokens match any forbidden sequence:
+Commands are split by `shell_lexer`, a single-pass lexer that knows quotes,
+heredocs, `$(...)`, subshells, `env`/`sudo` prefixes and `bash -c` payloads,
+so `sudo git push` or `echo "$(git push)"` are caught and a `;` inside quotes
+does not split. Malformed input (e.g. an unterminated quote) is still checked
+up to where it breaks instead of being let through.
+
+Rules live in `forbidden_bash.json` next to this file; a file of the same shape
+at `$XDG_CONFIG_HOME/claude-hooks/forbidden_bash.json` adds rules or overrides
+them (same sequence; `"decision": "allow"` lifts a default). Each rule has
+`sequences` of leading tokens (matched case-insensitively), a `decision`
+("deny" or "ask") and optionally a `reason` and `allow_after_pipe`.
+
+The rules compile into a token trie; a segment's leading tokens are walked
+down it and the longest matching sequence wins, so the cost of a check does
+not grow with the number of rules. The compiled form is cached under
+`$XDG_CACHE_HOME/claude-hooks/bash_rules/<sha256 of the config>.json`.
+
+Default rules, blocked when segment FIRST tokens match:
 - find          -> suggest fd
 - grep (non‑pipeline) -> suggest rg
 - jj git init   -> ask user
@@ -21,128 +38,152 @@ Blocked when segment FIRST tokens match any forbidden sequence:
 - git init      -> ask user
 - git push      -> ask user
 - git clean     -> ask user
+- rm -rf        -> ask user
+- docker system prune -> ask user
+- kubectl delete -> ask user
 
 Return code 2 blocks execution; 0 allows.
 """
 from __future__ import annotations
 
+import hashlib
 import json
-import re
-import shlex
+import os
 import sys
+from pathlib import Path
 from typing import List, Dict, Any
 
-# Structured forbidden command definitions (ordered by specificity)
-FORBIDDEN_COMMANDS: List[Dict[str, Any]] = [
-    {
-        "sequence": ["find"],
-        "name": "find",
-        "alternative": "fd",
-        "examples": [
-            'fd "*.py"                       # Find Python files',
-            'fd -e js "component"            # Find JS files matching "component"',
-            "fd -d 2                        # Search 2 directories deep",
-            "fd --hidden                      # Include hidden files",
-            'fd -i "config"                  # Case-insensitive search',
-        ],
-        "benefits": "",
-    },
-    {
-        "sequence": ["grep"],
-        "name": "grep",
-        "alternative": "rg",
-        "examples": [
-            'rg "TODO"                         # Search for TODO in all files',
-            'rg -tpy "import"                  # Search only in Python files',
-            'rg -tjs "useState"                # Search only in JavaScript files',
-            'rg --glob "*.md" "# Heading"      # Search only in markdown files',
-            'rg -C 2 "error"                  # Show 2 lines of context',
-            'rg -i "error"                     # Case-insensitive search',
-        ],
-        "benefits": "",
-    },
-    {
-        "sequence": ["jj", "git", "init"],
-        "name": "jj git init",
-        "alternative": "ask user to run it",
-        "examples": ["User, please initialize the jj git repo."],
-        "benefits": "Prevents accidental jj repo creation",
-    },
-    {
-        "sequence": ["jj", "git", "push"],
-        "name": "jj git push",
-        "alternative": "ask user to run it",
-        "examples": ["User, please push the changes with jj."],
-        "benefits": "Prevents accidental jj pushes",
-    },
-    {
-        "sequence": ["git", "init"],
-        "name": "git init",
-        "alternative": "ask user to run it",
-        "examples": ["User, please initialize the git repository."],
-        "benefits": "Prevents accidental repo creation",
-    },
-    {
-        "sequence": ["git", "push"],
-        "name": "git push",
-        "alternative": "ask user to run it",
-        "examples": ["User, please push the changes."],
-        "benefits": "Prevents accidental pushes",
-    },
-    {
-        "sequence": ["git", "clean"],
-        "name": "git clean",
-        "alternative": "ask user to run it",
-        "examples": ["User, please clean the repository."],
-        "benefits": "Prevents accidental deletion of untracked files",
-    },
-]
-
-SEPARATOR_REGEX = r"(\|\|?|&&|;|&)"  # capture |, ||, &&, ;, &
-
-
-def split_segments(command: str):
-    """Split a command string into segments with knowledge of preceding separator.
-
-    Each segment dict contains:
-        segment: str  - the raw segment text (trimmed)
-        separator_before: str | None - one of |, ||, &&, ;, & that preceded it
+import shell_lexer
+import storage
+
+DEFAULT_RULES_FILE = Path(__file__).with_name("forbidden_bash.json")
+RULES_VERSION = 1  # part of the cache key; bump when the compiled format changes
+DECISIONS = ("deny", "ask", "allow")
+
+
+def user_rules_file() -> Path:
+    base = os.environ.get("XDG_CONFIG_HOME") or str(Path.home() / ".config")
+    return Path(base) / "claude-hooks" / "forbidden_bash.json"
+
+
+def rules_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "claude-hooks" / "bash_rules"
+
+
+def compile_rules(configs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Compile rule configs (later ones override) into {"rules", "trie"}.
+
+    Trie nodes are {"next": {token: node}, "rule": index into rules}; tokens
+    are lowercased. Invalid rules are skipped.
     """
-    parts = re.split(SEPARATOR_REGEX, command)
-    segments = []
-    sep_before = None
-    for part in parts:
-        if not part:
-            continue
-        if re.fullmatch(SEPARATOR_REGEX, part):
-            sep_before = part  # applies to next segment
-            continue
-        seg = part.strip()
-        if seg:
-            segments.append({"segment": seg, "separator_before": sep_before})
-            sep_before = None
-    return segments
+    rules: List[Dict[str, Any]] = []
+    trie: Dict[str, Any] = {"next": {}}
+    for config in configs:
+        for rule in config.get("rules", []) if isinstance(config, dict) else []:
+            if not isinstance(rule, dict):
+                continue
+            sequences = [
+                [str(token).lower() for token in seq]
+                for seq in rule.get("sequences", [])
+                if isinstance(seq, list) and seq
+            ]
+            decision = rule.get("decision", "deny")
+            if not sequences or decision not in DECISIONS:
+                print(f"Skipping invalid bash rule: {rule}", file=sys.stderr)
+                continue
 
+            name = rule.get("name") or " ".join(sequences[0])
+            alternative = rule.get("alternative", "")
+            if decision == "deny" and alternative:
+                default_reason = f"Use '{alternative}' instead of '{name}'"
+            else:
+                default_reason = f"Confirm: {name}"
+            rules.append(
+                {
+                    **rule,
+                    "name": name,
+                    "decision": decision,
+                    "reason": rule.get("reason") or default_reason,
+                    "alternative": alternative,
+                    "sequences": sequences,
+                }
+            )
+            for seq in sequences:
+                node = trie
+                for token in seq:
+                    node = node["next"].setdefault(token, {"next": {}})
+                node["rule"] = len(rules) - 1
+    return {"rules": rules, "trie": trie}
 
-def tokenize(segment: str) -> List[str]:
-    try:
-        return shlex.split(segment)
-    except Exception:
-        # On failure, return empty list so it won't match
-        return []
+
+_COMPILED: Dict[str, Dict[str, Any]] = {}
+
+
+def load_rules() -> Dict[str, Any]:
+    """Return the compiled rules for the current config files.
+
+    Keyed by a hash of the config contents: in memory for this process, and
+    on disk so a new hook process only reads one JSON file.
+    """
+    raw = []
+    for path in (DEFAULT_RULES_FILE, user_rules_file()):
+        try:
+            raw.append(path.read_bytes())
+        except OSError:
+            raw.append(b"")
+    digest = hashlib.sha256()
+    digest.update(str(RULES_VERSION).encode())
+    for data in raw:
+        digest.update(b"\0" + data)
+    key = digest.hexdigest()
+
+    compiled = _COMPILED.get(key)
+    if compiled is not None:
+        return compiled
+    cache_file = rules_cache_dir() / f"{key}.json"
+    compiled = storage.read_json(cache_file)
+    if not isinstance(compiled, dict) or "trie" not in compiled:
+        configs = []
+        for data in raw:
+            try:
+                configs.append(json.loads(data) if data else {})
+            except ValueError as e:
+                print(f"Ignoring unreadable bash rules: {e}", file=sys.stderr)
+        compiled = compile_rules(configs)
+        try:
+            storage.atomic_write_json(cache_file, compiled)
+            for old in cache_file.parent.glob("*.json"):
+                if old != cache_file:
+                    old.unlink(missing_ok=True)
+        except OSError:
+            pass  # Cache is an optimization only
+    _COMPILED[key] = compiled
+    return compiled
+
+
+def lookup(compiled: Dict[str, Any], tokens: List[str]):
+    """Return the rule with the longest sequence matching the leading tokens, if any."""
+    node = compiled["trie"]
+    matched = None
+    for token in tokens:
+        node = node["next"].get(token.lower())
+        if node is None:
+            break
+        if "rule" in node:
+            matched = node["rule"]
+    if matched is None:
+        return None
+    rule = compiled["rules"][matched]
+    return None if rule["decision"] == "allow" else rule
 
 
 def match_forbidden(tokens: List[str]):
-    lowered = [t.lower() for t in tokens]
-    for entry in FORBIDDEN_COMMANDS:
-        seq = entry["sequence"]
-        if len(lowered) >= len(seq) and lowered[: len(seq)] == [s.lower() for s in seq]:
-            return entry
-    return None
+    return lookup(load_rules(), tokens)
 
 
 def check_forbidden_bash_commands(tool_name: str, tool_input: dict):
-    """Check if tool input contains forbidden Bash commands using segment-based parsing."""
+    """Check if tool input contains forbidden Bash commands, one simple command at a time."""
     if tool_name != "Bash":
         return None
 
@@ -150,45 +191,25 @@ def check_forbidden_bash_commands(tool_name: str, tool_input: dict):
     if not command:
         return None
 
-    for seginfo in split_segments(command):
-        tokens = tokenize(seginfo["segment"])
-        if not tokens:
-            continue
-        forbidden = match_forbidden(tokens)
+    for seginfo in shell_lexer.iter_commands(command):
+        forbidden = match_forbidden(seginfo["words"])
         if not forbidden:
             continue
-        # Allow grep when part of a pipeline (segment preceded by '|')
-        if forbidden["name"] == "grep" and seginfo["separator_before"] == "|":
+        # Allow e.g. grep when part of a pipeline (command preceded by '|')
+        if forbidden.get("allow_after_pipe") and seginfo["separator_before"] == "|":
             continue
         return forbidden
     return None
 
 
 def get_decision_and_reason(forbidden_command: dict, original_command: str):
-    """Return decision type and reason based on command type."""
-    name = forbidden_command["name"]
-    alt = forbidden_command["alternative"]
-
-    if alt in ("fd", "rg"):
-        # Policy enforcement: deny and suggest alternative
-        return "deny", f"Use '{alt}' instead of '{name}'"
-    else:
-        # Manual confirmation required: ask user
-        return "ask", f"Confirm: {name}"
+    """Return decision type and reason configured for the matched rule."""
+    return forbidden_command["decision"], forbidden_command["reason"]
 
 
-def main():
-    """Main PreToolUse hook function."""
+def handle_pre_tool_use(input_data: dict) -> int:
+    """Handle a PreToolUse event in-process; prints the decision and returns the exit code."""
     try:
-        raw_input = sys.stdin.read()
-        if not raw_input:
-            sys.exit(0)
-
-        try:
-            input_data = json.loads(raw_input)
-        except json.JSONDecodeError:
-            sys.exit(0)
-
         tool_name = input_data.get("tool_name", "")
         tool_input = input_data.get("tool_input", {})
 
@@ -197,7 +218,7 @@ def main():
         if forbidden:
             command = tool_input.get("command", "")
             decision, reason = get_decision_and_reason(forbidden, command)
-            
+
             # Return standard PreToolUse decision control schema
             output = {
                 "hookSpecificOutput": {
@@ -207,13 +228,29 @@ def main():
                 }
             }
             print(json.dumps(output))
-            sys.exit(0)
 
-        sys.exit(0)  # Allow execution
+        return 0  # Allow execution
+
+    except Exception:
+        return 0  # Fail open on errors
 
-    except Exception as e:
+
+def main():
+    """Main PreToolUse hook function."""
+    try:
+        raw_input = sys.stdin.read()
+        if not raw_input:
+            sys.exit(0)
+
+        try:
+            input_data = json.loads(raw_input)
+        except json.JSONDecodeError:
+            sys.exit(0)
+    except Exception:
         sys.exit(0)  # Fail open on errors
 
+    sys.exit(handle_pre_tool_use(input_data))
+
 
 if __name__ == "__main__":
     main()
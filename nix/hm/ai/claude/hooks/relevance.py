@@ -0,0 +1,112 @@
+"""BM25 relevance of session messages to what the session is about, for /handoff.
+
+Opt-in with CLAUDE_HOOKS_HANDOFF_RANKING=1. The query is the session's first
+user message plus the current todo list; every message is a document, so term
+weights come from this session alone. filter_messages_for_handoff adds the
+normalized score to its selection score, so when a conversation is over
+budget the turns that talk about the task outrank recent chatter.
+
+Messages are tokenized like the query (TOKEN_RE), once each, and only query
+terms are counted, so a term matches whole tokens only ("fix" is not found in
+"prefix") and lengths are in tokens; 5k messages take about 50ms. For large
+sessions NumPy, when installed, evaluates the BM25 formula over the
+term-frequency matrix (imported on first use, so short handoffs never pay
+for the import); the pure Python path gives the same scores.
+"""
+
+import math
+import os
+import re
+
+ENABLE_ENV = "CLAUDE_HOOKS_HANDOFF_RANKING"
+K1 = 1.2
+B = 0.75
+MAX_QUERY_TERMS = 32
+NUMPY_MIN_CELLS = 20_000  # documents x query terms
+
+TOKEN_RE = re.compile(r"[a-z0-9_]{3,}")
+STOPWORDS = frozenset(
+    """
+    a an and are as at be but by can do for from has have how i if in into is it its me my no not of on or
+    our so that the then there this to was we what when where which will with you your
+    """.split()
+)
+
+
+def enabled() -> bool:
+    return os.environ.get(ENABLE_ENV) == "1"
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def build_query(messages: list[dict], todos: list[dict] | None = None) -> list[str]:
+    """Distinct terms of the first user message and the todo list."""
+    parts = [next((m["content"] for m in messages if m["role"] == "user"), "")]
+    parts += [todo.get("content", "") for todo in todos or []]
+    terms = dict.fromkeys(t for t in tokenize(" ".join(parts)) if t not in STOPWORDS)
+    return list(terms)[:MAX_QUERY_TERMS]
+
+
+def bm25_scores(texts: list[str], query: list[str]) -> list[float]:
+    """Okapi BM25 score of each lowercased text for the query terms."""
+    n_docs = len(texts)
+    if not n_docs or not query:
+        return [0.0] * n_docs
+    columns = {term: [0] * n_docs for term in query}
+    lengths = []
+    for i, text in enumerate(texts):
+        tokens = TOKEN_RE.findall(text)
+        lengths.append(len(tokens))
+        # filter() keeps the per-token membership test in C; matches are few
+        for term in filter(columns.__contains__, tokens):
+            columns[term][i] += 1
+    tf = list(columns.values())  # Column per term
+    avg_length = sum(lengths) / n_docs or 1.0
+
+    np = _numpy() if n_docs * len(query) >= NUMPY_MIN_CELLS else None
+    if np is not None:
+        tf_arr = np.array(tf, dtype=float).T
+        df = np.count_nonzero(tf_arr, axis=0)
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        norm = K1 * (1.0 - B + B * np.array(lengths, dtype=float) / avg_length)
+        scores = (tf_arr * (K1 + 1.0) / (tf_arr + norm[:, None])) @ idf
+        return scores.tolist()
+
+    scores = [0.0] * n_docs
+    norms = [K1 * (1.0 - B + B * length / avg_length) for length in lengths]
+    for column in tf:
+        df = n_docs - column.count(0)
+        idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        for i, f in enumerate(column):
+            if f:
+                scores[i] += idf * f * (K1 + 1.0) / (f + norms[i])
+    return scores
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:  # optional
+        return None
+    return numpy
+
+
+def rank(messages: list[dict], todos: list[dict] | None = None) -> list[float] | None:
+    """Relevance of each message in [0, 1] (1 for the best match).
+
+    The first user message is part of the query, so it would always be the
+    best match; scores are scaled to the best among the other messages.
+
+    Returns:
+        None if there is nothing to rank against (no user message or todos,
+        or no other message shares a term with them)
+    """
+    query = build_query(messages, todos)
+    scores = bm25_scores([m["content"].lower() for m in messages], query)
+    first_user = next((i for i, m in enumerate(messages) if m["role"] == "user"), None)
+    top = max((score for i, score in enumerate(scores) if i != first_user), default=0.0)
+    if top <= 0:
+        return None
+    return [min(1.0, score / top) for score in scores]
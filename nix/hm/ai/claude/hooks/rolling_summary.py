@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Opt-in rolling handoff summary, folded in the background as a session grows.
+
+Enabled with CLAUDE_HOOKS_ROLLING_SUMMARY=1. On UserPromptSubmit (ordinary
+prompts) and PreCompact, maybe_roll() checks how far the transcript has grown
+past the summarized watermark; after ROLL_MIN_BYTES it spawns
+`rolling_summary.py <cwd> <session_id> <transcript>` detached. That process
+folds the new turns into the running summary with the rolling-summary role
+(summarizer.py) and stores
+
+    .claude/session-summary/.rolling/<session_id>.json
+        {"summary", "transcript": <realpath>, "inode", "offset", "line", "updated"}
+
+atomically. /handoff then only combines the stored summary with the turns
+after its watermark (compose_handoff) instead of waiting on an LLM call, and
+the SessionEnd summary job gets the stored summary as earlier context.
+
+A fold catches up in batches of MAX_BATCH_MESSAGES turns, storing the
+watermark after each batch, so no turn is skipped and a failed LLM call only
+retries the batch it was working on.
+"""
+
+import os
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import storage
+import summarizer
+import transcript
+
+ENABLE_ENV = "CLAUDE_HOOKS_ROLLING_SUMMARY"
+ROLLING_DIR = Path(".claude") / "session-summary" / ".rolling"
+ROLLING_ROLE = "rolling-summary"  # aichat role name
+ROLL_MIN_BYTES = 32 * 1024  # unsummarized transcript growth that triggers a fold
+MAX_BATCH_MESSAGES = 30
+FOLD_TIMEOUT = 120  # seconds
+
+
+def enabled() -> bool:
+    return os.environ.get(ENABLE_ENV) == "1"
+
+
+def project_dir(input_data: dict) -> str:
+    return os.environ.get("CLAUDE_PROJECT_DIR") or input_data.get("cwd", "")
+
+
+def state_path(cwd: str, session_id: str) -> Path:
+    return Path(cwd) / ROLLING_DIR / f"{session_id}.json"
+
+
+def load_state(cwd: str, session_id: str, transcript_path: str) -> dict:
+    """Load the rolling state, or {} if missing or made from another transcript."""
+    state = storage.read_json(state_path(cwd, session_id), {})
+    if not isinstance(state, dict) or "summary" not in state:
+        return {}
+    try:
+        st = os.stat(transcript_path)
+    except OSError:
+        return {}
+    if (
+        state.get("transcript") != os.path.realpath(transcript_path)
+        or state.get("inode") != st.st_ino
+        or not 0 <= state.get("offset", -1) <= st.st_size
+    ):
+        # Rotated or truncated: the summary no longer describes this file
+        return {}
+    return state
+
+
+def load_summary(cwd: str, session_id: str, transcript_path: str) -> str:
+    """Return the current rolling summary ('' if there is none)."""
+    return load_state(cwd, session_id, transcript_path).get("summary", "")
+
+
+def maybe_roll(input_data: dict) -> bool:
+    """Spawn a fold if enough transcript accumulated since the last one.
+
+    Cheap enough for every prompt: one stat and one small JSON read.
+
+    Returns:
+        True if a fold was started
+    """
+    session_id = input_data.get("session_id", "")
+    transcript_path = input_data.get("transcript_path", "")
+    cwd = project_dir(input_data)
+    if not (enabled() and session_id and transcript_path and cwd):
+        return False
+    try:
+        size = os.stat(transcript_path).st_size
+    except OSError:
+        return False
+    offset = load_state(cwd, session_id, transcript_path).get("offset", 0)
+    if size - offset < ROLL_MIN_BYTES:
+        return False
+
+    subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), cwd, session_id, transcript_path],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    return True
+
+
+def build_fold_prompt(previous: str, messages: list[dict], cwd: str) -> str:
+    from handoff_interceptor import format_conversation
+
+    return f"""Project directory: `{Path(cwd).resolve()}`
+
+# Current Summary:
+
+{previous or "None (start of session)"}
+
+# New Conversation:
+
+{format_conversation(messages)}"""
+
+
+def fold(cwd: str, session_id: str, transcript_path: str) -> bool:
+    """Fold the turns after the watermark into the summary (one at a time per session).
+
+    Returns:
+        True if the state was advanced
+    """
+    try:
+        with storage.file_lock(state_path(cwd, session_id), timeout=0):
+            return _fold_locked(cwd, session_id, transcript_path)
+    except TimeoutError:
+        return False  # Another fold for this session is running
+
+
+def _fold_locked(cwd: str, session_id: str, transcript_path: str) -> bool:
+    from handoff_interceptor import filter_messages_for_handoff
+
+    state = load_state(cwd, session_id, transcript_path)
+    st = os.stat(transcript_path)
+    summary = state.get("summary", "")
+    offset, line = state.get("offset", 0), state.get("line", 0)
+    advanced = False
+    # Catch up to the size seen at the start; later turns wait for the next trigger
+    while True:
+        data = transcript.parse_from(
+            transcript_path, ("handoff_messages",), offset, line, max_handoff_messages=MAX_BATCH_MESSAGES
+        )
+        messages = filter_messages_for_handoff(data["handoff_messages"])
+        if messages:
+            prompt = build_fold_prompt(summary, messages, cwd)
+            try:
+                summary = summarizer.summarize(ROLLING_ROLE, prompt, cwd, FOLD_TIMEOUT)
+            except Exception as e:
+                summary = ""
+                print(f"rolling summary failed: {e}", file=sys.stderr)
+            if not summary:
+                # Keep the watermark; the next trigger retries this batch
+                return advanced
+
+        storage.atomic_write_json(
+            state_path(cwd, session_id),
+            {
+                "summary": summary,
+                "transcript": os.path.realpath(transcript_path),
+                "inode": st.st_ino,
+                "offset": data["offset"],
+                "line": data["line"],
+                "updated": datetime.now().isoformat(),
+            },
+        )
+        advanced = True
+        offset, line = data["offset"], data["line"]
+        if len(data["handoff_messages"]) < MAX_BATCH_MESSAGES or offset >= st.st_size:
+            return True
+
+
+def compose_handoff(
+    cwd: str, session_id: str, transcript_path: str, todos: list[dict] | None = None
+) -> tuple[str, list[dict]] | None:
+    """Combine the rolling summary with the turns after its watermark.
+
+    Returns:
+        (handoff text, tail messages), or None when there is no rolling summary
+        yet and /handoff has to summarize from scratch
+    """
+    from handoff_interceptor import MAX_MESSAGES, filter_messages_for_handoff, format_conversation, format_todos
+
+    state = load_state(cwd, session_id, transcript_path)
+    if not state.get("summary"):
+        return None
+    data = transcript.parse_from(
+        transcript_path, ("handoff_messages",), state["offset"], state["line"]
+    )
+    tail = filter_messages_for_handoff(data["handoff_messages"][-MAX_MESSAGES:])
+
+    sections = [state["summary"]]
+    if tail:
+        sections.append(f"## Since Last Summary\n\n{format_conversation(tail)}")
+    formatted_todos = format_todos(todos or [])
+    if formatted_todos:
+        sections.append(f"## Current Todo List\n\n{formatted_todos}")
+    return "\n\n".join(sections), tail
+
+
+def main():
+    if len(sys.argv) != 4:
+        print("Usage: rolling_summary.py <project dir> <session id> <transcript>", file=sys.stderr)
+        sys.exit(2)
+    try:
+        fold(*sys.argv[1:])
+    except Exception as e:
+        print(f"rolling summary failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@
 """Hook: SessionStart reminder for Claude.
 
 Reads JSON from stdin, extracts session_id and project directory,
-logs the event to `.claude/logs/session_start.json`, and prints JSON
+logs the event to the `.claude/logs/session_start.jsonl` journal, and prints JSON
 with hookSpecificOutput to inject a short reminder into Claude's context.
 
 The script mirrors the style and error handling of `pre_compact.py`.
@@ -18,43 +18,24 @@ The script mirrors the style and error handling of `pre_compact.py`.
 import argparse
 import json
 import os
-import subprocess
 import sys
 from pathlib import Path
 from datetime import datetime
 
+import journal
+
 
 # Constants
 LOG_DIR = Path(".claude/logs")
-LOG_FILE = LOG_DIR / "session_start.json"
+JOURNAL_NAME = "session_start"
+# Array file written before the journal; its events are migrated once
+LEGACY_LOG_FILE = LOG_DIR / "session_start.json"
 DATE_FORMAT = "%Y-%m-%d"
 
 
-def load_log_data(log_file):
-    """Load existing log data or return empty list."""
-    if log_file.exists():
-        try:
-            with open(log_file, "r") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, ValueError):
-            pass
-    return []
-
-
-def save_log_data(log_file, log_data):
-    """Save log data and set restrictive permissions."""
-    log_file.parent.mkdir(parents=True, exist_ok=True)
-    with open(log_file, "w") as f:
-        json.dump(log_data, f, indent=2)
-    try:
-        os.chmod(log_file, 0o600)
-    except Exception:
-        pass  # Best effort
-
-
 def log_session_start(input_data):
-    """Log SessionStart event to log file."""
-    log_data = load_log_data(LOG_FILE)
+    """Append SessionStart event to the session_start journal."""
+    journal.migrate_legacy_array(LEGACY_LOG_FILE, LOG_DIR, JOURNAL_NAME)
     entry = {
         "timestamp": datetime.now().isoformat(),
         "session_id": input_data.get("session_id"),
@@ -62,8 +43,7 @@ def log_session_start(input_data):
         "hook_event_name": input_data.get("hook_event_name"),
         "source": input_data.get("source"),
     }
-    log_data.append(entry)
-    save_log_data(LOG_FILE, log_data)
+    journal.append_event(LOG_DIR, JOURNAL_NAME, entry)
 
 
 def sanitize_string(value):
@@ -73,35 +53,45 @@ def sanitize_string(value):
     return " ".join(value.strip().split())
 
 
+def find_repo_type(project_dir):
+    """Return "jj", "git" or None for project_dir without running jj or git.
+
+    Same priority as the git-jj skill's repo_check.sh: a `.jj` directory in
+    any ancestor wins (jj often runs atop git, and `jj root` finds it from any
+    subdirectory), then a `.git` directory or file (worktrees, submodules).
+    The walk is a few stat() calls per ancestor; it runs once per SessionStart,
+    so there is nothing to cache across calls.
+    """
+    repo_type = None
+    path = os.path.realpath(project_dir)
+    while True:
+        if os.path.isdir(os.path.join(path, ".jj")):
+            repo_type = "jj"
+            break
+        # Keep walking: a .jj further up still takes priority
+        if repo_type is None and os.path.exists(os.path.join(path, ".git")):
+            repo_type = "git"
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return repo_type
+
+
 def detect_repo_type(project_dir):
-    """Detect repository type (jj, git, or no-repo) using repo_check.sh.
+    """Detect repository type (jj, git, or no-repo).
 
     Returns tuple of (repo_type, reminder_msg or None).
     """
     if not project_dir:
         return None, None
 
-    script_path = Path.home() / ".claude/skills/git-jj/scripts/repo_check.sh"
-    if not script_path.exists():
-        return None, None
-
-    try:
-        result = subprocess.run(
-            ["bash", str(script_path)],
-            capture_output=True,
-            text=True,
-            timeout=5,
-            cwd=project_dir,
-        )
-        repo_type = result.stdout.strip()
-
-        if repo_type == "jj":
-            return "jj", "Load git-jj skill when using git/vcs commands."
-        elif repo_type == "git":
-            return "git", None
-        else:
-            return None, None
-    except Exception:
+    repo_type = find_repo_type(project_dir)
+    if repo_type == "jj":
+        return "jj", "Load git-jj skill when using git/vcs commands."
+    elif repo_type == "git":
+        return "git", None
+    else:
         return None, None
 
 
@@ -137,23 +127,13 @@ def read_input_data():
         return None
 
 
-def main():
+def handle_session_start(input_data: dict, verbose: bool = False) -> int:
+    """Handle a SessionStart event in-process and return the exit code."""
     try:
-        parser = argparse.ArgumentParser()
-        parser.add_argument(
-            "--verbose", action="store_true", help="Print verbose output"
-        )
-        args = parser.parse_args()
-
-        # Read JSON input
-        input_data = read_input_data()
-        if not input_data:
-            sys.exit(0)
-
         # Extract and validate session_id
         session_id = input_data.get("session_id")
         if not session_id or not isinstance(session_id, str):
-            sys.exit(0)
+            return 0
 
         # Sanitize inputs
         session_id = sanitize_string(session_id)
@@ -170,7 +150,7 @@ def main():
         # Build and emit reminder
         reminder_msg = build_reminder_message(session_id, project_dir)
 
-        if args.verbose:
+        if verbose:
             print(
                 f"Session reminder injected. {session_id[:8]}... | Project: {project_dir}",
                 file=sys.stderr,
@@ -191,12 +171,31 @@ def main():
             },
         }
         print(json.dumps(output_json))
-        sys.exit(0)
+        return 0
+
+    except Exception:
+        # Fail gracefully without blocking the session
+        return 0
+
+
+def main():
+    try:
+        parser = argparse.ArgumentParser()
+        parser.add_argument(
+            "--verbose", action="store_true", help="Print verbose output"
+        )
+        args = parser.parse_args()
 
+        # Read JSON input
+        input_data = read_input_data()
+        if not input_data:
+            sys.exit(0)
     except Exception:
         # Fail gracefully without blocking the session
         sys.exit(0)
 
+    sys.exit(handle_session_start(input_data, verbose=args.verbose))
+
 
 if __name__ == "__main__":
     main()
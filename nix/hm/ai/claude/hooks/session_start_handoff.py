@@ -6,19 +6,19 @@
 """SessionStart hook to auto-detect pending handoffs and suggest pickup.
 
 When a new session starts (startup or clear), this hook:
-1. Scans .claude/handoffs/ for pending handoff files (not in handled/ subfolder)
+1. Queries the handoff registry for pending (not yet picked up) handoff files
 2. If pending handoffs exist, prompts the agent to pick up the latest one
 """
 
 import json
 import os
 import sys
-from pathlib import Path
-from datetime import datetime
+
+import handoff_registry
 
 
 def scan_pending_handoffs(project_dir: str) -> list[dict]:
-    """Scan .claude/handoffs/ for pending (unhandled) handoff files.
+    """List pending (unhandled) handoff files, newest first.
 
     Args:
         project_dir: Project root directory
@@ -26,48 +26,7 @@ def scan_pending_handoffs(project_dir: str) -> list[dict]:
     Returns:
         List of pending handoff file info dicts
     """
-    handoffs_dir = Path(project_dir) / ".claude" / "handoffs"
-
-    if not handoffs_dir.exists():
-        return []
-
-    # Load handled handoffs from metadata file
-    metadata_file = handoffs_dir / ".handled.json"
-    handled_set = set()
-    if metadata_file.exists():
-        try:
-            handled_data = json.loads(metadata_file.read_text())
-            handled_set = set(handled_data.keys())
-        except Exception:
-            pass
-
-    pending = []
-    for filepath in sorted(
-        handoffs_dir.glob("*.md"), key=lambda p: p.stat().st_mtime, reverse=True
-    ):
-        # Skip files in handled/ subdirectory (should not match anyway with glob)
-        if "handled" in filepath.parts:
-            continue
-
-        # Skip files that are marked as handled in metadata
-        if filepath.name in handled_set:
-            continue
-
-        stat = filepath.stat()
-        pending.append(
-            {
-                "name": filepath.name,
-                "path": str(filepath.relative_to(project_dir)),
-                "modified": datetime.fromtimestamp(stat.st_mtime).strftime(
-                    "%Y-%m-%d %H:%M:%S"
-                ),
-                "age_seconds": (
-                    datetime.now() - datetime.fromtimestamp(stat.st_mtime)
-                ).total_seconds(),
-            }
-        )
-
-    return pending
+    return handoff_registry.list_handoffs(project_dir, pending_only=True)
 
 
 def format_handoff_prompt(handoffs: list[dict]) -> str:
@@ -103,21 +62,13 @@ def format_handoff_prompt(handoffs: list[dict]) -> str:
     return "\n".join(lines)
 
 
-def main():
-    """Main hook entry point."""
-    try:
-        raw = sys.stdin.read()
-        if not raw:
-            sys.exit(0)
-        input_data = json.loads(raw)
-    except json.JSONDecodeError:
-        sys.exit(0)
-
+def handle_session_start(input_data: dict) -> int:
+    """Handle a SessionStart event in-process and return the exit code."""
     # Only trigger on clear (/clear or /new command)
     # Skip for startup/resume/compact which don't need handoff pickup
     source = input_data.get("source", "")
     if source != "clear":
-        sys.exit(0)
+        return 0
 
     # Get project directory (prefer CLAUDE_PROJECT_DIR env var)
     project_dir = os.environ.get("CLAUDE_PROJECT_DIR") or input_data.get("cwd", ".")
@@ -127,7 +78,7 @@ def main():
 
     if not pending:
         # No pending handoffs - exit silently
-        sys.exit(0)
+        return 0
 
     # Format prompt for agent
     context = format_handoff_prompt(pending)
@@ -149,7 +100,20 @@ def main():
     }
 
     print(json.dumps(output))
-    sys.exit(0)
+    return 0
+
+
+def main():
+    """Main hook entry point."""
+    try:
+        raw = sys.stdin.read()
+        if not raw:
+            sys.exit(0)
+        input_data = json.loads(raw)
+    except json.JSONDecodeError:
+        sys.exit(0)
+
+    sys.exit(handle_session_start(input_data))
 
 
 if __name__ == "__main__":
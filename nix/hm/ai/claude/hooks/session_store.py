@@ -0,0 +1,239 @@
+"""Session manifest and incremental export of transcripts to `.claude/sessions/`.
+
+Session files use the markdown layout written by session_save.py:
+    <user>...</user>
+    <agent>...</agent>
+    <tool_call>...</tool_call>
+
+Every exported session has a manifest entry in
+`.claude/sessions/.manifest/<session_id>.json`, written atomically under the
+session's lock (see storage.py):
+
+    {"file": <session file name>, "file_size": <its size after our write>,
+     "transcript": <realpath>, "inode": <transcript st_ino>,
+     "offset": <bytes exported>, "line": <lines exported>, "messages": <count>,
+     "summary_file": <name in .claude/session-summary/>,
+     "created": <iso time>, "updated": <iso time>}
+
+so finding a session's files is one small read instead of a directory glob.
+The glob only runs as a recovery path, when the entry is missing or points at
+a file that no longer exists.
+
+export_session() parses only the transcript lines after the entry's watermark
+(offset/line) and appends their messages. The file is rewritten from the
+whole transcript only when the watermark no longer matches: the session file
+was edited or removed, or the transcript was rotated, truncated or rewritten.
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import storage
+import transcript
+
+SESSIONS_DIR = Path(".claude") / "sessions"
+SUMMARY_DIR = Path(".claude") / "session-summary"
+MANIFEST_DIR = SESSIONS_DIR / ".manifest"
+
+
+def extract_description_from_messages(messages: list) -> str:
+    """Extract a short description from the first user message."""
+    for msg_type, content, *_ in messages:
+        if msg_type == "user" and content:
+            # Take first 30 chars, clean for filename
+            desc = content[:30].strip()
+            desc = "".join(c if c.isalnum() or c in " -_" else "" for c in desc)
+            desc = desc.replace(" ", "-").lower()
+            return desc or "session"
+    return "session"
+
+
+def format_messages(messages: list) -> str:
+    """Render (msg_type, content, ...) messages in the session file layout."""
+    output_lines = []
+    for msg_type, content, *_ in messages:
+        if msg_type == "user":
+            output_lines.append(f"<user>\n{content}\n</user>\n")
+        elif msg_type == "agent":
+            output_lines.append(f"<agent>\n{content}\n</agent>\n")
+        elif msg_type == "tool_call":
+            output_lines.append(f"<tool_call>\n{content}\n</tool_call>\n")
+    return "\n".join(output_lines)
+
+
+def manifest_path(cwd: str, session_id: str) -> Path:
+    return Path(cwd) / MANIFEST_DIR / f"{session_id}.json"
+
+
+def load_manifest(cwd: str, session_id: str) -> dict:
+    """Load the session's manifest entry ({} if missing or unreadable)."""
+    try:
+        with open(manifest_path(cwd, session_id), "r") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return entry if isinstance(entry, dict) else {}
+
+
+def update_manifest(cwd: str, session_id: str, **fields) -> dict:
+    """Merge `fields` into the session's manifest entry under the session lock.
+
+    Best effort: a failed write only costs a glob on the next lookup.
+    """
+    path = manifest_path(cwd, session_id)
+    try:
+        with storage.file_lock(path):
+            return _write_manifest(path, load_manifest(cwd, session_id), fields)
+    except Exception as e:
+        print(f"Failed to update session manifest: {e}", file=sys.stderr)
+        return {}
+
+
+def _write_manifest(path: Path, entry: dict, fields: dict) -> dict:
+    """Merge and atomically write a manifest entry; the caller holds the lock."""
+    now = datetime.now().isoformat()
+    entry.setdefault("created", now)
+    entry.update(fields, updated=now)
+    storage.atomic_write_json(path, entry, indent=2)
+    return entry
+
+
+def _lookup(directory: Path, name: str | None, pattern: str) -> Path | None:
+    """Return directory/name if it exists, else the first glob match (recovery)."""
+    if name and (directory / name).is_file():
+        return directory / name
+    for file in directory.glob(pattern):
+        return file
+    return None
+
+
+def find_session_file(cwd: str, session_id: str, entry: dict | None = None) -> Path | None:
+    """Return the session's markdown file, or None if it was never exported."""
+    if entry is None:
+        entry = load_manifest(cwd, session_id)
+    return _lookup(Path(cwd) / SESSIONS_DIR, entry.get("file"), f"*-session-*-ID_{session_id}.md")
+
+
+def find_summary_file(cwd: str, session_id: str, entry: dict | None = None) -> Path | None:
+    """Return the session's summary file, or None if none was saved."""
+    if entry is None:
+        entry = load_manifest(cwd, session_id)
+    return _lookup(Path(cwd) / SUMMARY_DIR, entry.get("summary_file"), f"*-summary-ID_{session_id}.md")
+
+
+def watermark_is_valid(entry: dict, sessions_dir: Path, transcript_path: str) -> bool:
+    """Check that appending after the manifest watermark reproduces a full export."""
+    if "offset" not in entry:
+        return False
+    try:
+        session_file = sessions_dir / entry["file"]
+        # The session file must be exactly as we left it
+        if session_file.stat().st_size != entry["file_size"]:
+            return False
+
+        st = os.stat(transcript_path)
+        offset = entry["offset"]
+        if os.path.realpath(transcript_path) != entry["transcript"]:
+            return False
+        # Rotated or truncated transcript
+        if st.st_ino != entry["inode"] or not 0 <= offset <= st.st_size:
+            return False
+        # Rewritten in place: the watermark must still sit after a newline
+        if offset:
+            with open(transcript_path, "rb") as f:
+                f.seek(offset - 1)
+                if f.read(1) != b"\n":
+                    return False
+        return True
+    except (OSError, KeyError, TypeError):
+        return False
+
+
+def export_session(cwd: str, session_id: str, transcript_path: str) -> tuple[Path, int, int] | None:
+    """Bring the session file up to date with the transcript.
+
+    Args:
+        cwd: Project directory
+        session_id: Session ID
+        transcript_path: Path to the transcript JSONL file
+
+    Returns:
+        (session file, total messages, newly written messages), or None when
+        the session has no messages yet or the file could not be written
+
+    Raises:
+        FileNotFoundError: If the transcript does not exist
+        TimeoutError: If another export of this session holds the lock too long
+    """
+    # /sync and SessionEnd can race on the same session; export one at a time
+    with storage.file_lock(manifest_path(cwd, session_id)):
+        return _export_locked(cwd, session_id, transcript_path)
+
+
+def _export_locked(cwd: str, session_id: str, transcript_path: str) -> tuple[Path, int, int] | None:
+    st = os.stat(transcript_path)
+    sessions_dir = Path(cwd) / SESSIONS_DIR
+    entry = load_manifest(cwd, session_id)
+
+    if watermark_is_valid(entry, sessions_dir, transcript_path):
+        data = transcript.parse_from(
+            transcript_path, ("messages",), entry["offset"], entry["line"]
+        )
+        filepath = sessions_dir / entry["file"]
+        total = entry.get("messages", 0) + len(data["messages"])
+        # Same bytes as a full rewrite: blocks are joined by a blank line
+        content = format_messages(data["messages"])
+        if content and entry["file_size"]:
+            content = "\n" + content
+        append = True
+    else:
+        data = transcript.parse_from(transcript_path, ("messages",))
+        if not data["messages"]:
+            return None
+
+        # Reuse the session's existing file (manifest first, glob to recover)
+        filepath = find_session_file(cwd, session_id, entry)
+        if filepath is None:
+            description = extract_description_from_messages(data["messages"])
+            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            filepath = sessions_dir / f"{timestamp}-session-{description}-ID_{session_id}.md"
+
+        total = len(data["messages"])
+        content = format_messages(data["messages"])
+        append = False
+
+    try:
+        if append:
+            with open(filepath, "a") as f:
+                f.write(content)
+            # Set restrictive permissions
+            os.chmod(filepath, 0o600)
+        else:
+            # A crash mid-rewrite must not lose the previous export
+            storage.atomic_write_text(filepath, content)
+        file_size = filepath.stat().st_size
+    except Exception as e:
+        print(f"Error saving session: {e}", file=sys.stderr)
+        return None
+
+    try:
+        _write_manifest(
+            manifest_path(cwd, session_id),
+            entry,
+            {
+                "file": filepath.name,
+                "file_size": file_size,
+                "transcript": os.path.realpath(transcript_path),
+                "inode": st.st_ino,
+                "offset": data["offset"],
+                "line": data["line"],
+                "messages": total,
+            },
+        )
+    except Exception as e:
+        # Without a fresh watermark the next export rewrites the file in full
+        print(f"Failed to update session manifest: {e}", file=sys.stderr)
+    return filepath, total, len(data["messages"])
@@ -14,13 +14,19 @@ import json
 import sys
 from pathlib import Path
 
+import summary_queue
 
-def read_previous_summary(cwd: str) -> str:
+# SessionEnd queues the summary just before this hook runs; give the worker a
+# moment to finish it
+SUMMARY_WAIT = 5.0  # seconds
+
+
+def read_previous_summary(cwd: str, wait: float = SUMMARY_WAIT) -> str:
     """Read the most recent summary from the session-summary directory.
 
     NOTE: This function is paired with `session_save.py` which writes these files
     on SessionEnd. If you change the directory path or glob pattern here,
-    you MUST update `save_summary()` in session_save.py to match.
+    you MUST update `summary_destination()` in session_save.py to match.
 
     Current contract:
         - Directory: .claude/session-summary/
@@ -28,10 +34,14 @@ def read_previous_summary(cwd: str) -> str:
 
     Args:
         cwd: Project directory
+        wait: Seconds to wait for a summary job that is still in flight
 
     Returns:
         Summary text, or empty string if not found
     """
+    if wait > 0:
+        summary_queue.wait_for_jobs(cwd, wait)
+
     summary_dir = Path(cwd) / ".claude" / "session-summary"
 
     if not summary_dir.exists():
@@ -54,20 +64,12 @@ def read_previous_summary(cwd: str) -> str:
         return ""
 
 
-def main():
-    """Main hook entry point."""
-    try:
-        raw = sys.stdin.read()
-        if not raw:
-            sys.exit(0)
-        input_data = json.loads(raw)
-    except json.JSONDecodeError:
-        sys.exit(0)
-
+def handle_session_start(input_data: dict) -> int:
+    """Handle a SessionStart event in-process and return the exit code."""
     # Only trigger on clear (/new or /clear command)
     source = input_data.get("source", "")
     if source != "clear":
-        sys.exit(0)
+        return 0
 
     cwd = input_data.get("cwd", ".")
 
@@ -76,7 +78,7 @@ def main():
 
     if not summary:
         # No summary available - exit silently
-        sys.exit(0)
+        return 0
 
     # Return as additional context for new session
     context = f"""<last-session>
@@ -95,7 +97,20 @@ def main():
     }
 
     print(json.dumps(output))
-    sys.exit(0)
+    return 0
+
+
+def main():
+    """Main hook entry point."""
+    try:
+        raw = sys.stdin.read()
+        if not raw:
+            sys.exit(0)
+        input_data = json.loads(raw)
+    except json.JSONDecodeError:
+        sys.exit(0)
+
+    sys.exit(handle_session_start(input_data))
 
 
 if __name__ == "__main__":
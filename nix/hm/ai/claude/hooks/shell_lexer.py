@@ -0,0 +1,444 @@
+"""Single-pass shell lexer for screening Bash commands (prevent_forbidden_bash).
+
+iter_commands(command) yields every simple command the shell would run, as
+
+    {"words": [...], "separator_before": "|" | "||" | "&&" | ";" | "&" | None}
+
+with words unquoted and redirections (and their targets) removed. It is not
+a shell parser, just enough of one to find command heads:
+
+- quotes ('...', "...", $'...'), backslash escapes and line continuations
+- separators |, |&, ||, &&, ;, ;;, &, newline (reported as ";")
+- subshells ( ... ), groups { ...; } and function bodies; the first command
+  inside keeps the separator before the group
+- command substitution $(...) and `...`, also inside double quotes and
+  unquoted heredoc bodies and ${...} expansions; their commands are
+  reported with no separator
+- heredoc bodies (<<, <<-) are skipped; here-strings (<<<) are targets
+- leading assignments, reserved words (if, then, do, !, ...) and wrappers
+  (env, sudo, command, ...) are stripped, so the head is what runs;
+  `command -v name` only looks the name up and is left alone
+- `bash -c '...'` (also `bash -e -o pipefail -c -- '...'`) and `eval ...`
+  payloads are lexed as commands too
+
+Runs of ordinary characters are consumed with one regex or str.find call, so
+the Python-level work is per token and per special character, and the whole
+pass is linear in the command length. Nesting is an explicit stack, not
+recursion; payloads (bash -c, eval, heredoc bodies, ${...}) nest at most
+MAX_DEPTH deep. Unterminated quotes or substitutions end at the end of the input
+instead of failing, so a malformed command is still screened.
+"""
+
+import re
+from typing import Iterator
+
+MAX_DEPTH = 8
+
+SHELLS = frozenset({"bash", "sh", "zsh", "dash", "ksh"})
+# Shell options that take the next word as their value
+SHELL_OPTION_VALUES = frozenset({"--rcfile", "--init-file"})
+RESERVED = frozenset({"!", "{", "}", "if", "then", "else", "elif", "do", "while", "until"})
+# Wrapper commands that run their arguments, and their options that take a value
+WRAPPERS = {
+    "env": frozenset({"-u", "--unset", "-C", "--chdir", "-S", "--split-string"}),
+    "sudo": frozenset({"-u", "-g", "-h", "-p", "-C", "-D", "-r", "-t", "-U", "-T"}),
+    "command": frozenset(),
+    "builtin": frozenset(),
+    "exec": frozenset({"-a"}),
+    "nohup": frozenset(),
+    "time": frozenset(),
+    "nice": frozenset({"-n"}),
+}
+
+_WORD_RUN = re.compile(r"[^\s|&;()<>'\"\\`$#]+")
+_DQUOTE_RUN = re.compile(r"[^\"\\$`]+")
+_BLANKS = re.compile(r"[ \t\r\f\v]+")
+_DIGITS = re.compile(r"\d+")
+_BALANCED = {"(": re.compile(r"[()\\'\"]"), "{": re.compile(r"[{}\\'\"]")}
+_LOOKUP_ONLY = re.compile(r"-p?[vV]p?")
+_ASSIGNMENT = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(\[[^]]*\])?\+?=")
+
+
+class _Commands:
+    """Word and command accumulator for one command list (top level or nested)."""
+
+    def __init__(self, out: list[dict], closer: str | None, separator: str | None):
+        self.out = out
+        self.closer = closer  # ")" or "`" for nested lists, None at the top
+        self.separator = separator
+        self.words: list[str] = []
+        self.pieces: list[str] | None = None  # word in progress
+        self.quoted = False  # word in progress used quotes or escapes
+        self.skip_word = False  # next word is a redirection target
+        self.heredoc: bool | None = None  # next word is a heredoc delimiter (value: strip tabs)
+
+    def add(self, text: str) -> None:
+        if self.pieces is None:
+            self.pieces = []
+        self.pieces.append(text)
+
+    def end_word(self, heredocs: list) -> None:
+        if self.pieces is None:
+            return
+        word = "".join(self.pieces)
+        self.pieces = None
+        quoted, self.quoted = self.quoted, False
+        if self.heredoc is not None:
+            heredocs.append((word, self.heredoc, quoted))
+            self.heredoc = None
+        elif self.skip_word:
+            self.skip_word = False
+        else:
+            self.words.append(word)
+
+    def end_command(self, heredocs: list, next_separator: str | None) -> None:
+        self.end_word(heredocs)
+        if self.words:
+            self.out.append({"words": self.words, "separator_before": self.separator})
+            self.words = []
+        self.separator = next_separator
+
+
+def _skip_balanced(s: str, pos: int, opener: str, closer: str) -> int:
+    """Return the index after the `closer` matching an already consumed `opener`."""
+    depth = 1
+    pattern = _BALANCED[opener]
+    while depth:
+        m = pattern.search(s, pos)
+        if m is None:
+            return len(s)
+        pos = m.end()
+        c = m.group()
+        if c == "\\":
+            pos += 1
+        elif c == "'" or c == '"':
+            end = s.find(c, pos)
+            pos = len(s) if end < 0 else end + 1
+        elif c == opener:
+            depth += 1
+        else:
+            depth -= 1
+    return pos
+
+
+def _lex(s: str, out: list[dict], separator: str | None, depth: int, as_text: bool = False) -> None:
+    """Lex `s` into `out` as raw words (see _expand_payloads).
+
+    With `as_text`, `s` (a heredoc body or the inside of ${...}) is lexed as
+    double-quoted text.
+    """
+    # Such text is not a command itself, only its substitutions are
+    top = _Commands([] if as_text else out, None, separator)
+    # Frames: _Commands for command lists, or ("dquote", owner) for double quotes
+    stack: list = [top]
+    if as_text:
+        stack.append(("dquote", top))
+    heredocs: list = []  # (delimiter, strip_tabs, quoted) waiting for the end of the line
+    n = len(s)
+    pos = 0
+
+    while pos < n:
+        frame = stack[-1]
+
+        if isinstance(frame, tuple):  # inside double quotes
+            owner = frame[1]
+            m = _DQUOTE_RUN.match(s, pos)
+            if m:
+                owner.add(m.group())
+                pos = m.end()
+                continue
+            c = s[pos]
+            if c == '"':
+                if as_text and len(stack) == 2:
+                    owner.add(c)  # No closing quote in plain text
+                else:
+                    stack.pop()
+                pos += 1
+            elif c == "\\":
+                nxt = s[pos + 1 : pos + 2]
+                if nxt == "\n":
+                    pass  # Line continuation
+                elif nxt in ("$", "`", '"', "\\"):
+                    owner.add(nxt)
+                else:
+                    owner.add(c + nxt)
+                pos += 2
+            elif c == "$":
+                pos = _dollar(s, pos, owner, stack, out, depth)
+            else:  # "`"
+                stack.append(_Commands(out, "`", None))
+                pos += 1
+            continue
+
+        state: _Commands = frame
+        m = _WORD_RUN.match(s, pos)
+        if m:
+            state.add(m.group())
+            pos = m.end()
+            continue
+        c = s[pos]
+
+        if c == "\n":
+            state.end_command(heredocs, ";")
+            pos += 1
+            if heredocs:
+                pos = _skip_heredocs(s, pos, heredocs, out, depth)
+        elif c in " \t\r\f\v":
+            state.end_word(heredocs)
+            pos = _BLANKS.match(s, pos).end()
+        elif c == "'":
+            end = s.find("'", pos + 1)
+            end = n if end < 0 else end
+            state.add(s[pos + 1 : end])
+            state.quoted = True
+            pos = end + 1
+        elif c == '"':
+            state.add("")
+            state.quoted = True
+            stack.append(("dquote", state))
+            pos += 1
+        elif c == "\\":
+            nxt = s[pos + 1 : pos + 2]
+            if nxt != "\n":
+                state.add(nxt)
+                state.quoted = True
+            pos += 2
+        elif c == "$":
+            pos = _dollar(s, pos, state, stack, out, depth)
+        elif c == "`":
+            if state.closer == "`":
+                state.end_command(heredocs, None)
+                stack.pop()
+            else:
+                state.add("")
+                stack.append(_Commands(out, "`", None))
+            pos += 1
+        elif c == "#":
+            if state.pieces is None:
+                end = s.find("\n", pos)
+                pos = n if end < 0 else end  # Comment
+            else:
+                state.add(c)
+                pos += 1
+        elif c == "|":
+            op = s[pos : pos + 2]
+            if op == "||":
+                state.end_command(heredocs, "||")
+                pos += 2
+            else:
+                state.end_command(heredocs, "|")
+                pos += 2 if op == "|&" else 1
+        elif c == "&":
+            op = s[pos : pos + 2]
+            if op == "&&":
+                state.end_command(heredocs, "&&")
+                pos += 2
+            elif op == "&>":
+                state.end_word(heredocs)
+                state.skip_word = True
+                pos += 3 if s.startswith("&>>", pos) else 2
+            else:
+                state.end_command(heredocs, "&")
+                pos += 1
+        elif c == ";":
+            state.end_command(heredocs, ";")
+            pos += 3 if s.startswith(";;&", pos) else 2 if s[pos + 1 : pos + 2] in (";", "&") else 1
+        elif c == "(":
+            if state.pieces is not None and state.pieces[-1].endswith("="):
+                # Array assignment: a=(1 2 3)
+                end = _skip_balanced(s, pos + 1, "(", ")")
+                state.add(s[pos:end])
+                pos = end
+            else:
+                state.end_word(heredocs)
+                if state.words:
+                    state.end_command(heredocs, None)  # Function definition: f() { ...; }
+                stack.append(_Commands(out, ")", state.separator))
+                pos += 1
+        elif c == ")":
+            if state.closer == ")":
+                state.end_command(heredocs, None)
+                stack.pop()
+            else:
+                state.end_command(heredocs, ";")  # e.g. a case pattern
+            pos += 1
+        else:  # "<" or ">"
+            if state.pieces is not None and _DIGITS.fullmatch("".join(state.pieces)) and not state.quoted:
+                state.pieces = None  # File descriptor: 2>file
+            state.end_word(heredocs)
+            if s.startswith("<<<", pos):
+                state.skip_word = True
+                pos += 3
+            elif s.startswith("<<", pos):
+                strip = s.startswith("<<-", pos)
+                state.heredoc = strip
+                pos += 3 if strip else 2
+            else:
+                pos += 1
+                if s[pos : pos + 1] in (">", "&", "|") and not (c == "<" and s[pos] == "|"):
+                    pos += 1
+                state.skip_word = True
+                if s[pos - 1] == "&":
+                    # >&2, <&-, >&- : the target follows immediately
+                    m = _DIGITS.match(s, pos)
+                    if m:
+                        pos = m.end()
+                        state.skip_word = False
+                    elif s[pos : pos + 1] == "-":
+                        pos += 1
+                        state.skip_word = False
+
+    # End of input: close whatever is still open
+    while stack:
+        frame = stack.pop()
+        if not isinstance(frame, tuple):
+            frame.end_command(heredocs, None)
+
+
+def _dollar(s: str, pos: int, state: _Commands, stack: list, out: list[dict], depth: int) -> int:
+    """Handle `$` at `pos` inside a word; returns the new position."""
+    nxt = s[pos + 1 : pos + 2]
+    if nxt == "(":
+        if s.startswith("((", pos + 1):
+            end = _skip_balanced(s, pos + 3, "(", ")")
+            if s[end : end + 1] == ")":
+                end += 1
+            state.add(s[pos:end])  # Arithmetic expansion
+            return end
+        state.add("")
+        stack.append(_Commands(out, ")", None))
+        return pos + 2
+    if nxt == "{":
+        end = _skip_balanced(s, pos + 2, "{", "}")
+        state.add(s[pos:end])
+        inner = s[pos + 2 : end]
+        if depth < MAX_DEPTH and ("$(" in inner or "`" in inner):
+            _lex(inner, out, None, depth + 1, as_text=True)  # ${x:-$(cmd)}
+        return end
+    if nxt == "'" and not isinstance(stack[-1], tuple):
+        # ANSI-C quoting; escapes are kept as written
+        i = pos + 2
+        while True:
+            end = s.find("'", i)
+            if end < 0:
+                end = len(s)
+                break
+            backslashes = len(s[i:end]) - len(s[i:end].rstrip("\\"))
+            if backslashes % 2 == 0:
+                break
+            i = end + 1
+        state.add(s[pos + 2 : end])
+        state.quoted = True
+        return end + 1
+    state.add("$")
+    return pos + 1
+
+
+def _skip_heredocs(s: str, pos: int, heredocs: list, out: list[dict], depth: int) -> int:
+    """Skip the bodies of the pending heredocs, which start at `pos`."""
+    n = len(s)
+    for delimiter, strip_tabs, quoted in heredocs:
+        start = pos
+        while pos < n:
+            end = s.find("\n", pos)
+            end = n if end < 0 else end
+            line = s[pos:end]
+            if (line.lstrip("\t") if strip_tabs else line) == delimiter:
+                body = s[start:pos]
+                pos = min(end + 1, n)
+                break
+            pos = end + 1
+        else:
+            body = s[start:]
+            pos = n
+        if not quoted and depth < MAX_DEPTH and ("$(" in body or "`" in body):
+            _lex(body, out, None, depth + 1, as_text=True)
+    heredocs.clear()
+    return pos
+
+
+def command_words(words: list[str]) -> list[str]:
+    """Strip assignments, reserved words and wrappers (env, sudo, ...) off a command."""
+    i, n = 0, len(words)
+    while i < n:
+        word = words[i]
+        if word in RESERVED or _ASSIGNMENT.match(word):
+            i += 1
+        elif word == "function":
+            i += 2
+        elif word == "command" and i + 1 < n and _LOOKUP_ONLY.fullmatch(words[i + 1]):
+            break  # command -v/-V only looks the name up
+        elif word in WRAPPERS:
+            takes_value = WRAPPERS[word]
+            i += 1
+            while i < n and words[i].startswith("-") and words[i] != "-":
+                option = words[i]
+                i += 1
+                if option == "--":
+                    break
+                if option in takes_value:
+                    i += 1
+        else:
+            break
+    return words[i:]
+
+
+def _payload(words: list[str]) -> str | None:
+    """Return the script a `bash -c` or `eval` command runs, if any."""
+    head = words[0].rsplit("/", 1)[-1]
+    if head == "eval":
+        return " ".join(words[1:])
+    if head in SHELLS:
+        # The script is the first operand after the options, once -c was given
+        script = False
+        i, n = 1, len(words)
+        while i < n:
+            word = words[i]
+            if word == "--":
+                i += 1
+                break
+            if len(word) < 2 or word[0] not in "-+":
+                break
+            i += 1
+            if word.startswith("--"):
+                if word in SHELL_OPTION_VALUES:
+                    i += 1
+                continue
+            if word[0] == "-" and "c" in word[1:]:
+                script = True
+            if word[-1] in "oO":
+                i += 1  # -o pipefail, -O extglob, +o posix
+        if script and i < n:
+            return words[i]
+    return None
+
+
+def _expand_payloads(out: list[dict], depth: int) -> None:
+    """Normalize each command's words and lex any `bash -c`/`eval` payload after it.
+
+    Runs once per lexed list: _lex only collects raw commands, so each
+    command (heredoc substitutions included) is normalized and expanded once.
+    """
+    expanded: list[dict] = []
+    for command in out:
+        command["words"] = command_words(command["words"])
+        expanded.append(command)
+        payload = _payload(command["words"]) if command["words"] and depth < MAX_DEPTH else None
+        if payload:
+            nested: list[dict] = []
+            _lex(payload, nested, command["separator_before"], depth + 1)
+            _expand_payloads(nested, depth + 1)
+            expanded += nested
+    out[:] = expanded
+
+
+def iter_commands(command: str) -> Iterator[dict]:
+    """Yield the simple commands in a shell command string.
+
+    Commands come in the order the shell starts them, so a substitution comes
+    before the command it is an argument of, and a `bash -c` payload after it.
+    """
+    out: list[dict] = []
+    _lex(command, out, None, 0)
+    _expand_payloads(out, 0)
+    yield from (c for c in out if c["words"])
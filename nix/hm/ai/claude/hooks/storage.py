@@ -0,0 +1,144 @@
+"""Crash- and concurrency-safe file writes for hook metadata under `.claude/`.
+
+Several Claude sessions routinely run in one repo, and one user action can
+fire more than one hook, so metadata writes go through these helpers:
+
+- file_lock: advisory flock on a `<path>.lock` sidecar, with a deadline
+- atomic_write_text / atomic_write_json: temp file in the same directory,
+  then os.replace, so readers see either the old or the new file, never a
+  half-written one
+- update_json: locked read-modify-write of a JSON document
+- append_line: one O_APPEND write per record, for JSONL journals
+
+Locks are advisory: they only exclude other writers that also use them.
+"""
+
+import errno
+import fcntl
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+LOCK_TIMEOUT = 10.0  # seconds
+# Back-off between non-blocking lock attempts (doubles up to the max)
+LOCK_POLL_MIN = 0.001
+LOCK_POLL_MAX = 0.05
+
+
+def lock_path(path: Path) -> Path:
+    return path.with_name(path.name + ".lock")
+
+
+@contextmanager
+def file_lock(path: str | Path, shared: bool = False, timeout: float = LOCK_TIMEOUT) -> Iterator[float]:
+    """Hold an advisory lock guarding `path`; yields the seconds spent waiting.
+
+    Raises:
+        TimeoutError: If the lock could not be taken within `timeout`
+    """
+    lock_file = lock_path(Path(path))
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(lock_file, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        operation = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB
+        start = time.monotonic()
+        delay = LOCK_POLL_MIN
+        while True:
+            try:
+                fcntl.flock(fd, operation)
+                break
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+            if time.monotonic() - start >= timeout:
+                raise TimeoutError(f"Timed out after {timeout}s waiting for {lock_file}")
+            time.sleep(delay)
+            delay = min(delay * 2, LOCK_POLL_MAX)
+        try:
+            yield time.monotonic() - start
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path: str | Path, text: str, mode: int = 0o600) -> None:
+    """Replace `path` with `text` atomically (temp file + rename)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path: str | Path, data: Any, mode: int = 0o600, **dump_kwargs) -> None:
+    """Serialize `data` and replace `path` with it atomically."""
+    atomic_write_text(path, json.dumps(data, **dump_kwargs), mode)
+
+
+def read_json(path: str | Path, default: Any = None) -> Any:
+    """Load a JSON file, returning `default` if it is missing or corrupt."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def update_json(
+    path: str | Path,
+    update: Callable[[Any], Any],
+    default: Callable[[], Any] = dict,
+    timeout: float = LOCK_TIMEOUT,
+    **dump_kwargs,
+) -> Any:
+    """Locked read-modify-write of a JSON document.
+
+    `update` receives the current document (or `default()` when the file is
+    missing or corrupt) and returns the new one, which is written atomically.
+
+    Returns:
+        The document as written
+
+    Raises:
+        TimeoutError: If the lock could not be taken within `timeout`
+    """
+    with file_lock(path, timeout=timeout):
+        data = read_json(path, None)
+        if data is None:
+            data = default()
+        data = update(data)
+        atomic_write_json(path, data, **dump_kwargs)
+        return data
+
+
+def append_line(path: str | Path, line: str, mode: int = 0o600) -> None:
+    """Append one record to a journal with a single O_APPEND write.
+
+    O_APPEND makes the seek-to-end and write atomic with respect to other
+    appenders, so concurrent records never overwrite each other.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = (line if line.endswith("\n") else line + "\n").encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, mode)
+    try:
+        written = os.write(fd, data)
+        # Regular files take the whole buffer; loop for safety on short writes
+        while written < len(data):
+            written += os.write(fd, data[written:])
+    finally:
+        os.close(fd)
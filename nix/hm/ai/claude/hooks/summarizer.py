@@ -0,0 +1,254 @@
+"""Pluggable LLM backends for the summarizing hooks.
+
+summarize(role, prompt) serves identical prompts from summary_cache and
+otherwise asks the configured backend:
+
+- "aichat" (default): `aichat -r <role>` with the prompt on stdin; one process,
+  config load and TLS handshake per call
+- "http": POST to an OpenAI-compatible `/chat/completions` endpoint over
+  pooled keep-alive connections (http.client), so the calls of one hook run
+  (the map step of a long /handoff, for instance) reuse their connections
+
+Configured through the environment (forwarded to hook_daemon.py):
+
+    CLAUDE_HOOKS_SUMMARIZER          aichat | http
+    CLAUDE_HOOKS_SUMMARIZER_URL      API base, e.g. https://openrouter.ai/api/v1
+    CLAUDE_HOOKS_SUMMARIZER_MODEL    overrides the role's model
+    CLAUDE_HOOKS_SUMMARIZER_API_KEY  bearer token (optional)
+
+The HTTP backend reads the same aichat role files (conf/llm/aichat/roles):
+the body is the system prompt and the front matter supplies `temperature`
+and, unless CLAUDE_HOOKS_SUMMARIZER_MODEL is set, `model` minus aichat's
+`<client>:` prefix.
+"""
+
+import http.client
+import json
+import os
+import queue
+import subprocess
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import summary_cache
+
+BACKEND_ENV = "CLAUDE_HOOKS_SUMMARIZER"
+URL_ENV = "CLAUDE_HOOKS_SUMMARIZER_URL"
+MODEL_ENV = "CLAUDE_HOOKS_SUMMARIZER_MODEL"
+API_KEY_ENV = "CLAUDE_HOOKS_SUMMARIZER_API_KEY"
+ENV_VARS = (BACKEND_ENV, URL_ENV, MODEL_ENV, API_KEY_ENV)
+
+DEFAULT_TIMEOUT = 60  # seconds
+POOL_SIZE = 8  # idle connections kept per backend (MAP_WORKERS in handoff_interceptor)
+
+# Roles directory relative to the repository root
+REPO_ROLES = Path("conf") / "llm" / "aichat" / "roles"
+# This file's depth below the repository root (nix/hm/ai/claude/hooks/)
+REPO_DEPTH = 5
+
+
+class Summarizer:
+    """A backend that turns (role, prompt) into text."""
+
+    name = ""
+
+    def complete(self, role: str, prompt: str, cwd: str = ".", timeout: float = DEFAULT_TIMEOUT) -> str:
+        """Return the model's reply for the prompt under the given role.
+
+        Raises:
+            TimeoutError / subprocess.TimeoutExpired: If the call timed out
+            RuntimeError: If the backend reported an error
+        """
+        raise NotImplementedError
+
+
+class AichatSummarizer(Summarizer):
+    """`aichat -r <role>` subprocess per call."""
+
+    name = "aichat"
+
+    def complete(self, role: str, prompt: str, cwd: str = ".", timeout: float = DEFAULT_TIMEOUT) -> str:
+        # Feed prompt via stdin to avoid session file creation
+        result = subprocess.run(
+            ["aichat", "-r", role],
+            input=prompt,
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+        if result.returncode != 0:
+            error_msg = result.stderr.strip() if result.stderr else "Unknown error"
+            raise RuntimeError(f"aichat command failed: {error_msg}")
+        return result.stdout.strip()
+
+
+class HttpSummarizer(Summarizer):
+    """OpenAI-compatible chat completions over pooled keep-alive connections."""
+
+    name = "http"
+
+    def __init__(self, base_url: str, model: str = "", api_key: str = "", pool_size: int = POOL_SIZE):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Invalid summarizer URL: {base_url!r}")
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.api_key = api_key
+        self.idle = queue.LifoQueue(maxsize=pool_size)
+        self.connections_opened = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self, timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        """Return (connection, reused); reuses the most recently idle one."""
+        try:
+            conn = self.idle.get_nowait()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        except queue.Empty:
+            with self._lock:
+                self.connections_opened += 1
+            return self.connection_class(self.host, self.port, timeout=timeout), False
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def complete(self, role: str, prompt: str, cwd: str = ".", timeout: float = DEFAULT_TIMEOUT) -> str:
+        system_prompt, options = load_role(role)
+        body = {
+            "model": self.model or options.get("model", "").split(":", 1)[-1],
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": False,
+        }
+        if system_prompt:
+            body["messages"].insert(0, {"role": "system", "content": system_prompt})
+        if "temperature" in options:
+            body["temperature"] = options["temperature"]
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        payload = json.dumps(body).encode("utf-8")
+
+        while True:
+            conn, reused = self._acquire(timeout)
+            try:
+                conn.request("POST", self.path, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused:
+                    continue  # The server closed an idle connection; retry on a fresh one
+                raise
+            except Exception:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            break
+
+        if response.status != 200:
+            raise RuntimeError(f"summarizer HTTP {response.status}: {data[:200].decode('utf-8', 'replace')}")
+        try:
+            return json.loads(data)["choices"][0]["message"]["content"].strip()
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+            raise RuntimeError(f"summarizer returned an unexpected response: {e}") from e
+
+
+_ROLES: dict[str, tuple[str, dict]] = {}
+
+
+def role_dirs() -> list[Path]:
+    """Installed roles first (see nix/hm/ai/legacy.nix), then the copies in this repo.
+
+    The repo copies only exist when running from a checkout; an installed copy
+    of this file (e.g. in the nix store) may not even be REPO_DEPTH deep.
+    """
+    dirs = [
+        Path.home() / ".config" / "aichat" / "roles",
+        Path.home() / "Library" / "Application Support" / "aichat" / "roles",
+    ]
+    parents = Path(__file__).resolve().parents
+    if len(parents) > REPO_DEPTH:
+        dirs.append(parents[REPO_DEPTH] / REPO_ROLES)
+    return dirs
+
+
+def load_role(role: str) -> tuple[str, dict]:
+    """Return (system prompt, front matter options) from the aichat role file."""
+    if role not in _ROLES:
+        text = ""
+        for directory in role_dirs():
+            try:
+                text = (directory / f"{role}.md").read_text()
+                break
+            except OSError:
+                continue
+        _ROLES[role] = parse_role(text)
+    return _ROLES[role]
+
+
+def parse_role(text: str) -> tuple[str, dict]:
+    """Split an aichat role file into its body and `key: value` front matter."""
+    options = {}
+    if text.startswith("---\n"):
+        header, sep, body = text[4:].partition("\n---\n")
+        if sep:
+            text = body
+            for line in header.splitlines():
+                key, colon, value = line.partition(":")
+                if not colon:
+                    continue
+                value = value.strip()
+                try:
+                    options[key.strip()] = json.loads(value)
+                except ValueError:
+                    options[key.strip()] = value
+    return text.strip(), options
+
+
+_BACKENDS: dict[tuple, Summarizer] = {}
+
+
+def get_summarizer() -> Summarizer:
+    """Return the configured backend; one instance (and pool) per configuration."""
+    config = tuple(os.environ.get(name, "") for name in ENV_VARS)
+    backend = _BACKENDS.get(config)
+    if backend is None:
+        name, url, model, api_key = config
+        if name == "http":
+            backend = HttpSummarizer(url, model, api_key)
+        elif name in ("", "aichat"):
+            backend = AichatSummarizer()
+        else:
+            raise ValueError(f"Unknown summarizer backend: {name!r}")
+        _BACKENDS[config] = backend
+    return backend
+
+
+def summarize(role: str, prompt: str, cwd: str = ".", timeout: float = DEFAULT_TIMEOUT) -> str:
+    """Summarize with the configured backend; identical prompts are served from cache.
+
+    Raises:
+        TimeoutError / subprocess.TimeoutExpired: If the call timed out
+        FileNotFoundError: If aichat is not installed
+        RuntimeError: If the backend reported an error
+    """
+    cached = summary_cache.get(role, prompt)
+    if cached:
+        return cached
+    summary = get_summarizer().complete(role, prompt, cwd, timeout)
+    if summary:
+        summary_cache.put(role, prompt, summary)
+    return summary
@@ -0,0 +1,122 @@
+"""Content-addressed cache of LLM summaries.
+
+A repeated /handoff or a SessionEnd after a /sync with no new turns sends the
+summarizer a byte-for-byte identical prompt. Summaries are stored under
+
+    $XDG_CACHE_HOME/claude-hooks/summaries/<sha256(version, role, prompt)>.json
+        {"role", "created": <epoch>, "summary"}
+
+so such a prompt is answered without running aichat. Bump SUMMARIZER_VERSION
+when prompts or roles change in ways the hash does not capture (role files).
+
+Entries expire TTL_DAYS after they were created. A hit refreshes the entry's
+mtime, and once the directory grows past MAX_CACHE_BYTES the least recently
+used entries are evicted. Hit/miss/eviction counters live in `stats.json`.
+"""
+
+import hashlib
+import os
+import sys
+import time
+from pathlib import Path
+
+import storage
+
+SUMMARIZER_VERSION = 1
+MAX_CACHE_BYTES = 4 * 1024 * 1024
+TTL_DAYS = 7
+STATS_FILE = "stats.json"
+
+
+def cache_dir() -> Path:
+    """Return the directory holding cached summaries."""
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "claude-hooks" / "summaries"
+
+
+def cache_key(role: str, prompt: str, version: int = SUMMARIZER_VERSION) -> str:
+    digest = hashlib.sha256()
+    for part in (str(version), role, prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def entry_path(role: str, prompt: str) -> Path:
+    return cache_dir() / f"{cache_key(role, prompt)}.json"
+
+
+def get(role: str, prompt: str) -> str | None:
+    """Return the cached summary for this exact prompt, or None (counted as a miss)."""
+    path = entry_path(role, prompt)
+    entry = storage.read_json(path)
+    if isinstance(entry, dict) and time.time() - entry.get("created", 0) < TTL_DAYS * 86400:
+        try:
+            os.utime(path)  # Recently used: last to be evicted
+        except OSError:
+            pass
+        _count("hits")
+        return entry.get("summary")
+    _count("misses")
+    return None
+
+
+def put(role: str, prompt: str, summary: str) -> None:
+    """Cache a summary and evict down to the size bound. Best effort."""
+    try:
+        storage.atomic_write_json(
+            entry_path(role, prompt),
+            {"role": role, "created": time.time(), "summary": summary},
+        )
+        evict()
+    except Exception as e:
+        print(f"Failed to cache summary: {e}", file=sys.stderr)
+
+
+def evict(max_bytes: int = MAX_CACHE_BYTES) -> int:
+    """Remove expired entries, then least recently used ones past `max_bytes`.
+
+    Returns:
+        Number of entries removed
+    """
+    entries = []
+    with os.scandir(cache_dir()) as it:
+        for entry in it:
+            if entry.name.endswith(".json") and entry.name != STATS_FILE:
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    expired = time.time() - TTL_DAYS * 86400
+    removed = 0
+    for mtime, size, path in entries:
+        # mtime >= created, so an entry unused since before the TTL is expired
+        if total <= max_bytes and mtime >= expired:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        _count("evictions", removed)
+    return removed
+
+
+def _count(counter: str, n: int = 1) -> None:
+    def bump(stats):
+        stats[counter] = stats.get(counter, 0) + n
+        return stats
+
+    try:
+        storage.update_json(cache_dir() / STATS_FILE, bump, timeout=1.0)
+    except Exception:
+        pass  # Counters are diagnostics only
+
+
+def stats() -> dict:
+    """Return the hit/miss/eviction counters."""
+    data = storage.read_json(cache_dir() / STATS_FILE, {})
+    return {key: data.get(key, 0) for key in ("hits", "misses", "evictions")}
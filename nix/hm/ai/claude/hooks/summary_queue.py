@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Durable queue of session summary jobs, drained by a detached worker.
+
+SessionEnd used to run the summarizer itself, so `/clear` and `/new` blocked
+for as long as the LLM took. Now it enqueues a job and returns:
+
+    .claude/session-summary/.queue/<created_ns>-<session_id>.json
+        {"version": 1, "session_id", "cwd", "messages": [[type, content], ...],
+         "summary_file": <destination>, "session_file": <relative path>,
+         "earlier_summary": <rolling summary, see rolling_summary.py>,
+         "created": <epoch>, "attempts": <failed tries>, "next_attempt": <epoch>}
+
+and spawns `summary_queue.py <cwd>` detached. One worker per project (an
+flock on `.queue/worker.lock`) processes due jobs oldest first. A job file is
+removed only after its summary was written, so a crashed worker leaves it for
+the next one. Failures are retried with exponential back-off; after
+MAX_ATTEMPTS the job is moved to `.queue/failed/`.
+"""
+
+import fcntl
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+import storage
+
+QUEUE_DIR = Path(".claude") / "session-summary" / ".queue"
+JOB_VERSION = 1
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 10.0  # seconds before the first retry, doubled per attempt
+BACKOFF_MAX = 300.0
+# A worker gives up waiting on back-off after this long; the next enqueue restarts it
+MAX_WORKER_SECONDS = 900
+# Readers only wait on jobs this fresh (older ones are retries or orphans)
+WAIT_MAX_JOB_AGE = 120.0
+WAIT_POLL = 0.1
+
+
+def queue_dir(cwd: str) -> Path:
+    return Path(cwd) / QUEUE_DIR
+
+
+def enqueue(cwd: str, job: dict) -> Path:
+    """Durably add a job (written atomically) and return its path."""
+    now = time.time()
+    job = {
+        "version": JOB_VERSION,
+        **job,
+        "cwd": cwd,
+        "created": now,
+        "attempts": 0,
+        "next_attempt": now,
+    }
+    path = queue_dir(cwd) / f"{time.time_ns()}-{job.get('session_id', 'job')}.json"
+    storage.atomic_write_json(path, job)
+    return path
+
+
+def pending_jobs(cwd: str) -> list[Path]:
+    """Return queued job files, oldest first."""
+    directory = queue_dir(cwd)
+    if not directory.is_dir():
+        return []
+    return sorted(directory.glob("*.json"), key=lambda p: p.name)
+
+
+def spawn_worker(cwd: str) -> None:
+    """Start a detached worker for the project (exits at once if one is running)."""
+    subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), cwd],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def wait_for_jobs(cwd: str, timeout: float) -> bool:
+    """Wait up to `timeout` seconds for fresh first-attempt jobs to finish.
+
+    Returns:
+        True if no such job is left
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        now = time.time()
+        in_flight = False
+        for path in pending_jobs(cwd):
+            job = storage.read_json(path, {})
+            if job.get("attempts", 0) == 0 and now - job.get("created", 0) < WAIT_MAX_JOB_AGE:
+                in_flight = True
+                break
+        if not in_flight:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(WAIT_POLL)
+
+
+def backoff(attempts: int) -> float:
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def process_due_jobs(cwd: str, handler: Callable[[dict], bool]) -> float | None:
+    """Run every due job once.
+
+    Returns:
+        Seconds until the next delayed job is due, or None if the queue is empty
+    """
+    next_due = None
+    for path in pending_jobs(cwd):
+        job = storage.read_json(path)
+        if not isinstance(job, dict) or job.get("version") != JOB_VERSION:
+            _move_to_failed(path)
+            continue
+        wait = job.get("next_attempt", 0) - time.time()
+        if wait > 0:
+            next_due = wait if next_due is None else min(next_due, wait)
+            continue
+
+        try:
+            ok = handler(job)
+        except Exception as e:
+            print(f"Summary job failed: {e}", file=sys.stderr)
+            ok = False
+        if ok:
+            path.unlink(missing_ok=True)
+            continue
+
+        job["attempts"] = job.get("attempts", 0) + 1
+        if job["attempts"] >= MAX_ATTEMPTS:
+            _move_to_failed(path)
+            continue
+        delay = backoff(job["attempts"])
+        job["next_attempt"] = time.time() + delay
+        storage.atomic_write_json(path, job)
+        next_due = delay if next_due is None else min(next_due, delay)
+    return next_due
+
+
+def _move_to_failed(path: Path) -> None:
+    failed_dir = path.parent / "failed"
+    failed_dir.mkdir(exist_ok=True)
+    os.replace(path, failed_dir / path.name)
+
+
+def drain(cwd: str, handler: Callable[[dict], bool]) -> None:
+    """Process the queue until it is empty, unless another worker owns it."""
+    directory = queue_dir(cwd)
+    directory.mkdir(parents=True, exist_ok=True)
+    started = time.monotonic()
+    while True:
+        with open(directory / "worker.lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # The running worker re-checks the queue before it exits
+                return
+            while True:
+                next_due = process_due_jobs(cwd, handler)
+                if next_due is None or time.monotonic() - started + next_due > MAX_WORKER_SECONDS:
+                    break
+                time.sleep(next_due)
+        # A job enqueued while we were releasing the lock found it still held
+        if not any(
+            storage.read_json(path, {}).get("next_attempt", 0) <= time.time() for path in pending_jobs(cwd)
+        ):
+            return
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: summary_queue.py <project dir>", file=sys.stderr)
+        sys.exit(2)
+    from session_save import run_summary_job
+
+    drain(sys.argv[1], run_summary_job)
+
+
+if __name__ == "__main__":
+    main()
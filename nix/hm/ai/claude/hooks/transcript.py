@@ -0,0 +1,568 @@
+"""Single-pass transcript parser shared by the hooks and the statusline.
+
+One streaming pass over a Claude transcript (JSONL) folds every line into the
+fields a caller subscribes to:
+
+    messages          (msg_type, content, line_number) tuples for the session
+                      markdown: "user", "agent" and "tool_call" for IMPORTANT_TOOLS
+    handoff_messages  {"role", "content"} dicts for /handoff (tool-only turns
+                      skipped, content truncated to `handoff_content_len`)
+    todos             the latest `newTodos` list from a TodoWrite result
+    usage             running token totals plus the latest main-chain usage
+
+The result also carries `offset`/`line`: bytes and lines of complete JSONL
+lines consumed, i.e. where the next incremental read would start.
+
+Most transcript lines are tool_result payloads and snapshot/progress entries
+that no field uses, so each line's raw bytes are checked first (see
+line_filter) and only lines that can contribute are handed to `json.loads`.
+
+State is checkpointed through transcript_cache, keyed on the subscribed field
+set, so callers subscribing to the same fields share one checkpoint and a
+repeat call only folds newly appended lines. Callers that keep their own
+watermark (session_store) use parse_from instead.
+
+Consumers that only need the most recent messages or todos use read_tail
+instead, which reads blocks backwards from EOF and stops as soon as it has
+enough.
+"""
+
+import json
+import os
+import re
+from typing import Callable, Collection, Iterable, Iterator
+
+from transcript_cache import scan_transcript
+
+FIELDS = ("messages", "handoff_messages", "todos", "usage")
+IMPORTANT_TOOLS = {"Bash", "Execute", "Write", "Edit", "Create", "Task"}
+HANDOFF_CONTENT_LEN = 500
+# Block size for reading transcripts backwards (read_tail)
+TAIL_BLOCK_SIZE = 64 * 1024
+# Part of every checkpoint key; bump when any field's derived output changes
+PARSER_VERSION = 2
+
+# Byte markers used by line_filter. Claude writes compact JSON, so a line's
+# top-level type shows up as `"type":"..."`; nested text is JSON-escaped
+# (`\"type\":...`) and can never produce these markers by accident.
+_COMPACT_TYPE = b'"type":"'
+_MESSAGE_TYPES = (b'"type":"user"', b'"type":"assistant"')
+_TOOL_RESULT = b'"type":"tool_result"'
+_META = b'"isMeta":true'
+_USAGE = b'"usage"'
+_NEW_TODOS = b'"newTodos"'
+# A \u escape of a printable ASCII character could spell any of the markers
+# above (`"\u0074ype"` is `"type"`); control and non-ASCII escapes cannot
+_ASCII_ESCAPE = re.compile(rb"\\u00[2-7][0-9a-fA-F]")
+
+
+def format_content(content) -> str:
+    """Format message content to string."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, dict):
+                # tool_use / tool_result blocks are handled separately
+                if part.get("type") == "text":
+                    parts.append(part.get("text", ""))
+            elif isinstance(part, str):
+                parts.append(part)
+        return "\n".join(parts)
+    return str(content)
+
+
+def format_tool_call(tool_name: str, tool_input: dict) -> str:
+    """Format a tool call for output."""
+    if tool_name == "Bash" or tool_name == "Execute":
+        cmd = tool_input.get("command", "")
+        return f"[{tool_name}] {cmd}"
+    elif tool_name == "Write" or tool_name == "Create":
+        path = tool_input.get("file_path", tool_input.get("path", ""))
+        return f"[{tool_name}] {path}"
+    elif tool_name == "Edit":
+        path = tool_input.get("file_path", "")
+        return f"[{tool_name}] {path}"
+    elif tool_name == "Task":
+        desc = tool_input.get("description", "")
+        return f"[{tool_name}] {desc}"
+    else:
+        return f"[{tool_name}]"
+
+
+def parse_entry(entry: dict, line_number: int) -> list:
+    """Return the (msg_type, content, line_number) messages of one transcript entry."""
+    messages = []
+    entry_type = entry.get("type")
+
+    # Skip non-message entries (queue-operation, file-history-snapshot, etc.)
+    if entry_type not in ("user", "assistant"):
+        return messages
+
+    # Skip meta messages (system injections, command messages)
+    if entry.get("isMeta"):
+        return messages
+
+    message = entry.get("message", {})
+    role = message.get("role")
+    content = message.get("content", "")
+
+    # User message
+    if entry_type == "user" and role == "user":
+        # Skip tool_result messages
+        if isinstance(content, list):
+            has_tool_result = any(
+                isinstance(p, dict) and p.get("type") == "tool_result"
+                for p in content
+            )
+            if has_tool_result:
+                return messages
+            # Check for interrupt messages
+            text_content = format_content(content)
+            if text_content and "[Request interrupted by user]" not in text_content:
+                messages.append(("user", text_content, line_number))
+        elif isinstance(content, str) and content:
+            # Skip command messages
+            if "<command-" in content or "<local-command" in content:
+                return messages
+            messages.append(("user", content, line_number))
+
+    # Assistant message
+    elif entry_type == "assistant" and role == "assistant":
+        if isinstance(content, list):
+            text_parts = []
+            for part in content:
+                if isinstance(part, dict):
+                    if part.get("type") == "text":
+                        text = part.get("text", "").strip()
+                        if text:
+                            text_parts.append(text)
+                    elif part.get("type") == "tool_use":
+                        tool_name = part.get("name", "")
+                        tool_input = part.get("input", {})
+                        if tool_name in IMPORTANT_TOOLS:
+                            messages.append(("tool_call", format_tool_call(tool_name, tool_input), line_number))
+            if text_parts:
+                messages.append(("agent", "\n".join(text_parts), line_number))
+        elif isinstance(content, str) and content.strip():
+            messages.append(("agent", content.strip(), line_number))
+
+    return messages
+
+
+def message_from_entry(entry: dict, max_content_len: int = HANDOFF_CONTENT_LEN) -> dict | None:
+    """Build a handoff message dict from one transcript entry, or None to skip it."""
+    # Skip non-message entries (file-history-snapshot, etc.)
+    if entry.get("type") not in ("user", "assistant"):
+        return None
+
+    # Extract message content
+    message = entry.get("message", {})
+    role = message.get("role")
+    content = message.get("content")
+
+    if not role or not content:
+        return None
+
+    # Handle different content formats
+    if isinstance(content, str):
+        text = content
+    elif isinstance(content, list):
+        # Check if this is a tool_result message (user messages with tool output)
+        # These contain verbose file contents - skip entirely
+        is_tool_result = any(
+            isinstance(b, dict) and b.get("type") == "tool_result" for b in content
+        )
+        if is_tool_result:
+            return None
+
+        # Extract text from content blocks (assistant messages)
+        text_parts = []
+        tool_count = 0
+        for block in content:
+            if isinstance(block, dict):
+                if block.get("type") == "text":
+                    block_text = block.get("text", "")
+                    # Skip "(no content)" placeholder
+                    if block_text.strip() and block_text.strip() != "(no content)":
+                        text_parts.append(block_text)
+                elif block.get("type") == "tool_use":
+                    tool_count += 1
+            elif isinstance(block, str):
+                text_parts.append(block)
+
+        # Skip messages with only tool calls and no meaningful text
+        if not text_parts:
+            return None
+
+        text = "\n".join(text_parts)
+        # Append tool count summary if tools were used
+        if tool_count > 0:
+            text += f" [+{tool_count} tool call(s)]"
+    else:
+        return None
+
+    # Skip empty messages
+    text = text.strip()
+    if not text:
+        return None
+
+    # Truncate long messages
+    if len(text) > max_content_len:
+        text = text[:max_content_len] + "..."
+
+    return {"role": role, "content": text}
+
+
+def todos_from_entry(entry: dict) -> list | None:
+    """Return the `newTodos` of a TodoWrite result entry, or None."""
+    # Look for user type entries with toolUseResult containing todos
+    if entry.get("type") != "user" or "toolUseResult" not in entry:
+        return None
+    tool_result = entry["toolUseResult"]
+    if isinstance(tool_result, dict) and "newTodos" in tool_result:
+        return tool_result["newTodos"]
+    return None
+
+
+def empty_usage() -> dict:
+    """Initial state of the `usage` field."""
+    return {
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cached_tokens": 0,
+        "latest_timestamp": None,
+        "latest_usage": None,
+    }
+
+
+def fold_usage(totals: dict, entry: dict) -> None:
+    """Add one entry's token usage to the running totals."""
+    message = entry.get("message")
+    usage = message.get("usage") if isinstance(message, dict) else None
+    if not usage or not isinstance(usage, dict):
+        return
+    try:
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        cached_tokens = usage.get("cache_read_input_tokens", 0) + usage.get(
+            "cache_creation_input_tokens", 0
+        )
+        totals["input_tokens"] += input_tokens
+        totals["output_tokens"] += output_tokens
+        totals["cached_tokens"] += cached_tokens
+    except TypeError:
+        return
+
+    # Track most recent main chain entry (only its usage is needed later)
+    timestamp = entry.get("timestamp")
+    if not entry.get("isSidechain", False) and timestamp:
+        latest = totals["latest_timestamp"]
+        if latest is None or timestamp > latest:
+            totals["latest_timestamp"] = timestamp
+            totals["latest_usage"] = usage
+
+
+def new_state(fields: Iterable[str]) -> dict:
+    """Return the empty parse state for a set of subscribed fields."""
+    state = {"offset": 0, "line": 0}
+    for field in fields:
+        if field == "usage":
+            state["usage"] = empty_usage()
+        elif field in FIELDS:
+            state[field] = []
+        else:
+            raise ValueError(f"unknown transcript field: {field}")
+    return state
+
+
+def fold_entry(
+    state: dict,
+    entry: dict,
+    line_number: int,
+    handoff_content_len: int = HANDOFF_CONTENT_LEN,
+) -> dict:
+    """Fold one decoded transcript entry into every subscribed field."""
+    if "messages" in state:
+        state["messages"].extend(parse_entry(entry, line_number))
+    if "handoff_messages" in state:
+        msg = message_from_entry(entry, handoff_content_len)
+        if msg:
+            state["handoff_messages"].append(msg)
+    if "todos" in state:
+        todos = todos_from_entry(entry)
+        if todos is not None:
+            state["todos"] = todos
+    if "usage" in state:
+        fold_usage(state["usage"], entry)
+    return state
+
+
+def line_filter(fields: Iterable[str]) -> Callable[[bytes], bool]:
+    """Return a predicate telling whether a raw line can affect any subscribed field.
+
+    Lines the predicate rejects are skipped without decoding. Each check only
+    rejects lines that the matching fold would discard anyway:
+
+    - messages / handoff_messages need a user or assistant entry, and both
+      drop user entries carrying tool_result blocks; messages also drops
+      isMeta entries
+    - todos needs a `newTodos` key, usage a `usage` key
+
+    Lines that are not compact JSON, or that write a printable ASCII character
+    as a `\\u00XX` escape, are always decoded. The tool_result and isMeta
+    markers are only trusted on lines that mention no assistant type, since
+    an assistant's tool_use input is raw JSON and could contain them.
+    """
+    fields = set(fields)
+    want_messages = bool(fields & {"messages", "handoff_messages"})
+    # isMeta entries still produce handoff messages
+    skip_meta = "handoff_messages" not in fields
+    want_todos = "todos" in fields
+    want_usage = "usage" in fields
+
+    def wanted(raw: bytes) -> bool:
+        if b"\\u00" in raw and _ASCII_ESCAPE.search(raw):
+            return True
+        if want_todos and _NEW_TODOS in raw:
+            return True
+        if want_usage and _USAGE in raw:
+            return True
+        if not want_messages:
+            return False
+        if _COMPACT_TYPE not in raw:
+            return True
+        if _MESSAGE_TYPES[1] in raw:
+            return True
+        if _MESSAGE_TYPES[0] not in raw:
+            return False
+        if _TOOL_RESULT in raw:
+            return False
+        return not (skip_meta and _META in raw)
+
+    return wanted
+
+
+def consumer_key(fields: Iterable[str], handoff_content_len: int = HANDOFF_CONTENT_LEN) -> str:
+    """Return the transcript_cache checkpoint key for a field subscription."""
+    fields = sorted(set(fields))
+    key = f"transcript-v{PARSER_VERSION}-{'+'.join(fields)}"
+    if "handoff_messages" in fields:
+        key += f"-{handoff_content_len}"
+    return key
+
+
+def _line_folder(
+    fields: Iterable[str], handoff_content_len: int, prefilter: bool = True
+) -> Callable[[dict, bytes, int], dict]:
+    """Return a fold(state, raw_line, line_number) for a field subscription."""
+    wanted = line_filter(fields) if prefilter else None
+
+    def fold(state: dict, raw: bytes, line_number: int) -> dict:
+        if raw.endswith(b"\n"):
+            state["offset"] += len(raw)
+            state["line"] = line_number
+        if wanted and not wanted(raw):
+            return state
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            return state
+        if isinstance(entry, dict):
+            fold_entry(state, entry, line_number, handoff_content_len)
+        return state
+
+    return fold
+
+
+def parse_transcript(
+    transcript_path: str,
+    fields: Iterable[str] = ("messages",),
+    handoff_content_len: int = HANDOFF_CONTENT_LEN,
+    prefilter: bool = True,
+) -> dict:
+    """Parse a transcript once, returning the subscribed fields.
+
+    Only lines appended since the last call with the same subscription are
+    read; see transcript_cache. Checkpointed state is JSON round-tripped, so
+    `messages` entries are normalized back to tuples here.
+
+    Args:
+        transcript_path: Path to the transcript JSONL file
+        fields: Any of FIELDS
+        handoff_content_len: Truncation length for `handoff_messages`
+        prefilter: Skip lines line_filter rejects without decoding them.
+            Only disabled to check the filter against a full decode.
+
+    Returns:
+        Dict with the subscribed fields plus `offset` and `line`
+
+    Raises:
+        FileNotFoundError: If the transcript does not exist
+    """
+    fields = tuple(sorted(set(fields)))
+    fold = _line_folder(fields, handoff_content_len, prefilter)
+
+    consumer = consumer_key(fields, handoff_content_len)
+    if not prefilter:
+        consumer += "-nofilter"
+    state = scan_transcript(
+        transcript_path,
+        consumer,
+        lambda: new_state(fields),
+        fold,
+    )
+    if "messages" in state:
+        state["messages"] = [tuple(m) for m in state["messages"]]
+    return state
+
+
+def parse_from(
+    transcript_path: str,
+    fields: Iterable[str],
+    offset: int = 0,
+    line: int = 0,
+    handoff_content_len: int = HANDOFF_CONTENT_LEN,
+    max_handoff_messages: int | None = None,
+) -> dict:
+    """Parse only the complete lines after a caller-owned watermark.
+
+    Unlike parse_transcript this keeps no checkpoint and returns just the
+    entries after `offset` (which must sit on a line boundary, `line` lines
+    in). A trailing line that is still being written is left for the next
+    call, so the returned `offset`/`line` can be stored as the new watermark.
+    With `max_handoff_messages`, parsing stops right after the line that
+    yields that many handoff messages, so the watermark covers exactly them.
+
+    Raises:
+        FileNotFoundError: If the transcript does not exist
+    """
+    fields = tuple(sorted(set(fields)))
+    fold = _line_folder(fields, handoff_content_len)
+    state = new_state(fields)
+    state["offset"] = offset
+    state["line"] = line
+
+    with open(transcript_path, "rb") as f:
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            line += 1
+            state = fold(state, raw, line)
+            if max_handoff_messages is not None and len(state["handoff_messages"]) >= max_handoff_messages:
+                break
+    return state
+
+
+def iter_lines_reverse(transcript_path: str, block_size: int = TAIL_BLOCK_SIZE) -> Iterator[bytes]:
+    """Yield the non-empty lines of a file from last to first, without newlines.
+
+    Reads fixed-size blocks backwards from EOF, so a consumer that stops early
+    only pays for the tail it looked at. A line longer than a block is
+    assembled from its chunks once, never re-copied per block.
+
+    Raises:
+        FileNotFoundError: If the transcript does not exist
+    """
+    with open(transcript_path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        # Chunks of the line being assembled, last chunk first
+        pending = []
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)
+            parts = block.split(b"\n")
+            if len(parts) == 1:
+                pending.append(block)
+                continue
+            pending.append(parts[-1])
+            line = b"".join(reversed(pending))
+            if line:
+                yield line
+            for line in reversed(parts[1:-1]):
+                if line:
+                    yield line
+            pending = [parts[0]]
+        line = b"".join(reversed(pending))
+        if line:
+            yield line
+
+
+def read_tail(
+    transcript_path: str,
+    fields: Iterable[str],
+    max_messages: int,
+    handoff_content_len: int = HANDOFF_CONTENT_LEN,
+    message_types: Collection[str] | None = None,
+) -> dict:
+    """Read only as much of the transcript's tail as the subscribed fields need.
+
+    Walks lines backwards (iter_lines_reverse) and stops once every field is
+    satisfied: the last `max_messages` of messages / handoff_messages, and the
+    latest `newTodos` for todos. Cost is proportional to that tail, not to the
+    session length, and no checkpoint is needed.
+
+    `usage` totals need every line and are not supported here; use
+    parse_transcript. Tail `messages` carry None as line_number, since the
+    absolute line is unknown when reading backwards; `message_types` (e.g.
+    {"user", "agent"}) restricts which of them are collected and counted.
+
+    Returns:
+        Dict with the subscribed fields, in transcript order
+
+    Raises:
+        FileNotFoundError: If the transcript does not exist
+    """
+    fields = set(fields)
+    if "usage" in fields:
+        raise ValueError("usage totals need a full scan; use parse_transcript")
+    state = new_state(fields)
+    del state["offset"], state["line"]
+    filters = {field: line_filter((field,)) for field in fields}
+    todos_found = False
+
+    def pending() -> list[str]:
+        return [
+            field
+            for field in fields
+            if (field == "todos" and not todos_found)
+            or (field != "todos" and len(state[field]) < max_messages)
+        ]
+
+    waiting = pending()
+    for raw in iter_lines_reverse(transcript_path):
+        if not waiting:
+            break
+        if not any(filters[field](raw) for field in waiting):
+            continue
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            continue
+        if not isinstance(entry, dict):
+            continue
+        if "messages" in waiting:
+            # Entries yield several messages; prepend in their original order
+            messages = parse_entry(entry, None)
+            if message_types is not None:
+                messages = [m for m in messages if m[0] in message_types]
+            state["messages"][:0] = messages
+        if "handoff_messages" in waiting:
+            msg = message_from_entry(entry, handoff_content_len)
+            if msg:
+                state["handoff_messages"].insert(0, msg)
+        if "todos" in waiting:
+            todos = todos_from_entry(entry)
+            if todos is not None:
+                state["todos"] = todos
+                todos_found = True
+        waiting = pending()
+
+    for field in ("messages", "handoff_messages"):
+        if field in state:
+            state[field] = state[field][-max_messages:]
+    return state
@@ -0,0 +1,176 @@
+"""Per-transcript checkpoint store shared by the transcript-reading hooks.
+
+Claude transcripts are append-only JSONL files that grow to tens of MB in long
+sessions. Instead of re-parsing from byte 0 on every call, a reader folds each
+complete line into a JSON-serializable state and the store persists:
+
+    {"offset": <bytes consumed>, "line": <lines consumed>,
+     "inode": <st_ino>, "size": <st_size at save>, "state": <derived state>}
+
+under `~/.cache/claude-hooks/transcripts/` (honours XDG_CACHE_HOME). The next
+call seeks to `offset` and only folds the newly appended lines.
+
+A checkpoint is discarded (full rescan) when the transcript was rotated (inode
+changed), truncated (smaller than the recorded size) or rewritten in place (the
+byte before `offset` is no longer a newline).
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import storage
+
+# Bump when the checkpoint layout changes; old files are then ignored
+CHECKPOINT_VERSION = 1
+# Checkpoints for transcripts untouched this long are pruned
+MAX_CHECKPOINT_AGE_DAYS = 7
+
+
+def cache_dir() -> Path:
+    """Return the directory holding transcript checkpoints."""
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "claude-hooks" / "transcripts"
+
+
+def checkpoint_path(transcript_path: str, consumer: str) -> Path:
+    """Return the checkpoint file for a (transcript, consumer) pair."""
+    real = os.path.realpath(transcript_path)
+    digest = hashlib.sha1(real.encode("utf-8")).hexdigest()[:16]
+    return cache_dir() / f"{digest}-{consumer}.json"
+
+
+def _tail_is_line_boundary(f, offset: int) -> bool:
+    """Check that `offset` still sits right after a newline."""
+    if offset == 0:
+        return True
+    f.seek(offset - 1)
+    return f.read(1) == b"\n"
+
+
+def load_checkpoint(transcript_path: str, consumer: str, st: os.stat_result) -> dict | None:
+    """Load a checkpoint if it is still valid for the transcript's current stat."""
+    try:
+        with open(checkpoint_path(transcript_path, consumer), "r") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(checkpoint, dict) or checkpoint.get("version") != CHECKPOINT_VERSION:
+        return None
+
+    offset = checkpoint.get("offset", -1)
+    # Rotated: a different file now lives at this path
+    if checkpoint.get("inode") != st.st_ino:
+        return None
+    # Truncated: the file shrank below what we already consumed
+    if not 0 <= offset <= st.st_size or checkpoint.get("size", 0) > st.st_size:
+        return None
+
+    return checkpoint
+
+
+def save_checkpoint(
+    transcript_path: str,
+    consumer: str,
+    st: os.stat_result,
+    offset: int,
+    line: int,
+    state: Any,
+) -> None:
+    """Persist a checkpoint atomically (temp file + rename). Best effort."""
+    path = checkpoint_path(transcript_path, consumer)
+    try:
+        fresh = not path.exists()
+        storage.atomic_write_json(
+            path,
+            {
+                "version": CHECKPOINT_VERSION,
+                "transcript": os.path.realpath(transcript_path),
+                "inode": st.st_ino,
+                "size": st.st_size,
+                "offset": offset,
+                "line": line,
+                "state": state,
+            },
+            separators=(",", ":"),
+        )
+        if fresh:
+            prune_checkpoints()
+    except Exception as e:
+        print(f"Failed to save transcript checkpoint: {e}", file=sys.stderr)
+
+
+def prune_checkpoints(max_age_days: int = MAX_CHECKPOINT_AGE_DAYS) -> None:
+    """Remove checkpoints that have not been touched for `max_age_days`."""
+    cutoff = time.time() - max_age_days * 86400
+    try:
+        for path in cache_dir().glob("*.json"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                continue
+    except OSError:
+        pass
+
+
+def scan_transcript(
+    transcript_path: str,
+    consumer: str,
+    init: Callable[[], Any],
+    fold: Callable[[Any, bytes, int], Any],
+) -> Any:
+    """Fold every line of a transcript into a state, resuming from the checkpoint.
+
+    Args:
+        transcript_path: Path to the transcript JSONL file
+        consumer: Checkpoint key; include a version suffix and any parameters
+            that change the derived state (e.g. "handoff-messages-v1-500")
+        init: Returns the empty state for a full scan
+        fold: Called as fold(state, raw_line, line_number) and returns the new
+            state. `raw_line` is the undecoded bytes of one JSONL line.
+
+    Returns:
+        The state after folding all lines (JSON round-tripped when it came
+        from a checkpoint, so tuples come back as lists).
+
+    Raises:
+        FileNotFoundError: If the transcript does not exist
+    """
+    st = os.stat(transcript_path)
+
+    with open(transcript_path, "rb") as f:
+        checkpoint = load_checkpoint(transcript_path, consumer, st)
+        if checkpoint and _tail_is_line_boundary(f, checkpoint["offset"]):
+            state = checkpoint["state"]
+            offset = checkpoint["offset"]
+            line_number = checkpoint["line"]
+        else:
+            state = init()
+            offset = 0
+            line_number = 0
+
+        if checkpoint and offset == st.st_size:
+            return state
+
+        f.seek(offset)
+        partial = b""
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                # Last line is still being written; fold it but do not checkpoint past it
+                partial = raw
+                break
+            line_number += 1
+            offset += len(raw)
+            state = fold(state, raw, line_number)
+
+    save_checkpoint(transcript_path, consumer, st, offset, line_number, state)
+
+    if partial:
+        state = fold(state, partial, line_number + 1)
+    return state
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.11"
+# dependencies = []
+# ///
+"""UserPromptSubmit dispatcher for the slash-command hooks.
+
+Registered once in settings.json instead of one `uv run` per hook. It:
+1. Parses the hook JSON from stdin once
+2. Routes `/handoff`, `/sync` and `/pickup` prompts to the matching hook module
+3. Imports that module lazily, so ordinary prompts only pay for this file
+   (plus rolling_summary.py when CLAUDE_HOOKS_ROLLING_SUMMARY=1)
+
+Each handler module exposes `handle_prompt(input_data) -> int`, prints its own
+hook output and returns the exit code.
+"""
+
+import importlib
+import json
+import os
+import sys
+
+# Prompt prefix -> hook module implementing handle_prompt()
+PROMPT_HANDLERS = {
+    "/handoff": "handoff_interceptor",
+    "/sync": "sync_interceptor",
+    "/pickup": "pickup_hook",
+}
+
+
+def route_prompt(prompt: str) -> str | None:
+    """Return the handler module name for a prompt, or None if it is not a command."""
+    if not prompt.startswith("/"):
+        return None
+    for prefix, module_name in PROMPT_HANDLERS.items():
+        if prompt.startswith(prefix):
+            return module_name
+    return None
+
+
+def dispatch(input_data: dict) -> int:
+    """Run the handler for this prompt in-process and return its exit code."""
+    prompt = input_data.get("prompt", "").strip()
+
+    module_name = route_prompt(prompt)
+    if not module_name:
+        # Not one of our commands, allow it to proceed normally
+        if os.environ.get("CLAUDE_HOOKS_ROLLING_SUMMARY") == "1":
+            try:
+                importlib.import_module("rolling_summary").maybe_roll(input_data)
+            except Exception as e:
+                print(f"Failed to start rolling summary: {e}", file=sys.stderr)
+        return 0
+
+    handler = importlib.import_module(module_name)
+    return handler.handle_prompt(input_data)
+
+
+def main():
+    """Main hook entry point."""
+    try:
+        input_data = json.load(sys.stdin)
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    sys.exit(dispatch(input_data))
+
+
+if __name__ == "__main__":
+    main()
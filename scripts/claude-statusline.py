@@ -20,91 +20,178 @@ ICON_DURATION = "󱑆"
 import json
 import sys
 import os
-import subprocess
 
+# Shared transcript parser lives next to the Claude hooks
+HOOKS_DIR = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "..", "nix", "hm", "ai", "claude", "hooks"
+)
+
+try:
+    sys.path.insert(0, HOOKS_DIR)
+    from transcript import parse_transcript
+except ImportError:
+
+    def parse_transcript(transcript_path, fields):
+        """Fallback without persistence: stream the whole transcript for usage totals"""
+        totals = {
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cached_tokens": 0,
+            "latest_timestamp": None,
+            "latest_usage": None,
+        }
+        with open(transcript_path, "rb") as f:
+            for raw in f:
+                try:
+                    data = json.loads(raw)
+                    usage = data.get("message", {}).get("usage")
+                    if not usage:
+                        continue
+                    totals["input_tokens"] += usage.get("input_tokens", 0)
+                    totals["output_tokens"] += usage.get("output_tokens", 0)
+                    totals["cached_tokens"] += usage.get("cache_read_input_tokens", 0)
+                    totals["cached_tokens"] += usage.get("cache_creation_input_tokens", 0)
+
+                    # Track most recent main chain entry (only its usage is needed later)
+                    if not data.get("isSidechain", False) and data.get("timestamp"):
+                        latest = totals["latest_timestamp"]
+                        if latest is None or data["timestamp"] > latest:
+                            totals["latest_timestamp"] = data["timestamp"]
+                            totals["latest_usage"] = usage
+                except Exception:
+                    continue
+        return {"usage": totals}
+
+
+def find_git_head(cwd):
+    """Locate the HEAD file of the repository containing cwd (None if not a repo)
+
+    Walks up to the nearest `.git`. A `.git` directory holds HEAD directly; a
+    `.git` file (linked worktree or submodule) points at the real git dir with
+    a `gitdir: <path>` line.
+    """
+    path = os.path.abspath(cwd)
+    while True:
+        dot_git = os.path.join(path, ".git")
+        if os.path.isdir(dot_git):
+            return os.path.join(dot_git, "HEAD")
+        if os.path.isfile(dot_git):
+            with open(dot_git, "r") as f:
+                content = f.read().strip()
+            if not content.startswith("gitdir:"):
+                return None
+            git_dir = content[len("gitdir:") :].strip()
+            if not os.path.isabs(git_dir):
+                git_dir = os.path.join(path, git_dir)
+            return os.path.join(git_dir, "HEAD")
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
 
-def get_git_branch(cwd):
-    """Get the current git branch if in a git repository"""
+
+def read_head_branch(head_path):
+    """Return the branch name HEAD points at ("" when detached)"""
+    with open(head_path, "r") as f:
+        head = f.read().strip()
+    prefix = "ref: refs/heads/"
+    return head[len(prefix) :] if head.startswith(prefix) else ""
+
+
+# Most recent workspaces kept in the branch cache
+BRANCH_CACHE_ENTRIES = 32
+
+
+def branch_cache_file():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "claude-hooks", "statusline-branch.json")
+
+
+def load_branch_cache():
+    """Return {cwd: [HEAD path, HEAD mtime_ns, branch]} ({} if missing or unreadable)"""
     try:
-        # Change to the working directory
-        original_cwd = os.getcwd()
-        os.chdir(cwd)
+        with open(branch_cache_file(), "r") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
 
-        # Check if we're in a git repo
-        result = subprocess.run(
-            ["git", "rev-parse", "--git-dir"], capture_output=True, text=True, timeout=1
-        )
 
-        if result.returncode != 0:
-            os.chdir(original_cwd)
-            return ""
+def save_branch_cache(cache):
+    """Write the cache atomically, keeping the most recently added workspaces"""
+    path = branch_cache_file()
+    entries = list(cache.items())[-BRANCH_CACHE_ENTRIES:]
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(dict(entries), f)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # The cache is an optimization only
 
-        # Get current branch
-        result = subprocess.run(
-            ["git", "branch", "--show-current"],
-            capture_output=True,
-            text=True,
-            timeout=1,
-        )
 
-        os.chdir(original_cwd)
+def get_git_branch(cwd):
+    """Get the current git branch if in a git repository
+
+    Reads HEAD directly instead of forking git and never touches the process
+    cwd. The statusline is a new process per render, so the branch is cached
+    on disk per cwd, keyed on HEAD's path and mtime: a repeat render reads the
+    small cache file and stats HEAD once.
+    """
+    try:
+        cache = load_branch_cache()
+        cached = cache.get(cwd)
+        if isinstance(cached, list) and len(cached) == 3:
+            head_path, mtime_ns, branch = cached
+            try:
+                if os.stat(head_path).st_mtime_ns == mtime_ns:
+                    return f" | {ICON_BRANCH} {branch}" if branch else ""
+            except OSError:
+                pass  # HEAD moved or the repo is gone; walk again
+
+        head_path = find_git_head(cwd)
+        if not head_path:
+            return ""
+
+        mtime_ns = os.stat(head_path).st_mtime_ns
+        branch = read_head_branch(head_path)
+        cache.pop(cwd, None)
+        cache[cwd] = [head_path, mtime_ns, branch]
+        save_branch_cache(cache)
 
-        branch = result.stdout.strip()
         return f" | {ICON_BRANCH} {branch}" if branch else ""
     except Exception:
         return ""
 
 
 def get_token_metrics(transcript_path):
-    """Calculate token metrics from transcript file"""
+    """Calculate token metrics from transcript file
+
+    Running totals are persisted per transcript (the "usage" field of the
+    shared transcript parser), so a refresh only folds in lines appended since
+    the previous redraw. Without the hooks checkout the whole transcript is
+    streamed on each redraw instead.
+    """
     try:
         if not os.path.exists(transcript_path):
             return None
 
-        with open(transcript_path, "r") as f:
-            lines = f.read().strip().split("\n")
-
-        input_tokens = 0
-        output_tokens = 0
-        cached_tokens = 0
-        context_length = 0
-
-        most_recent_main_chain_entry = None
-        most_recent_timestamp = None
-
-        for line in lines:
-            try:
-                data = json.loads(line)
-                if data.get("message", {}).get("usage"):
-                    usage = data["message"]["usage"]
-                    input_tokens += usage.get("input_tokens", 0)
-                    output_tokens += usage.get("output_tokens", 0)
-                    cached_tokens += usage.get("cache_read_input_tokens", 0)
-                    cached_tokens += usage.get("cache_creation_input_tokens", 0)
-
-                    # Track most recent main chain entry
-                    if not data.get("isSidechain", False) and data.get("timestamp"):
-                        timestamp = data["timestamp"]
-                        if (
-                            most_recent_timestamp is None
-                            or timestamp > most_recent_timestamp
-                        ):
-                            most_recent_timestamp = timestamp
-                            most_recent_main_chain_entry = data
-            except:
-                continue
+        totals = parse_transcript(transcript_path, ("usage",))["usage"]
 
         # Calculate context length from most recent main chain message
-        if most_recent_main_chain_entry and most_recent_main_chain_entry.get(
-            "message", {}
-        ).get("usage"):
-            usage = most_recent_main_chain_entry["message"]["usage"]
+        context_length = 0
+        usage = totals["latest_usage"]
+        if usage:
             context_length = (
                 usage.get("input_tokens", 0)
                 + usage.get("cache_read_input_tokens", 0)
                 + usage.get("cache_creation_input_tokens", 0)
             )
 
+        input_tokens = totals["input_tokens"]
+        output_tokens = totals["output_tokens"]
+        cached_tokens = totals["cached_tokens"]
         total_tokens = input_tokens + output_tokens + cached_tokens
 
         return {
@@ -114,7 +201,7 @@ def get_token_metrics(transcript_path):
             "total_tokens": total_tokens,
             "context_length": context_length,
         }
-    except:
+    except Exception:
         return None
 
 
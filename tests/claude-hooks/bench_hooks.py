@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for Claude hooks (not part of the test suite)
+
+Usage:
+    python3 bench_hooks.py [benchmark ...]
+
+Benchmarks:
+- summarizer: end-to-end /handoff latency, aichat backend vs pooled HTTP backend
+- selection: filter_messages_for_handoff on synthetic 1k-50k message sessions
+- classifier: compiled phrase classifier vs one substring scan per phrase
+- ranking: BM25 relevance of 1k-10k message sessions (target: 5k under 50ms)
+- rules: prevent_forbidden_bash rule lookup and loading, 10-1000 rules
+- lexer: shell lexer vs the previous regex split + shlex, 0.5-8 MB commands
+"""
+
+import json
+import os
+import random
+import re
+import shlex
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from test_hooks import start_stub_llm, run_hook
+import handoff_interceptor
+import phrase_classifier
+import prevent_forbidden_bash
+import relevance
+import shell_lexer
+from handoff_interceptor import MAX_MESSAGES, filter_messages_for_handoff
+
+RUNS = 5
+STUB_LATENCY = 0.05  # seconds per completion, a fast endpoint
+
+# Stands in for aichat: a process per call and a new connection per call
+FAKE_AICHAT = """#!{python}
+import json, sys, urllib.request
+request = urllib.request.Request(
+    {url!r} + "/chat/completions",
+    data=json.dumps({{"messages": [{{"role": "system", "content": sys.argv[2]}},
+                                  {{"role": "user", "content": sys.stdin.read()}}]}}).encode(),
+    headers={{"Content-Type": "application/json"}},
+)
+with urllib.request.urlopen(request) as response:
+    print(json.load(response)["choices"][0]["message"]["content"])
+"""
+
+
+def write_transcript(path, n_messages):
+    path.write_text(
+        "".join(
+            json.dumps({"type": "user", "message": {"role": "user", "content": f"please do task {i} " + "y" * 400}})
+            + "\n"
+            for i in range(n_messages)
+        )
+    )
+
+
+def time_handoff(n_messages, env):
+    """Run /handoff once in a fresh project and cache; returns seconds"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        transcript = Path(tmpdir) / "transcript.jsonl"
+        write_transcript(transcript, n_messages)
+        handoff = {"prompt": "/handoff", "transcript_path": str(transcript), "session_id": "bench", "cwd": tmpdir}
+        start = time.perf_counter()
+        proc = run_hook("user_prompt_dispatch.py", handoff, env={**env, "XDG_CACHE_HOME": tmpdir})
+        elapsed = time.perf_counter() - start
+        if "Handoff Created" not in proc.stdout:
+            raise RuntimeError(f"/handoff failed: {proc.stderr}")
+        return elapsed
+
+
+def bench_summarizer():
+    server, url = start_stub_llm(delay=STUB_LATENCY)
+    try:
+        with tempfile.TemporaryDirectory() as bin_dir:
+            fake_aichat = Path(bin_dir) / "aichat"
+            fake_aichat.write_text(FAKE_AICHAT.format(python=sys.executable, url=url))
+            fake_aichat.chmod(0o755)
+            backends = {
+                "aichat": {"CLAUDE_HOOKS_SUMMARIZER": "aichat", "PATH": f"{bin_dir}:{os.environ['PATH']}"},
+                "http": {"CLAUDE_HOOKS_SUMMARIZER": "http", "CLAUDE_HOOKS_SUMMARIZER_URL": url},
+            }
+            sessions = {"short": 10, "long (map-reduce)": 60 + MAX_MESSAGES}
+
+            print(f"/handoff end to end, median of {RUNS} runs ({STUB_LATENCY * 1000:.0f}ms stub latency):")
+            for session, n_messages in sessions.items():
+                for backend, env in backends.items():
+                    before = len(server.requests)
+                    times = [time_handoff(n_messages, env) for _ in range(RUNS)]
+                    calls = (len(server.requests) - before) // RUNS
+                    print(
+                        f"  {session:<18} {backend:<7} {statistics.median(times) * 1000:7.0f}ms"
+                        f"  ({calls} LLM calls/run)"
+                    )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+PROSE = (
+    "the build output looks fine but the token cache in module overlay was broken after we rebased onto "
+    "main so the flake inputs were updated and nix build reran for the darwin host with verbose logging "
+    "enabled then store paths were compared between generations"
+).split()
+
+
+def synthetic_session(n_messages, seed=0):
+    """Messages mixing intents, decisions, chatter, doc dumps and tool output prose"""
+    rng = random.Random(seed)
+
+    def prose(n_words):
+        return " ".join(rng.choices(PROSE, k=n_words))
+
+    kinds = [
+        ("user", lambda i: f"Can you look at why the {i} build fails?"),
+        ("user", lambda i: f"please also handle step {i}: {prose(15)}"),
+        ("assistant", lambda i: f"We decided to pin input {i} and keep the overlay."),
+        ("assistant", lambda i: f"Let me check {i}"),
+        ("assistant", lambda i: f"Ran step {i}: {prose(70)}"),
+        ("assistant", lambda i: f"## Overview {i}\n## Usage\n- {prose(80)}"),
+    ]
+    weights = [1, 1, 1, 2, 8, 1]
+    return [
+        {"role": role, "content": make(i)}
+        for i, (role, make) in enumerate(rng.choices(kinds, weights, k=n_messages))
+    ]
+
+
+def legacy_budget_filter(messages, max_total_chars):
+    """The previous budget pass: pop oldest unprotected, then oldest protected"""
+    first_user = next((i for i, m in enumerate(messages) if m["role"] == "user"), None)
+    classifier = phrase_classifier.load()
+    annotated = []
+    for i, msg in enumerate(messages):
+        labels = handoff_interceptor.classify_message(msg["content"], msg["role"], classifier)
+        protected = i == first_user or bool(labels & {"decision", "intent"})
+        if not protected and labels & {"chatter", "doc_dump"}:
+            continue
+        annotated.append({"index": i, "msg": msg, "protected": protected})
+    total = sum(len(a["msg"]["content"]) for a in annotated)
+    tail_start = max(0, len(annotated) - handoff_interceptor.RECENT_PROTECT_COUNT)
+    i = 0
+    while total > max_total_chars and i < tail_start:
+        if not annotated[i]["protected"]:
+            total -= len(annotated.pop(i)["msg"]["content"])
+            tail_start -= 1
+            continue
+        i += 1
+    while total > max_total_chars and len(annotated) > handoff_interceptor.RECENT_PROTECT_COUNT:
+        total -= len(annotated.pop(0)["msg"]["content"])
+    return [a["msg"] for a in annotated]
+
+
+def best_of(runs, fn, *args):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_selection():
+    budget = handoff_interceptor.MAX_CONVERSATION_TOKENS
+    print(f"filter_messages_for_handoff, best of {RUNS} runs ({budget} token budget):")
+    for n_messages in (1_000, 10_000, 50_000):
+        messages = synthetic_session(n_messages)
+        selected = filter_messages_for_handoff(messages)
+        scored = best_of(RUNS, filter_messages_for_handoff, messages)
+        legacy = best_of(RUNS, legacy_budget_filter, messages, budget * handoff_interceptor.CHARS_PER_TOKEN)
+        print(
+            f"  {n_messages:>6} messages  scored heap {scored * 1000:7.1f}ms"
+            f"  legacy pop loop {legacy * 1000:8.1f}ms  ({len(selected)} kept)"
+        )
+
+
+def legacy_categories(text, phrases):
+    """The previous approach: one `any(p in t ...)` loop per phrase list"""
+    t = text.lower()
+    return {category for category, items in phrases.items() if any(p in t for p in items)}
+
+
+def bench_classifier():
+    messages = synthetic_session(10_000)
+    texts = [m["content"] for m in messages]
+    rng = random.Random(1)
+    words = ["build", "cache", "deploy", "flake", "module", "overlay", "review", "merge", "rebase", "shell"]
+    print(f"Classifying {len(texts)} messages, best of {RUNS} runs:")
+    for n_extra in (0, 250, 1000):
+        phrases = phrase_classifier.load_phrases()
+        phrases["extra"] = [" ".join(rng.choices(words, k=3)) for _ in range(n_extra)]
+        n_phrases = sum(len(items) for items in phrases.values())
+        classifier = phrase_classifier.PhraseClassifier(phrases)
+
+        def legacy():
+            for text in texts:
+                legacy_categories(text, phrases)
+
+        def compiled():
+            for text in texts:
+                classifier.classify(text.lower())
+
+        legacy_time, compiled_time = best_of(RUNS, legacy), best_of(RUNS, compiled)
+        print(
+            f"  {n_phrases:>5} phrases  per-phrase scans {legacy_time * 1000:7.1f}ms"
+            f"  compiled {compiled_time * 1000:7.1f}ms"
+        )
+
+
+def bench_ranking():
+    todos = [
+        {"content": "Fix the token cache in the overlay module", "status": "in_progress"},
+        {"content": "Rebuild the darwin host and compare store paths", "status": "pending"},
+    ]
+    if relevance._numpy():
+        backend = f"NumPy from {relevance.NUMPY_MIN_CELLS} messages x terms"
+    else:
+        backend = "NumPy not installed, pure Python"
+    print(f"relevance.rank, best of {RUNS} runs ({backend}):")
+    for n_messages in (1_000, 5_000, 10_000):
+        messages = synthetic_session(n_messages)
+        n_terms = len(relevance.build_query(messages, todos))
+        elapsed = best_of(RUNS, relevance.rank, messages, todos)
+        print(f"  {n_messages:>6} messages x {n_terms} query terms  {elapsed * 1000:6.1f}ms")
+
+
+def legacy_match(rules, tokens):
+    """The previous lookup: lowercase all tokens, walk every rule in order"""
+    lowered = [t.lower() for t in tokens]
+    for rule in rules:
+        seq = rule["sequences"][0]
+        if len(lowered) >= len(seq) and lowered[: len(seq)] == [s.lower() for s in seq]:
+            return rule
+    return None
+
+
+def bench_rules():
+    default = json.loads(prevent_forbidden_bash.DEFAULT_RULES_FILE.read_text())
+    commands = [
+        ["git", "status"], ["ls", "-la"], ["cat", "README.md"], ["npm", "test"], ["kubectl", "get", "pods"],
+        ["python3", "test_hooks.py"], ["rm", "-rf", "build"], ["docker", "ps"], ["jj", "log", "-r", "@"],
+    ] * 1000
+    print(f"Matching {len(commands)} segments, best of {RUNS} runs:")
+    for n_extra in (0, 100, 1000):
+        extra = {"rules": [{"sequences": [[f"tool{i}", "delete"]], "decision": "ask"} for i in range(n_extra)]}
+        compiled = prevent_forbidden_bash.compile_rules([default, extra])
+        # Extra rules at the front: the old list was ordered by specificity, not frequency
+        rules = compiled["rules"][len(default["rules"]):] + compiled["rules"][: len(default["rules"])]
+
+        def legacy():
+            for tokens in commands:
+                legacy_match(rules, tokens)
+
+        def trie():
+            for tokens in commands:
+                prevent_forbidden_bash.lookup(compiled, tokens)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_file = Path(tmpdir) / "rules.json"
+            cache_file.write_text(json.dumps(compiled))
+            compile_time = best_of(RUNS, prevent_forbidden_bash.compile_rules, [default, extra])
+            load_time = best_of(RUNS, lambda: json.loads(cache_file.read_bytes()))
+        print(
+            f"  {len(rules):>5} rules  linear {best_of(RUNS, legacy) * 1000:6.1f}ms"
+            f"  trie {best_of(RUNS, trie) * 1000:5.1f}ms"
+            f"  | compile {compile_time * 1000:5.2f}ms, cached load {load_time * 1000:5.2f}ms"
+        )
+
+
+def legacy_split(command):
+    """The previous split: regex on separators, then shlex.split per segment"""
+    parts = re.split(r"(\|\|?|&&|;|&)", command)
+    tokens = []
+    for part in parts:
+        if part and not re.fullmatch(r"(\|\|?|&&|;|&)", part) and part.strip():
+            try:
+                tokens.append(shlex.split(part))
+            except ValueError:
+                tokens.append([])
+    return tokens
+
+
+def bench_lexer():
+    # A script-like command: pipelines, quoting, substitutions and a heredoc
+    unit = (
+        "cd src && FOO=1 sudo -E make -j8 2>&1 | tee 'build log.txt' ; "
+        'echo "done: $(date +%s) in `pwd`" >> out.txt\n'
+        "cat <<'EOF' > notes.md\n# Notes; with | separators & quotes ' in the body\nEOF\n"
+        "bash -c 'git status --short | wc -l' || true\n"
+    )
+    print(f"Lexing commands, best of {RUNS} runs:")
+    for megabytes in (0.5, 1, 2, 4, 8):
+        command = unit * int(megabytes * 2**20 / len(unit))
+        lexer_time = best_of(RUNS, lambda: list(shell_lexer.iter_commands(command)))
+        line = f"  {len(command) / 2**20:4.1f} MB  lexer {lexer_time * 1000:7.1f}ms ({len(command) / lexer_time / 2**20:4.1f} MB/s)"
+        if megabytes <= 2:
+            line += f"  regex+shlex {best_of(1, legacy_split, command) * 1000:7.1f}ms"
+        print(line)
+
+    # Worst cases for the old split: one long heredoc, one long quoted argument
+    for name, command in (
+        ("heredoc", "cat <<'EOF' > data.txt\n" + "a | b ; c && d\n" * 2**17 + "EOF\nls"),
+        ("quoted", "echo '" + "x;" * 2**20 + "'"),
+    ):
+        print(
+            f"  {name:>7} {len(command) / 2**20:4.1f} MB  lexer {best_of(RUNS, lambda: list(shell_lexer.iter_commands(command))) * 1000:7.1f}ms"
+            f"  regex+shlex {best_of(1, legacy_split, command) * 1000:7.1f}ms"
+        )
+
+
+BENCHMARKS = {
+    "summarizer": bench_summarizer,
+    "selection": bench_selection,
+    "classifier": bench_classifier,
+    "ranking": bench_ranking,
+    "rules": bench_rules,
+    "lexer": bench_lexer,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(unknown)}; choose from {', '.join(BENCHMARKS)}", file=sys.stderr)
+        sys.exit(2)
+    for name in names:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,9 +13,16 @@ Tests:
 
 import json
 import os
+import subprocess
 import sys
 import tempfile
 import shutil
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 # Add hooks directory to path
@@ -23,7 +30,13 @@ HOOKS_DIR = Path(__file__).parent.parent.parent / "nix" / "hm" / "ai" / "claude"
 sys.path.insert(0, str(HOOKS_DIR))
 
 # Import hook functions
-from prevent_forbidden_bash import check_forbidden_bash_commands
+import journal
+import shell_lexer
+from prevent_forbidden_bash import check_forbidden_bash_commands, get_decision_and_reason
+from session_remind import find_repo_type
+from transcript import FIELDS, iter_lines_reverse, parse_transcript, read_tail
+from transcript_cache import cache_dir, scan_transcript
+from user_prompt_dispatch import route_prompt
 
 
 class TestResults:
@@ -166,6 +179,1284 @@ def test_prevent_forbidden_bash(results):
     else:
         results.record_fail("prevent_bash_allows_other_tools", f"Expected non-Bash tool to pass, got {forbidden}")
 
+    # Test 5: longest sequence wins; destructive commands ask; grep after a pipe is fine
+    commands = {
+        "RM -Rf build/": "rm -rf",
+        "rm -r -f build/": "rm -rf",
+        "rm build.log": None,
+        "docker system prune -a": "docker system prune",
+        "kubectl delete pod web-0": "kubectl delete",
+        "kubectl get pods": None,
+        "jj git push --bookmark main": "jj git push",
+        "jj git fetch": None,
+        "cat log.txt | grep error": None,
+        "cat log.txt || grep error log.txt": "grep",
+    }
+    matched = {}
+    for command, expected in commands.items():
+        forbidden = check_forbidden_bash_commands("Bash", {"command": command})
+        matched[command] = forbidden and forbidden["name"]
+    decisions = {
+        name: get_decision_and_reason(check_forbidden_bash_commands("Bash", {"command": name}), name)
+        for name in ("rm -rf /", "find .")
+    }
+    if matched == commands and decisions == {
+        "rm -rf /": ("ask", "Confirm: rm -rf"),
+        "find .": ("deny", "Use 'fd' instead of 'find'"),
+    }:
+        results.record_pass("prevent_bash_longest_match_rules")
+    else:
+        results.record_fail("prevent_bash_longest_match_rules", f"{matched} {decisions}")
+
+    # Test 6: user rules extend and override the defaults; compiled rules are cached by config hash
+    import prevent_forbidden_bash
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with patched_env(XDG_CONFIG_HOME=tmpdir, XDG_CACHE_HOME=tmpdir):
+            user_file = prevent_forbidden_bash.user_rules_file()
+            user_file.parent.mkdir(parents=True)
+            user_file.write_text(json.dumps({"rules": [
+                {"sequences": [["git", "push", "--dry-run"]], "decision": "allow"},
+                {"sequences": [["terraform", "destroy"]], "decision": "ask", "reason": "Ask before destroying"},
+            ]}))
+            dry_run = check_forbidden_bash_commands("Bash", {"command": "git push --dry-run"})
+            push = check_forbidden_bash_commands("Bash", {"command": "git push origin main"})
+            destroy = check_forbidden_bash_commands("Bash", {"command": "terraform destroy -auto-approve"})
+            cached = list(prevent_forbidden_bash.rules_cache_dir().glob("*.json"))
+            prevent_forbidden_bash._COMPILED.clear()
+            reloaded = prevent_forbidden_bash.load_rules()
+            if (
+                dry_run is None
+                and push and push["name"] == "git push"
+                and destroy and get_decision_and_reason(destroy, "") == ("ask", "Ask before destroying")
+                and len(cached) == 1
+                and reloaded == json.loads(cached[0].read_text())
+            ):
+                results.record_pass("prevent_bash_user_rules_and_cache")
+            else:
+                results.record_fail("prevent_bash_user_rules_and_cache", f"{dry_run} {push} {destroy} {cached}")
+
+
+def test_shell_lexer(results):
+    """Test the shell lexer behind prevent_forbidden_bash"""
+
+    # Test 1: commands hidden behind quotes, prefixes, substitutions and payloads
+    commands = {
+        'echo "a; find ."': None,
+        "echo 'x | grep y' > out.txt": None,
+        "sudo -u root git push": "git push",
+        "FOO=1 env -i BAR=2 command git push origin": "git push",
+        'echo "$(git push)"': "git push",
+        "echo ${x:-$(git push)}": "git push",
+        'echo "${x:-`find .`}"': "find",
+        "echo ${x:-git push}": None,
+        "echo `find .`": "find",
+        "bash -lc 'cd src && git clean -fdx'": "git clean",
+        "bash -c -- 'git push --force origin main'": "git push",
+        "sh -ec -- 'git push'": "git push",
+        "bash -e -o pipefail -c 'find .'": "find",
+        "bash -- script.sh -c 'git push'": None,
+        "eval 'kubectl delete pod web-0'": "kubectl delete",
+        "cat <<EOF\nfind .\ngit push\nEOF\nls": None,
+        "cat <<EOF\n$(git push)\nEOF": "git push",
+        "cat <<'EOF'\n$(git push)\nEOF": None,
+        "make 2>&1 | grep error": None,
+        "ls | (grep x; find .)": "find",
+        "if true; then\n  git push\nfi": "git push",
+        "echo 'unterminated; git push": None,
+        'echo "unterminated" ; git push "main': "git push",
+        "ls # find . in comments is fine": None,
+        "command -v find": None,
+        "command -V git push": None,
+        "command -p find .": "find",
+    }
+    matched = {}
+    for command, expected in commands.items():
+        forbidden = check_forbidden_bash_commands("Bash", {"command": command})
+        matched[command] = forbidden and forbidden["name"]
+    if matched == commands:
+        results.record_pass("shell_lexer_screens_nested_commands")
+    else:
+        results.record_fail(
+            "shell_lexer_screens_nested_commands",
+            str({c: m for c, m in matched.items() if m != commands[c]}),
+        )
+
+    # Test 2: words are unquoted, redirections dropped, separators reported
+    got = list(shell_lexer.iter_commands("a 'b c'\\ d >out 2>&1 |& e \"$x\"y || f && g\nh & i ;; j"))
+    expected = [
+        {"words": ["a", "b c d"], "separator_before": None},
+        {"words": ["e", "$xy"], "separator_before": "|"},
+        {"words": ["f"], "separator_before": "||"},
+        {"words": ["g"], "separator_before": "&&"},
+        {"words": ["h"], "separator_before": ";"},
+        {"words": ["i"], "separator_before": "&"},
+        {"words": ["j"], "separator_before": ";"},
+    ]
+    if got == expected:
+        results.record_pass("shell_lexer_words_and_separators")
+    else:
+        results.record_fail("shell_lexer_words_and_separators", f"{got}")
+
+    # Test 3: fuzz - generated commands lex back to their words; random input never raises
+    import random
+
+    rng = random.Random(25)
+    words = ["ls", "git", "push", "a b", "it's", 'say "hi"', "x;y", "p|q", "$HOME", "#", "(", "{x}"]
+    separators = ["|", "||", "&&", ";", "&", "\n"]
+    quoters = [
+        lambda w: "'" + w.replace("'", "'\\''") + "'",
+        lambda w: '"' + "".join("\\" + ch if ch in '"\\$`' else ch for ch in w) + '"',
+        lambda w: "".join("\\" + ch for ch in w),
+    ]
+    problems = []
+    for _ in range(500):
+        expected, parts = [], []
+        for i in range(rng.randint(1, 4)):
+            command = [rng.choice(words) for _ in range(rng.randint(1, 3))]
+            sep = rng.choice(separators) if i else None
+            expected.append({"words": command, "separator_before": ";" if sep == "\n" else sep})
+            parts.append((f" {sep} " if sep else "") + " ".join(rng.choice(quoters)(w) for w in command))
+        text = "".join(parts)
+        got = list(shell_lexer.iter_commands(text))
+        if got != expected:
+            problems.append((text, got))
+    alphabet = "ab ;|&()<>'\"\\`$#{}=\n\t-c"
+    for _ in range(2000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        try:
+            for command in shell_lexer.iter_commands(text):
+                assert command["words"] and all(isinstance(w, str) for w in command["words"])
+        except Exception as e:
+            problems.append((text, repr(e)))
+    if not problems:
+        results.record_pass("shell_lexer_fuzz")
+    else:
+        results.record_fail("shell_lexer_fuzz", f"{len(problems)} problems, first: {problems[0]}")
+
+    # Test 4: payloads are expanded once however many heredocs follow them (linear time)
+    unit = "bash -c 'echo 1'\n" + "cat <<EOF\n$(date)\nEOF\n" * 3
+    start = time.monotonic()
+    got = list(shell_lexer.iter_commands(unit * 500))
+    elapsed = time.monotonic() - start
+    if len(got) == 500 * 8 and sum(c["words"] == ["echo", "1"] for c in got) == 500 and elapsed < 2.0:
+        results.record_pass("shell_lexer_heredocs_linear")
+    else:
+        results.record_fail("shell_lexer_heredocs_linear", f"{len(got)} commands in {elapsed:.2f}s")
+
+
+def test_transcript_checkpoint(results):
+    """Test incremental transcript scanning resumes from the byte-offset checkpoint"""
+
+    def fold(state, raw, line_number):
+        state.append([line_number, json.loads(raw)["n"]])
+        return state
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with patched_env(XDG_CACHE_HOME=tmpdir):
+            transcript = Path(tmpdir) / "transcript.jsonl"
+            transcript.write_text("".join(json.dumps({"n": i}) + "\n" for i in range(3)))
+            scan_transcript(str(transcript), "test-v1", list, fold)
+
+            # Appended lines are folded onto the cached state without re-reading the head
+            folded = []
+
+            def counting_fold(state, raw, line_number):
+                folded.append(line_number)
+                return fold(state, raw, line_number)
+
+            with open(transcript, "a") as f:
+                f.write(json.dumps({"n": 3}) + "\n" + json.dumps({"n": 4}) + "\n")
+            state = scan_transcript(str(transcript), "test-v1", list, counting_fold)
+            if folded == [4, 5] and [n for _, n in state] == [0, 1, 2, 3, 4]:
+                results.record_pass("transcript_checkpoint_resumes")
+            else:
+                results.record_fail("transcript_checkpoint_resumes", f"folded={folded} state={state}")
+
+            # A partial trailing line is returned but not checkpointed
+            with open(transcript, "a") as f:
+                f.write('{"n": 5}')
+            state = scan_transcript(str(transcript), "test-v1", list, fold)
+            with open(transcript, "a") as f:
+                f.write("\n")
+            state_after = scan_transcript(str(transcript), "test-v1", list, fold)
+            if [n for _, n in state] == list(range(6)) and [n for _, n in state_after] == list(range(6)):
+                results.record_pass("transcript_checkpoint_partial_line")
+            else:
+                results.record_fail("transcript_checkpoint_partial_line", f"{state} / {state_after}")
+
+            # Truncation (file rewritten smaller) falls back to a full rescan
+            transcript.write_text(json.dumps({"n": 9}) + "\n")
+            state = scan_transcript(str(transcript), "test-v1", list, fold)
+            if state == [[1, 9]]:
+                results.record_pass("transcript_checkpoint_truncation_rescans")
+            else:
+                results.record_fail("transcript_checkpoint_truncation_rescans", f"Got {state}")
+
+            # Rotation (new inode at the same path) falls back to a full rescan
+            transcript.unlink()
+            transcript.write_text("".join(json.dumps({"n": i}) + "\n" for i in range(10, 13)))
+            state = scan_transcript(str(transcript), "test-v1", list, fold)
+            if [n for _, n in state] == [10, 11, 12]:
+                results.record_pass("transcript_checkpoint_rotation_rescans")
+            else:
+                results.record_fail("transcript_checkpoint_rotation_rescans", f"Got {state}")
+
+
+def test_transcript_parser(results):
+    """Test the shared transcript parser fills every subscribed field in one pass"""
+    entries = [
+        {"type": "file-history-snapshot", "snapshot": {}},
+        {"type": "user", "message": {"role": "user", "content": "Refactor the parser"}},
+        {
+            "type": "assistant",
+            "timestamp": "2025-01-01T00:00:01Z",
+            "message": {
+                "role": "assistant",
+                "content": [
+                    {"type": "text", "text": "Running tests"},
+                    {"type": "tool_use", "name": "Bash", "input": {"command": "make test"}},
+                ],
+                "usage": {"input_tokens": 10, "output_tokens": 5, "cache_read_input_tokens": 100},
+            },
+        },
+        {
+            "type": "user",
+            "message": {"role": "user", "content": [{"type": "tool_result", "content": "ok"}]},
+            "toolUseResult": {"newTodos": [{"content": "ship it", "status": "pending"}]},
+        },
+    ]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with patched_env(XDG_CACHE_HOME=tmpdir):
+            transcript = Path(tmpdir) / "transcript.jsonl"
+            transcript.write_text("".join(json.dumps(e) + "\n" for e in entries))
+
+            data = parse_transcript(str(transcript), FIELDS)
+            expected_messages = [
+                ("user", "Refactor the parser", 2),
+                ("tool_call", "[Bash] make test", 3),
+                ("agent", "Running tests", 3),
+            ]
+            if (
+                data["messages"] == expected_messages
+                and [m["content"] for m in data["handoff_messages"]]
+                == ["Refactor the parser", "Running tests [+1 tool call(s)]"]
+                and data["todos"] == [{"content": "ship it", "status": "pending"}]
+                and data["usage"]["cached_tokens"] == 100
+                and data["usage"]["latest_usage"]["input_tokens"] == 10
+                and data["offset"] == transcript.stat().st_size
+                and data["line"] == 4
+            ):
+                results.record_pass("transcript_parser_single_pass_fields")
+            else:
+                results.record_fail("transcript_parser_single_pass_fields", f"Got {data}")
+
+            # Callers subscribing to the same fields share one checkpoint
+            for path in cache_dir().glob("*.json"):
+                path.unlink()
+            first = parse_transcript(str(transcript), ["messages"])
+            second = parse_transcript(str(transcript), ("messages", "messages"))
+            checkpoints = list(cache_dir().glob("*.json"))
+            if len(checkpoints) == 1 and first == second and first["messages"] == expected_messages:
+                results.record_pass("transcript_parser_shared_checkpoint")
+            else:
+                results.record_fail("transcript_parser_shared_checkpoint", f"{checkpoints} {first} {second}")
+
+            # The raw-byte prefilter must not change any field, including on
+            # lines that only look skippable (escaped markers, tool_use input
+            # JSON, non-compact JSON)
+            tricky = [
+                {"type": "user", "message": {"role": "user", "content": 'quote "type":"tool_result" here'}},
+                {"type": "user", "isMeta": True, "message": {"role": "user", "content": "meta note"}},
+                {
+                    "type": "assistant",
+                    "message": {
+                        "role": "assistant",
+                        "content": [
+                            {"type": "text", "text": "Writing fixture"},
+                            {"type": "tool_use", "name": "Write", "input": {"blocks": [{"type": "tool_result"}]}},
+                        ],
+                    },
+                },
+                {"type": "progress", "data": {"message": {"usage": {"input_tokens": 1}}}},
+            ]
+            with open(transcript, "a") as f:
+                f.write("".join(json.dumps(e, separators=(",", ":")) + "\n" for e in tricky))
+                f.write(json.dumps({"type": "user", "message": {"role": "user", "content": "spaced"}}) + "\n")
+            # Real-shaped corpus: escaped quotes, nested tool_use/tool_result,
+            # sidechain and meta lines, \u-escaped keys and values
+            demo = Path(__file__).parent / "demo-transcript.jsonl"
+            corpus = Path(__file__).parent / "transcript-corpus.jsonl"
+            mismatches = [
+                (path.name, field)
+                for path in (transcript, demo, corpus)
+                for field in FIELDS
+                if parse_transcript(str(path), (field,)) != parse_transcript(str(path), (field,), prefilter=False)
+            ]
+            escaped = parse_transcript(str(corpus), FIELDS)
+            if not (
+                ("user", "escaped type value", 22) in escaped["messages"]
+                and escaped["todos"] == [{"content": "escaped todos", "status": "pending"}]
+                and escaped["usage"]["latest_usage"] == {"input_tokens": 5, "output_tokens": 6}
+            ):
+                mismatches.append(("transcript-corpus.jsonl", "escaped entries missing"))
+            if not mismatches:
+                results.record_pass("transcript_parser_prefilter_equivalent")
+            else:
+                results.record_fail("transcript_parser_prefilter_equivalent", f"Differs for {mismatches}")
+
+            # The tail reader returns the same recent messages/todos reading backwards,
+            # including lines longer than one block
+            lines = [line for line in transcript.read_bytes().split(b"\n") if line]
+            reversed_lines = list(iter_lines_reverse(str(transcript), block_size=16))
+            tail = read_tail(str(transcript), ("handoff_messages", "todos"), 2)
+            full = parse_transcript(str(transcript), ("handoff_messages", "todos"))
+            if (
+                reversed_lines == lines[::-1]
+                and tail["handoff_messages"] == full["handoff_messages"][-2:]
+                and tail["todos"] == full["todos"]
+            ):
+                results.record_pass("transcript_tail_reader")
+            else:
+                results.record_fail("transcript_tail_reader", f"Got {tail}")
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible /chat/completions stub; see start_stub_llm()"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.requests.append(body)
+            server.peers.add(self.client_address)
+        time.sleep(server.delay)
+        roles = {m["role"]: m["content"] for m in body["messages"]}
+        content = server.reply(roles.get("system", ""), roles["user"])
+        data = json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        if server.drop_idle:
+            self.close_connection = True  # Without "Connection: close", like an idle timeout
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_llm(reply=lambda system, prompt: "Title: Stub summary", delay=0.0):
+    """Serve StubLLMHandler on a free port; returns (server, base URL)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubLLMHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests, server.peers = [], set()
+    server.reply, server.delay, server.drop_idle = reply, delay, False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+@contextmanager
+def patched_env(**values):
+    """Set environment variables for a block, then restore (or unset) them"""
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def run_hook(script, input_data, env=None, args=()):
+    """Run a hook script as Claude would: JSON on stdin, capture stdout/exit code"""
+    return subprocess.run(
+        [sys.executable, str(HOOKS_DIR / script), *args],
+        input=json.dumps(input_data),
+        capture_output=True,
+        text=True,
+        timeout=30,
+        env={**os.environ, **(env or {})},
+    )
+
+
+def test_user_prompt_dispatch(results):
+    """Test the UserPromptSubmit dispatcher routes slash commands in-process"""
+
+    # Test 1: routing table
+    routes = {
+        "/handoff note": "handoff_interceptor",
+        "/sync": "sync_interceptor",
+        "/pickup foo.md": "pickup_hook",
+        "please /sync later": None,
+        "fix the bug": None,
+    }
+    wrong = {p: route_prompt(p) for p, m in routes.items() if route_prompt(p) != m}
+    if not wrong:
+        results.record_pass("dispatch_routes_commands")
+    else:
+        results.record_fail("dispatch_routes_commands", f"Wrong routes: {wrong}")
+
+    # Test 2: ordinary prompts pass through silently without importing any handler
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, json; sys.path.insert(0, sys.argv[1]); import user_prompt_dispatch as d; "
+            "code = d.dispatch({'prompt': 'fix the bug'}); "
+            "print(json.dumps([code, [m for m in d.PROMPT_HANDLERS.values() if m in sys.modules]]))",
+            str(HOOKS_DIR),
+        ],
+        capture_output=True,
+        text=True,
+        timeout=30,
+    )
+    if proc.returncode == 0 and json.loads(proc.stdout) == [0, []]:
+        results.record_pass("dispatch_passes_through_plain_prompts")
+    else:
+        results.record_fail("dispatch_passes_through_plain_prompts", f"{proc.stdout} {proc.stderr}")
+
+    # Test 3: /pickup is handled by pickup_hook through the dispatcher
+    with tempfile.TemporaryDirectory() as tmpdir:
+        handoffs_dir = Path(tmpdir) / ".claude" / "handoffs"
+        handoffs_dir.mkdir(parents=True)
+        (handoffs_dir / "demo-handoff.md").write_text("# Handoff: demo\n")
+        proc = run_hook(
+            "user_prompt_dispatch.py",
+            {"prompt": "/pickup", "cwd": tmpdir},
+            env={"CLAUDE_PROJECT_DIR": tmpdir},
+        )
+        try:
+            context = json.loads(proc.stdout)["hookSpecificOutput"]["additionalContext"]
+        except (ValueError, KeyError):
+            context = ""
+        if proc.returncode == 0 and "demo-handoff.md" in context:
+            results.record_pass("dispatch_runs_pickup_handler")
+        else:
+            results.record_fail("dispatch_runs_pickup_handler", f"{proc.returncode} {proc.stdout} {proc.stderr}")
+
+
+def test_session_sync(results):
+    """Test /sync and SessionEnd append only the messages after their shared watermark"""
+
+    def user_line(text):
+        return json.dumps({"type": "user", "message": {"role": "user", "content": text}}) + "\n"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        transcript = Path(tmpdir) / "transcript.jsonl"
+        transcript.write_text(user_line("first question") + user_line("second question"))
+        sync_input = {
+            "prompt": "/sync",
+            "transcript_path": str(transcript),
+            "session_id": "sync-test",
+            "cwd": tmpdir,
+        }
+        env = {"XDG_CACHE_HOME": tmpdir}
+        sessions_dir = Path(tmpdir) / ".claude" / "sessions"
+
+        run_hook("user_prompt_dispatch.py", sync_input, env=env)
+        with open(transcript, "a") as f:
+            f.write(user_line("third question"))
+        result = run_hook("user_prompt_dispatch.py", sync_input, env=env)
+        files = list(sessions_dir.glob("*-ID_sync-test.md"))
+        expected = "\n".join(
+            f"<user>\n{q} question\n</user>\n" for q in ("first", "second", "third")
+        )
+        reason = json.loads(result.stdout or "{}").get("reason", "")
+
+        # Test 1: the second sync appended just the new message
+        if len(files) == 1 and files[0].read_text() == expected and "3 (1 new)" in reason:
+            results.record_pass("sync_appends_since_watermark")
+        else:
+            results.record_fail("sync_appends_since_watermark", f"{files} {reason!r}")
+            return
+
+        # Test 2: a session file changed behind our back is rewritten in full
+        files[0].write_text("edited")
+        run_hook("user_prompt_dispatch.py", sync_input, env=env)
+        if files[0].read_text() == expected:
+            results.record_pass("sync_rewrites_on_stale_watermark")
+        else:
+            results.record_fail("sync_rewrites_on_stale_watermark", repr(files[0].read_text()))
+
+        # Test 3: SessionEnd shares the watermark, so neither it nor a repeat duplicates messages
+        with open(transcript, "a") as f:
+            f.write(user_line("fourth question"))
+        session_end = {
+            "hook_event_name": "SessionEnd",
+            "transcript_path": str(transcript),
+            "session_id": "sync-test",
+            "cwd": tmpdir,
+            "reason": "other",
+        }
+        run_hook("session_save.py", session_end, env=env)
+        run_hook("session_save.py", session_end, env=env)
+        expected += "\n<user>\nfourth question\n</user>\n"
+        if list(sessions_dir.glob("*-ID_sync-test.md")) == files and files[0].read_text() == expected:
+            results.record_pass("session_end_shares_sync_watermark")
+        else:
+            results.record_fail("session_end_shares_sync_watermark", repr(files[0].read_text()))
+
+        # Test 4: lookups go through the manifest; the glob only recovers a lost entry
+        import session_store
+
+        entry = session_store.load_manifest(tmpdir, "sync-test")
+        decoy = sessions_dir / "00000000-000000-session-decoy-ID_sync-test.md"
+        decoy.write_text("decoy")
+        via_manifest = session_store.find_session_file(tmpdir, "sync-test")
+        session_store.manifest_path(tmpdir, "sync-test").unlink()
+        decoy.unlink()
+        recovered = session_store.find_session_file(tmpdir, "sync-test")
+        if entry.get("file") == files[0].name and via_manifest == files[0] and recovered == files[0]:
+            results.record_pass("session_manifest_lookup")
+        else:
+            results.record_fail("session_manifest_lookup", f"{entry} {via_manifest} {recovered}")
+
+        # Test 5: a full rewrite that fails midway leaves the previous export intact
+        format_messages = session_store.format_messages
+        session_store.format_messages = lambda messages: None  # f.write(None) raises
+        try:
+            failed = session_store.export_session(tmpdir, "sync-test", str(transcript))
+        finally:
+            session_store.format_messages = format_messages
+        leftovers = [p.name for p in sessions_dir.iterdir() if p.name.endswith(".tmp")]
+        if failed is None and files[0].read_text() == expected and not leftovers:
+            results.record_pass("sync_rewrite_is_atomic")
+        else:
+            results.record_fail("sync_rewrite_is_atomic", f"{failed} {files[0].read_text()!r} {leftovers}")
+
+
+def test_summary_queue(results):
+    """Test SessionEnd queues the summary and SessionStart waits for the worker"""
+    import summary_queue
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Stand-in for aichat: slow enough that SessionEnd would notice waiting on it
+        bin_dir = Path(tmpdir) / "bin"
+        bin_dir.mkdir()
+        fake_aichat = bin_dir / "aichat"
+        fake_aichat.write_text("#!/bin/sh\ncat > /dev/null\nsleep 1\necho 'Fixed the **flaky** test'\n")
+        fake_aichat.chmod(0o755)
+        env = {"XDG_CACHE_HOME": tmpdir, "PATH": f"{bin_dir}:{os.environ['PATH']}"}
+
+        transcript = Path(tmpdir) / "transcript.jsonl"
+        transcript.write_text(
+            json.dumps({"type": "user", "message": {"role": "user", "content": "fix the flaky test"}}) + "\n"
+        )
+        session_end = {
+            "hook_event_name": "SessionEnd",
+            "transcript_path": str(transcript),
+            "session_id": "queue-test",
+            "cwd": tmpdir,
+            "reason": "clear",
+        }
+
+        # Test 1: SessionEnd returns before the summarizer finishes
+        start = time.monotonic()
+        run_hook("session_save.py", session_end, env=env)
+        elapsed = time.monotonic() - start
+        if elapsed < 1.0 and summary_queue.pending_jobs(tmpdir):
+            results.record_pass("summary_queue_session_end_returns_immediately")
+        else:
+            results.record_fail("summary_queue_session_end_returns_immediately", f"{elapsed:.2f}s")
+
+        # Test 2: SessionStart waits for the in-flight job and injects its summary
+        proc = run_hook("session_summary.py", {"source": "clear", "cwd": tmpdir}, env=env)
+        context = json.loads(proc.stdout or "{}").get("hookSpecificOutput", {}).get("additionalContext", "")
+        if "Fixed the flaky test" in context and not summary_queue.pending_jobs(tmpdir):
+            results.record_pass("summary_queue_start_waits_for_job")
+        else:
+            results.record_fail("summary_queue_start_waits_for_job", f"{proc.stdout} {proc.stderr}")
+
+        # Test 3: failures back off exponentially, then the job is parked in failed/
+        job_path = summary_queue.enqueue(tmpdir, {"session_id": "retry-test", "messages": []})
+        delays = []
+        for _ in range(summary_queue.MAX_ATTEMPTS):
+            delays.append(summary_queue.process_due_jobs(tmpdir, lambda job: False))
+            if job_path.exists():
+                job = json.loads(job_path.read_text())
+                job["next_attempt"] = 0  # skip the wait
+                job_path.write_text(json.dumps(job))
+        failed = job_path.parent / "failed" / job_path.name
+        expected = [summary_queue.backoff(n) for n in range(1, summary_queue.MAX_ATTEMPTS)] + [None]
+        if failed.exists() and [round(d) if d else d for d in delays] == expected:
+            results.record_pass("summary_queue_retries_with_backoff")
+        else:
+            results.record_fail("summary_queue_retries_with_backoff", f"{delays} {failed.exists()}")
+
+
+def test_rolling_summary(results):
+    """Test the opt-in rolling summary folds in the background and feeds /handoff"""
+    import rolling_summary
+    import storage
+
+    def user_line(text):
+        return json.dumps({"type": "user", "message": {"role": "user", "content": text}}) + "\n"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Stand-in for aichat: only the rolling role may be called
+        bin_dir = Path(tmpdir) / "bin"
+        bin_dir.mkdir()
+        fake_aichat = bin_dir / "aichat"
+        calls_log = Path(tmpdir) / "calls.log"
+        fake_aichat.write_text(
+            f'#!/bin/sh\n[ "$2" = rolling-summary ] || exit 1\ncat >> {calls_log}\necho "<<call>>" >> {calls_log}\n'
+            "printf 'Title: Rolling demo\\n\\n1. **Overview**: folded\\n'\n"
+        )
+        fake_aichat.chmod(0o755)
+        env = {
+            "XDG_CACHE_HOME": tmpdir,
+            "PATH": f"{bin_dir}:{os.environ['PATH']}",
+            "CLAUDE_HOOKS_ROLLING_SUMMARY": "1",
+        }
+
+        transcript = Path(tmpdir) / "transcript.jsonl"
+        lines = [user_line(f"please refactor module {i}: " + "detail " * 60) for i in range(80)]
+        transcript.write_text("".join(lines))
+        prompt_input = {
+            "prompt": "carry on",
+            "transcript_path": str(transcript),
+            "session_id": "rolling-test",
+            "cwd": tmpdir,
+        }
+
+        # Test 1: an ordinary prompt past the growth threshold starts a background fold,
+        # which catches up on all 80 turns in batches of MAX_BATCH_MESSAGES
+        run_hook("user_prompt_dispatch.py", prompt_input, env=env)
+        state_file = rolling_summary.state_path(tmpdir, "rolling-test")
+        deadline = time.monotonic() + 15
+        state = {}
+        while state.get("offset") != transcript.stat().st_size and time.monotonic() < deadline:
+            time.sleep(0.1)
+            state = storage.read_json(state_file, {})
+        calls = calls_log.read_text().split("<<call>>\n")[:-1] if calls_log.exists() else []
+        if (
+            state.get("offset") == transcript.stat().st_size
+            and state.get("summary", "").startswith("Title: Rolling demo")
+            and len(calls) == 3
+            and "module 0:" in calls[0] and "module 30:" in calls[1] and "module 79:" in calls[2]
+        ):
+            results.record_pass("rolling_summary_folds_in_background")
+        else:
+            results.record_fail("rolling_summary_folds_in_background", f"{state} {len(calls)} calls")
+            return
+
+        # Test 2: /handoff combines the stored summary with the newer turns, no LLM call
+        with open(transcript, "a") as f:
+            f.write(user_line("can you also update the changelog?"))
+        proc = run_hook("user_prompt_dispatch.py", {**prompt_input, "prompt": "/handoff"}, env=env)
+        handoffs = list((Path(tmpdir) / ".claude" / "handoffs").glob("rolling-demo-*.md"))
+        text = handoffs[0].read_text() if handoffs else ""
+        if "**Overview**: folded" in text and "Since Last Summary" in text and "update the changelog" in text:
+            results.record_pass("rolling_summary_feeds_handoff")
+        else:
+            results.record_fail("rolling_summary_feeds_handoff", f"{proc.stdout} {proc.stderr} {text[:200]}")
+
+
+def test_summary_cache(results):
+    """Test the content-addressed summary cache and that hits skip aichat"""
+    import summary_cache
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with patched_env(XDG_CACHE_HOME=tmpdir):
+            # Test 1: exact (role, prompt) hits; another role misses; counters add up
+            miss = summary_cache.get("handoff-summary", "prompt")
+            summary_cache.put("handoff-summary", "prompt", "cached summary")
+            hit = summary_cache.get("handoff-summary", "prompt")
+            other_role = summary_cache.get("session-summary", "prompt")
+            stats = summary_cache.stats()
+            if (miss, hit, other_role) == (None, "cached summary", None) and stats["hits"] == 1 and stats["misses"] == 2:
+                results.record_pass("summary_cache_hits_and_counters")
+            else:
+                results.record_fail("summary_cache_hits_and_counters", f"{miss} {hit} {other_role} {stats}")
+
+            # Test 2: least recently used entries go first; expired entries always go
+            for i in range(3):
+                summary_cache.put("r", f"p{i}", "x" * 1000)
+                os.utime(summary_cache.entry_path("r", f"p{i}"), (1000 + i, time.time() - 100 + i))
+            summary_cache.get("r", "p0")  # p0 becomes most recently used
+            expired = summary_cache.entry_path("handoff-summary", "prompt")
+            os.utime(expired, (0, time.time() - summary_cache.TTL_DAYS * 86400 - 1))
+            summary_cache.evict(max_bytes=2500)
+            kept = [summary_cache.entry_path("r", f"p{i}").exists() for i in range(3)]
+            if kept == [True, False, True] and not expired.exists():
+                results.record_pass("summary_cache_lru_and_ttl_eviction")
+            else:
+                results.record_fail("summary_cache_lru_and_ttl_eviction", f"{kept} {expired.exists()}")
+
+        # Test 3: a repeated /handoff with no new turns does not run aichat again
+        bin_dir = Path(tmpdir) / "bin"
+        bin_dir.mkdir()
+        calls = Path(tmpdir) / "aichat-calls"
+        fake_aichat = bin_dir / "aichat"
+        fake_aichat.write_text(f"#!/bin/sh\ncat > /dev/null\necho call >> {calls}\necho 'Title: Cached demo'\n")
+        fake_aichat.chmod(0o755)
+        env = {"XDG_CACHE_HOME": tmpdir, "PATH": f"{bin_dir}:{os.environ['PATH']}"}
+        transcript = Path(tmpdir) / "transcript.jsonl"
+        transcript.write_text(
+            json.dumps({"type": "user", "message": {"role": "user", "content": "can you fix the cache?"}}) + "\n"
+        )
+        handoff = {"prompt": "/handoff", "transcript_path": str(transcript), "session_id": "cache-test", "cwd": tmpdir}
+        run_hook("user_prompt_dispatch.py", handoff, env=env)
+        proc = run_hook("user_prompt_dispatch.py", handoff, env=env)
+        n_calls = len(calls.read_text().splitlines()) if calls.exists() else 0
+        if n_calls == 1 and "Handoff Created" in proc.stdout:
+            results.record_pass("summary_cache_skips_aichat")
+        else:
+            results.record_fail("summary_cache_skips_aichat", f"{n_calls} calls, {proc.stdout} {proc.stderr}")
+
+
+def test_phrase_classifier(results):
+    """Test the compiled phrase classifier behind the handoff heuristics"""
+    import phrase_classifier
+    from handoff_interceptor import classify_message
+
+    # Test 1: one scan reports phrases hidden inside or overlapping a longer match
+    classifier = phrase_classifier.PhraseClassifier(
+        {"filler": ["i'll", "now i'll"], "meta": ["i'll check"], "decision": ["overview of"], "topic": ["overview"]}
+    )
+    found = classifier.classify("now i'll check the overview of the flake")
+    labels = classify_message("Now I'll check the logs for the failing overlay build on darwin.", "assistant")
+    if found == {"filler": 2, "meta": 1, "decision": 1, "topic": 1} and labels == {"chatter"}:
+        results.record_pass("phrase_classifier_reports_overlapping_phrases")
+    else:
+        results.record_fail("phrase_classifier_reports_overlapping_phrases", f"{found} {labels}")
+
+    # Test 2: phrases from the user's config file extend the defaults, picked up on change
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with patched_env(XDG_CONFIG_HOME=tmpdir):
+            text = "Shipping the overlay tonight."
+            before = classify_message(text, "assistant")
+            user_file = phrase_classifier.user_phrases_file()
+            user_file.parent.mkdir(parents=True)
+            user_file.write_text(json.dumps({"decision": ["shipping"]}))
+            after = classify_message(text, "assistant")
+            default_kept = classify_message("We decided to keep it.", "assistant")
+            if before == set() and after == {"decision"} and default_kept == {"decision"}:
+                results.record_pass("phrase_classifier_loads_user_phrases")
+            else:
+                results.record_fail("phrase_classifier_loads_user_phrases", f"{before} {after} {default_kept}")
+
+
+def test_handoff_selection(results):
+    """Test budgeted message selection in filter_messages_for_handoff"""
+    from handoff_interceptor import estimate_tokens, filter_messages_for_handoff
+
+    def filler(i):
+        return {"role": "assistant", "content": f"Output of step {i}: " + "z" * 380}
+
+    messages = [{"role": "user", "content": "Please migrate the build to nix flakes"}]
+    messages += [filler(i) for i in range(1, 200)]
+    protected = [
+        {"role": "assistant", "content": "We decided to keep the overlay for darwin."},
+        {"role": "user", "content": "Does the cache still work?"},
+        {"role": "assistant", "content": "Summary so far: inputs pinned, overlay kept."},
+    ]
+    for offset, msg in zip((10, 60, 120), protected):
+        messages[offset] = msg
+
+    # Test 1: over budget, protected messages and the recent tail are kept, in order, within budget
+    budget, tail = 1000, 4
+    selected = filter_messages_for_handoff(messages, budget, recent_protect_count=tail)
+    positions = [messages.index(m) for m in selected]
+    head_tokens = sum(estimate_tokens(m["content"]) for m in selected[:-tail])
+    if (
+        all(m in selected for m in [messages[0], *protected])
+        and selected[-tail:] == messages[-tail:]
+        and positions == sorted(positions)
+        and head_tokens <= budget - sum(estimate_tokens(m["content"]) for m in messages[-tail:])
+    ):
+        results.record_pass("handoff_selection_keeps_protected")
+    else:
+        results.record_fail("handoff_selection_keeps_protected", f"{positions} {head_tokens} tokens")
+
+    # Test 2: leftover budget goes to the most recent unprotected messages
+    unprotected = [m for m in selected[:-tail] if m["content"].startswith("Output of step")]
+    steps = [int(m["content"].split()[3].rstrip(":")) for m in unprotected]
+    if unprotected and steps == list(range(200 - tail - len(steps), 200 - tail)):
+        results.record_pass("handoff_selection_prefers_recent")
+    else:
+        results.record_fail("handoff_selection_prefers_recent", f"{steps}")
+
+
+def test_relevance_ranking(results):
+    """Test opt-in BM25 ranking of handoff messages"""
+    import relevance
+    from handoff_interceptor import estimate_tokens, filter_messages_for_handoff
+
+    messages = [{"role": "user", "content": "Please migrate the darwin host to the new flake layout"}]
+    messages += [{"role": "assistant", "content": f"Build log {i:02}: " + "z" * 380} for i in range(40)]
+    on_topic_text = "The darwin host config imports the overlay from the flake layout "
+    messages[5] = {"role": "assistant", "content": on_topic_text + "z" * (len(messages[6]["content"]) - len(on_topic_text))}
+    todos = [{"content": "Move overlay into flake layout", "status": "pending"}]
+
+    # Test 1: the message about the intent and todos ranks first; unrelated output scores 0
+    scores = relevance.rank(messages, todos)
+    on_topic = max(range(1, len(messages)), key=lambda i: scores[i]) if scores else None
+    if on_topic == 5 and scores[5] == 1.0 and all(scores[i] == 0 for i in range(6, len(messages))):
+        results.record_pass("relevance_ranks_intent_and_todos")
+    else:
+        results.record_fail("relevance_ranks_intent_and_todos", f"{on_topic} {scores and scores[:8]}")
+
+    # Test 2: with room for one more turn, relevance picks the older on-topic one over recent output
+    tail = 2
+    budget = sum(estimate_tokens(m["content"]) for m in [messages[0], messages[5], *messages[-tail:]])
+    plain = filter_messages_for_handoff(messages, budget, recent_protect_count=tail)
+    ranked = filter_messages_for_handoff(messages, budget, recent_protect_count=tail, relevance_scores=scores)
+    if messages[5] in ranked and messages[5] not in plain:
+        results.record_pass("relevance_keeps_on_topic_turns")
+    else:
+        results.record_fail("relevance_keeps_on_topic_turns", f"{[messages.index(m) for m in ranked]}")
+
+    # Test 3: terms match whole tokens only, and length is counted in tokens
+    scores = relevance.bm25_scores(["the prefix of unix", "fix nix", "fix nix " + "word " * 20], ["fix", "nix"])
+    if scores[0] == 0 and scores[1] > scores[2] > 0:
+        results.record_pass("relevance_matches_whole_tokens")
+    else:
+        results.record_fail("relevance_matches_whole_tokens", f"{scores}")
+
+
+def test_chunked_handoff(results):
+    """Test map-reduce handoff summaries for sessions longer than the tail"""
+    from handoff_interceptor import CHUNK_TOKENS, MAX_MESSAGES, chunk_conversation, estimate_tokens
+
+    # Test 1: chunks keep every message in order, fit the budget and stay put as the session grows
+    messages = [{"role": "user", "content": f"please handle step {i} " + "x" * (i * 37 % 900)} for i in range(200)]
+    chunks = chunk_conversation(messages)
+    grown = chunk_conversation(messages + messages[:20])
+    flat = [m for chunk in chunks for m in chunk]
+    if (
+        flat == messages
+        and all(sum(estimate_tokens(m["content"]) for m in chunk) <= CHUNK_TOKENS for chunk in chunks)
+        and grown[: len(chunks) - 1] == chunks[:-1]
+    ):
+        results.record_pass("handoff_chunks_stable_and_bounded")
+    else:
+        results.record_fail("handoff_chunks_stable_and_bounded", f"{len(chunks)} chunks, {len(flat)} messages")
+
+    # Test 2: /handoff summarizes the older history concurrently and reduces it with the tail
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bin_dir = Path(tmpdir) / "bin"
+        bin_dir.mkdir()
+        fake_aichat = bin_dir / "aichat"
+        fake_aichat.write_text(
+            "#!/bin/sh\ninput=$(cat)\n"
+            'if [ "$2" = handoff-chunk-summary ]; then sleep 1; echo "chunk notes"; exit 0; fi\n'
+            'echo "Title: Long session"\necho "$input" | grep -c "^## Part"\n'
+        )
+        fake_aichat.chmod(0o755)
+        env = {"XDG_CACHE_HOME": tmpdir, "PATH": f"{bin_dir}:{os.environ['PATH']}"}
+        transcript = Path(tmpdir) / "transcript.jsonl"
+        n_history = 60
+        transcript.write_text(
+            "".join(
+                json.dumps({"type": "user", "message": {"role": "user", "content": f"please do task {i} " + "y" * 400}})
+                + "\n"
+                for i in range(n_history + MAX_MESSAGES)
+            )
+        )
+        handoff = {"prompt": "/handoff", "transcript_path": str(transcript), "session_id": "long", "cwd": tmpdir}
+        start = time.monotonic()
+        proc = run_hook("user_prompt_dispatch.py", handoff, env=env)
+        elapsed = time.monotonic() - start
+        files = list((Path(tmpdir) / ".claude" / "handoffs").glob("long-session-*.md"))
+        text = files[0].read_text() if files else ""
+        history_chunks = len(chunk_conversation(
+            [{"role": "user", "content": f"please do task {i} " + "y" * 400} for i in range(n_history)]
+        ))
+        # All chunks summarized in one round of 1s calls, not one after another
+        if f"Title: Long session\n{history_chunks}\n" in text and history_chunks > 1 and elapsed < history_chunks:
+            results.record_pass("handoff_map_reduce_long_session")
+        else:
+            results.record_fail("handoff_map_reduce_long_session", f"{elapsed:.1f}s {proc.stderr} {text[:200]!r}")
+
+
+def test_summarizer(results):
+    """Test the HTTP summarizer backend against a local stub server"""
+    import summarizer
+
+    server, url = start_stub_llm()
+    try:
+        # Test 1: sequential calls share one keep-alive connection; the role file is the system prompt
+        backend = summarizer.HttpSummarizer(url, model="stub-model")
+        replies = [backend.complete("handoff-summary", f"prompt {i}") for i in range(3)]
+        system_prompt, options = summarizer.load_role("handoff-summary")
+        first = server.requests[0]
+        if (
+            replies == ["Title: Stub summary"] * 3
+            and backend.connections_opened == 1
+            and len(server.peers) == 1
+            and system_prompt
+            and first["messages"] == [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": "prompt 0"},
+            ]
+            and first["model"] == "stub-model"
+            and first.get("temperature") == options.get("temperature")
+        ):
+            results.record_pass("summarizer_http_reuses_connection")
+        else:
+            results.record_fail(
+                "summarizer_http_reuses_connection", f"{replies} {backend.connections_opened} {first}"
+            )
+
+        # Test 2: a pooled connection the server closed meanwhile is retried on a fresh one
+        server.drop_idle = True
+        backend.complete("handoff-summary", "before close")
+        time.sleep(0.1)
+        try:
+            reply = backend.complete("handoff-summary", "after close")
+        except Exception as e:
+            reply = repr(e)
+        if reply == "Title: Stub summary" and backend.connections_opened == 2:
+            results.record_pass("summarizer_http_retries_closed_connection")
+        else:
+            results.record_fail("summarizer_http_retries_closed_connection", f"{reply} {backend.connections_opened}")
+        server.drop_idle = False
+
+        # Test 3: /handoff end to end through the HTTP backend, without aichat on PATH
+        with tempfile.TemporaryDirectory() as tmpdir:
+            transcript = Path(tmpdir) / "transcript.jsonl"
+            transcript.write_text(
+                json.dumps({"type": "user", "message": {"role": "user", "content": "summarize over http"}}) + "\n"
+            )
+            env = {
+                "XDG_CACHE_HOME": tmpdir,
+                "PATH": "/nonexistent",
+                "CLAUDE_HOOKS_SUMMARIZER": "http",
+                "CLAUDE_HOOKS_SUMMARIZER_URL": url,
+            }
+            handoff = {"prompt": "/handoff", "transcript_path": str(transcript), "session_id": "http", "cwd": tmpdir}
+            before = len(server.requests)
+            proc = run_hook("user_prompt_dispatch.py", handoff, env=env)
+            files = list((Path(tmpdir) / ".claude" / "handoffs").glob("stub-summary-*.md"))
+            text = files[0].read_text() if files else ""
+            if "Title: Stub summary" in text and len(server.requests) == before + 1:
+                results.record_pass("summarizer_http_handoff_end_to_end")
+            else:
+                results.record_fail("summarizer_http_handoff_end_to_end", f"{proc.stdout} {proc.stderr}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Test 4: a copy installed outside the repo (shallow path) still imports and loads roles
+    with tempfile.TemporaryDirectory() as tmpdir:
+        shutil.copy(HOOKS_DIR / "summarizer.py", tmpdir)
+        proc = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys; sys.path[:0] = sys.argv[1:3]; import summarizer; "
+                "print(summarizer.__file__, len(summarizer.role_dirs()), summarizer.load_role('no-such-role'))",
+                tmpdir,
+                str(HOOKS_DIR),
+            ],
+            capture_output=True,
+            text=True,
+            env={**os.environ, "HOME": tmpdir},
+        )
+        if proc.returncode == 0 and proc.stdout.startswith(tmpdir) and proc.stdout.rstrip().endswith("2 ('', {})"):
+            results.record_pass("summarizer_imports_outside_repo")
+        else:
+            results.record_fail("summarizer_imports_outside_repo", f"{proc.stdout} {proc.stderr}")
+
+
+def test_handoff_registry(results):
+    """Test the handoff registry lists pending handoffs and records pickups"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        handoffs_dir = Path(tmpdir) / ".claude" / "handoffs"
+        handoffs_dir.mkdir(parents=True)
+        for i, name in enumerate(("old.md", "picked.md", "new.md")):
+            path = handoffs_dir / name
+            path.write_text(f"# Handoff: {name}\n")
+            os.utime(path, (1000 + i, 1000 + i))
+        # Handled marks from the legacy metadata file are imported
+        (handoffs_dir / ".handled.json").write_text(json.dumps({"picked.md": "2025-01-01 00:00:00"}))
+        env = {"CLAUDE_PROJECT_DIR": tmpdir}
+        session_start = {"hook_event_name": "SessionStart", "source": "clear", "cwd": tmpdir}
+
+        # Test 1: newest pending handoff is suggested, legacy-handled one is not counted
+        proc = run_hook("session_start_handoff.py", session_start, env=env)
+        message = json.loads(proc.stdout or "{}").get("systemMessage", "")
+        if "`new.md`" in message and "(1 older handoff(s)" in message:
+            results.record_pass("handoff_registry_pending_newest_first")
+        else:
+            results.record_fail("handoff_registry_pending_newest_first", f"{proc.stdout} {proc.stderr}")
+
+        # Test 2: a pickup marks the handoff handled for later sessions
+        run_hook(
+            "post_pickup_handler.py",
+            {"tool_name": "SlashCommand", "tool_input": {"command": "/pickup new.md"}, "cwd": tmpdir},
+            env=env,
+        )
+        proc = run_hook("session_start_handoff.py", session_start, env=env)
+        message = json.loads(proc.stdout or "{}").get("systemMessage", "")
+        if "`old.md`" in message and "older handoff" not in message:
+            results.record_pass("handoff_registry_marks_pickup")
+        else:
+            results.record_fail("handoff_registry_marks_pickup", f"{proc.stdout} {proc.stderr}")
+
+
+STORAGE_WORKER = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import storage
+counter, journal, worker, rounds = sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5])
+max_wait = 0.0
+
+def bump(doc):
+    doc["count"] = doc.get("count", 0) + 1
+    return doc
+
+for i in range(rounds):
+    with storage.file_lock(counter) as waited:
+        max_wait = max(max_wait, waited)
+        doc = storage.read_json(counter, {})
+        storage.atomic_write_json(counter, bump(doc))
+    storage.update_json(counter + ".2", bump)
+    storage.append_line(journal, json.dumps({"worker": worker, "i": i, "pad": "x" * 2000}))
+print(max_wait)
+"""
+
+
+def test_storage(results):
+    """Test shared storage helpers under concurrent writers"""
+    workers, rounds = 8, 50
+    with tempfile.TemporaryDirectory() as tmpdir:
+        counter = os.path.join(tmpdir, "counter.json")
+        journal = os.path.join(tmpdir, "events.jsonl")
+        procs = [
+            subprocess.Popen(
+                [sys.executable, "-c", STORAGE_WORKER, str(HOOKS_DIR), counter, journal, str(w), str(rounds)],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+            for w in range(workers)
+        ]
+        outputs = [p.communicate(timeout=60) for p in procs]
+        errors = [err for p, (_, err) in zip(procs, outputs) if p.returncode != 0]
+        if errors:
+            results.record_fail("storage_concurrent_updates", errors[0][-300:])
+            return
+
+        # Test 1: locked read-modify-write loses no updates
+        counts = [json.loads(Path(path).read_text()).get("count") for path in (counter, counter + ".2")]
+        expected = workers * rounds
+        if counts == [expected, expected]:
+            results.record_pass("storage_concurrent_updates")
+        else:
+            results.record_fail("storage_concurrent_updates", f"{counts} != {expected}")
+
+        # Test 2: O_APPEND journal lines are never torn or lost
+        with open(journal) as f:
+            records = [json.loads(line) for line in f]
+        seen = {(r["worker"], r["i"]) for r in records}
+        if len(records) == expected and len(seen) == expected:
+            results.record_pass("storage_journal_appends_intact")
+        else:
+            results.record_fail("storage_journal_appends_intact", f"{len(records)} records, {len(seen)} unique")
+
+        # Test 3: lock waits stay bounded (short critical sections, polling back-off)
+        max_wait = max(float(out.strip()) for out, _ in outputs)
+        if max_wait < 2.0:
+            results.record_pass("storage_lock_wait_bounded")
+        else:
+            results.record_fail("storage_lock_wait_bounded", f"waited {max_wait:.2f}s")
+
+
+def test_event_journal(results):
+    """Test the rotating event journal and the legacy array migration"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_dir = Path(tmpdir) / ".claude" / "logs"
+
+        # Test 1: legacy session_start.json array is migrated once, ahead of new events
+        log_dir.mkdir(parents=True)
+        legacy = log_dir / "session_start.json"
+        legacy.write_text(json.dumps([{"timestamp": "2025-01-01T00:00:00", "n": 0}, {"n": 1}], indent=2))
+        migrated = journal.migrate_legacy_array(legacy, log_dir, "session_start")
+        journal.append_event(log_dir, "session_start", {"timestamp": "2026-01-01T00:00:00", "n": 2})
+        again = journal.migrate_legacy_array(legacy, log_dir, "session_start")
+        events = [e["n"] for e in journal.iter_events(log_dir, "session_start")]
+        if migrated and not again and not legacy.exists() and events == [0, 1, 2]:
+            results.record_pass("journal_migrates_legacy_array")
+        else:
+            results.record_fail("journal_migrates_legacy_array", f"{migrated} {again} {events}")
+
+        # Test 2: size rotation compresses segments, prunes old ones and keeps order
+        for i in range(200):
+            journal.append_event(log_dir, "pre_compact", {"i": i, "pad": "x" * 100}, max_bytes=2048)
+        segments = journal.rotated_segments(log_dir, "pre_compact")
+        events = [e["i"] for e in journal.iter_events(log_dir, "pre_compact")]
+        kept = len(events)
+        if (
+            len(segments) == journal.KEEP_SEGMENTS
+            and all(p.suffix == ".gz" for p in segments)
+            and events == list(range(200 - kept, 200))
+            and journal.active_segment(log_dir, "pre_compact").stat().st_size < 2048
+        ):
+            results.record_pass("journal_rotates_by_size")
+        else:
+            results.record_fail("journal_rotates_by_size", f"{len(segments)} segments, events {events[:3]}..")
+
+        # Test 3: a segment whose first event is too old is rotated on the next append
+        old = (datetime.now() - timedelta(days=journal.MAX_SEGMENT_AGE_DAYS + 1)).isoformat()
+        journal.append_event(log_dir, "aged", {"timestamp": old})
+        journal.append_event(log_dir, "aged", {"timestamp": datetime.now().isoformat()})
+        with open(journal.active_segment(log_dir, "aged")) as f:
+            active_lines = f.readlines()
+        if len(journal.rotated_segments(log_dir, "aged")) == 1 and len(active_lines) == 1:
+            results.record_pass("journal_rotates_by_age")
+        else:
+            results.record_fail("journal_rotates_by_age", f"{active_lines}")
+
+
+def test_repo_detection(results):
+    """Test native jj/git detection matches repo_check.sh priority"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        outer = Path(tmpdir) / "outer"
+        inner = outer / "inner" / "src"
+        inner.mkdir(parents=True)
+        (outer / "inner" / ".git").write_text("gitdir: elsewhere\n")  # worktree-style .git file
+
+        # Test 1: .git found from a subdirectory, no repo above it
+        git_type = find_repo_type(str(inner))
+        none_type = find_repo_type(tmpdir)
+        if git_type == "git" and none_type is None:
+            results.record_pass("repo_detect_git_and_none")
+        else:
+            results.record_fail("repo_detect_git_and_none", f"{git_type} {none_type}")
+
+        # Test 2: a .jj further up wins over the nearer .git; removing it is noticed
+        (outer / ".jj").mkdir()
+        jj_type = find_repo_type(str(inner))
+        shutil.rmtree(outer / ".jj")
+        back_type = find_repo_type(str(inner))
+        if jj_type == "jj" and back_type == "git":
+            results.record_pass("repo_detect_jj_priority_and_removal")
+        else:
+            results.record_fail("repo_detect_jj_priority_and_removal", f"{jj_type} {back_type}")
+
+
+def test_hook_daemon(results):
+    """Test hook_client.py against a live hook_daemon.py and its in-process fallback"""
+    find_event = {"tool_name": "Bash", "tool_input": {"command": "find . -name '*.py'"}}
+
+    def client_decision(env):
+        proc = run_hook("hook_client.py", find_event, env=env, args=["prevent_forbidden_bash"])
+        try:
+            return json.loads(proc.stdout)["hookSpecificOutput"]["permissionDecision"]
+        except (ValueError, KeyError):
+            return f"exit={proc.returncode} stdout={proc.stdout!r} stderr={proc.stderr!r}"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = {"XDG_RUNTIME_DIR": tmpdir}
+        sock = Path(tmpdir) / f"claude-hooks-{os.getuid()}" / "daemon.sock"
+
+        # Test 1: without a daemon the client runs the hook in-process
+        decision = client_decision(env)
+        if decision == "deny":
+            results.record_pass("hook_client_falls_back_in_process")
+        else:
+            results.record_fail("hook_client_falls_back_in_process", decision)
+
+        daemon = subprocess.Popen(
+            [sys.executable, str(HOOKS_DIR / "hook_daemon.py"), "serve"],
+            env={**os.environ, **env},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.monotonic() + 10
+            while not sock.exists() and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+            # Test 2: the daemon answers with the same decision as the in-process hook
+            probe = subprocess.run(
+                [
+                    sys.executable,
+                    "-c",
+                    "import sys, json; sys.path.insert(0, sys.argv[1]); import hook_client; "
+                    "r = hook_client.request_daemon('prevent_forbidden_bash', sys.argv[2].encode()); "
+                    "print(json.dumps(None if r is None else [r[0], r[1].decode()]))",
+                    str(HOOKS_DIR),
+                    json.dumps(find_event),
+                ],
+                capture_output=True,
+                text=True,
+                timeout=30,
+                env={**os.environ, **env},
+            )
+            reply = json.loads(probe.stdout or "null")
+            if reply and reply[0] == 0 and '"deny"' in reply[1] and client_decision(env) == "deny":
+                results.record_pass("hook_daemon_serves_requests")
+            else:
+                results.record_fail("hook_daemon_serves_requests", f"{probe.stdout} {probe.stderr}")
+        finally:
+            daemon.terminate()
+            daemon.wait(timeout=10)
+
+        # Test 3: the daemon cleans up its socket on shutdown
+        if not sock.exists():
+            results.record_pass("hook_daemon_removes_socket_on_exit")
+        else:
+            results.record_fail("hook_daemon_removes_socket_on_exit", f"{sock} still exists")
+
+    # Test 4: a socket directory open to others is neither used nor served from
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = {"XDG_RUNTIME_DIR": tmpdir}
+        sock_dir = Path(tmpdir) / f"claude-hooks-{os.getuid()}"
+        sock_dir.mkdir(mode=0o755)
+        os.chmod(sock_dir, 0o755)
+        planted = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        planted.bind(str(sock_dir / "daemon.sock"))
+        planted.listen(1)
+        try:
+            # A planted daemon would allow the command; the client must not ask it
+            decision = client_decision(env)
+        finally:
+            planted.close()
+        (sock_dir / "daemon.sock").unlink()
+        serve = subprocess.run(
+            [sys.executable, str(HOOKS_DIR / "hook_daemon.py"), "serve"],
+            env={**os.environ, **env},
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+        if decision == "deny" and "not a private directory" in serve.stderr and not any(sock_dir.iterdir()):
+            results.record_pass("hook_daemon_rejects_shared_socket_dir")
+        else:
+            results.record_fail("hook_daemon_rejects_shared_socket_dir", f"{decision} {serve.stderr!r}")
+
+    # Test 5: the parent builds the in-memory caches its forked children inherit
+    import hook_daemon
+    import phrase_classifier
+    import prevent_forbidden_bash
+
+    phrase_classifier._LOADED = None
+    prevent_forbidden_bash._COMPILED.clear()
+    hook_daemon.prime_caches()
+    classifier = phrase_classifier._LOADED and phrase_classifier._LOADED[1]
+    rules = dict(prevent_forbidden_bash._COMPILED)
+    hook_daemon.prime_caches()
+    if (
+        classifier is not None
+        and len(rules) == 1
+        and phrase_classifier.load() is classifier
+        and prevent_forbidden_bash._COMPILED == rules
+    ):
+        results.record_pass("hook_daemon_primes_caches")
+    else:
+        results.record_fail("hook_daemon_primes_caches", f"{classifier} {list(rules)}")
+
 
 def main():
     results = TestResults()
@@ -184,6 +1475,78 @@ def main():
     print("\nTesting prevent forbidden bash:")
     test_prevent_forbidden_bash(results)
 
+    # Shell lexer tests
+    print("\nTesting shell lexer:")
+    test_shell_lexer(results)
+
+    # Transcript checkpoint tests
+    print("\nTesting transcript checkpoints:")
+    test_transcript_checkpoint(results)
+
+    # Shared transcript parser tests
+    print("\nTesting shared transcript parser:")
+    test_transcript_parser(results)
+
+    # UserPromptSubmit dispatcher tests
+    print("\nTesting UserPromptSubmit dispatcher:")
+    test_user_prompt_dispatch(results)
+
+    # Incremental session export tests
+    print("\nTesting incremental session export:")
+    test_session_sync(results)
+
+    # Summary queue tests
+    print("\nTesting summary queue:")
+    test_summary_queue(results)
+
+    # Rolling summary tests
+    print("\nTesting rolling summary:")
+    test_rolling_summary(results)
+
+    # Summary cache tests
+    print("\nTesting summary cache:")
+    test_summary_cache(results)
+
+    # Phrase classifier tests
+    print("\nTesting phrase classifier:")
+    test_phrase_classifier(results)
+
+    # Handoff message selection tests
+    print("\nTesting handoff message selection:")
+    test_handoff_selection(results)
+
+    # Relevance ranking tests
+    print("\nTesting relevance ranking:")
+    test_relevance_ranking(results)
+
+    # Chunked handoff tests
+    print("\nTesting chunked handoff:")
+    test_chunked_handoff(results)
+
+    # Summarizer backend tests
+    print("\nTesting summarizer backends:")
+    test_summarizer(results)
+
+    # Handoff registry tests
+    print("\nTesting handoff registry:")
+    test_handoff_registry(results)
+
+    # Storage tests
+    print("\nTesting shared storage:")
+    test_storage(results)
+
+    # Event journal tests
+    print("\nTesting event journal:")
+    test_event_journal(results)
+
+    # Repository detection tests
+    print("\nTesting repository detection:")
+    test_repo_detection(results)
+
+    # Hook daemon tests
+    print("\nTesting hook daemon:")
+    test_hook_daemon(results)
+
     # Print summary
     success = results.print_summary()
 